@@ -75,11 +75,12 @@ pack = Deserialize(rsp, {
     'acnt': ('2B', '', 'ANSWERS'),
     'ncnt': ('2B'),
     'mcnt': ('2B'),
-    'qname': (serializeme.NULL_TERMINATE, serializeme.HOST),
+    'qname': serializeme.DNS_NAME,
     'qtype': ('2B'),
     'qclass': ('2B'),
     'ANSWERS': {
-        'name': ('2B'),
+        # Answer names are usually compression pointers to the question name.
+        'name': serializeme.DNS_NAME,
         'type': ('2B'),
         'class': ('2B'),
         'ttl': ('4B'),
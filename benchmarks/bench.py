@@ -0,0 +1,192 @@
+"""
+Offline throughput benchmarks for Serialize and Deserialize, compared with hand-written struct code.
+
+Usage:
+    python benchmarks/bench.py [--quick] [--case NAME] [--output results.json] [--compare old.json]
+"""
+# Author: Justin Roosenschoon <jeroosenschoon@gmail.com>
+
+# Licence: MIT License (c) 2021 Justin Roosenschoon
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from serializeme import Deserialize, Serialize  # noqa: E402
+
+from fixtures import DECODE_CASES, ENCODE_CASES  # noqa: E402
+
+
+def decode_variants(data, decoder):
+    """
+    Ways of decoding packets of one format.
+    :return: dictionary of variant name -> function of a packet.
+    """
+    schema = Deserialize.compile(data)
+    generated = Deserialize.compile(data, codegen=True)
+    return {
+        "Deserialize": lambda packet: Deserialize(packet, data),
+        "Schema.unpack": schema.unpack,
+        "lazy": lambda packet: schema.unpack(packet, lazy=True),
+        "compact": lambda packet: schema.unpack(packet, compact=True),
+        "codegen": generated.unpack,
+        "codegen+compact": lambda packet: generated.unpack(packet, compact=True),
+        "struct": decoder,
+    }
+
+
+def encode_variants(data, encoder):
+    """
+    Ways of encoding the packet of one layout.
+    :return: dictionary of variant name -> function without arguments.
+    """
+    template = Serialize.compile(data)
+    generated = Serialize.compile(data, codegen=True)
+    return {
+        "Serialize.packetize": lambda: Serialize(data).packetize(),
+        "Template.pack": template.pack,
+        "codegen": generated.pack,
+        "struct": encoder,
+    }
+
+
+def rate(func, args, min_time):
+    """
+    Calls per second of func(*args): the best of three runs of at least min_time seconds each.
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for i in range(number):
+            func(*args)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 10:
+            break
+        number *= 10
+    number = max(int(number * min_time / max(elapsed, 1e-9)), 1)
+    best = 0.0
+    for repeat in range(3):
+        start = time.perf_counter()
+        for i in range(number):
+            func(*args)
+        best = max(best, number / (time.perf_counter() - start))
+    return best
+
+
+def allocations(func, args, count):
+    """
+    Memory blocks and bytes still allocated per message after count calls, keeping every result alive. This is
+    what a service holding decoded messages pays; temporary allocations freed during the call are not counted.
+    :return: (blocks, bytes) per message.
+    """
+    results = []
+    gc.collect()
+    gc.disable()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        for i in range(count):
+            results.append(func(*args))
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+        gc.enable()
+    stats = after.compare_to(before, 'filename')
+    blocks = sum([stat.count_diff for stat in stats])
+    size = sum([stat.size_diff for stat in stats])
+    # Do not count the list holding the results.
+    blocks -= 1
+    size -= sys.getsizeof(results)
+    return blocks / count, size / count
+
+
+def run(min_time=0.2, count=1000, cases=None):
+    """
+    Run every benchmark.
+    :param min_time: (default=0.2) Seconds each timing run takes at least.
+    :param count: (default=1000) Number of messages kept to count allocations.
+    :param cases: (default=None) Names of the cases to run, or None for all of them.
+    :return: list of result dictionaries, one per case and variant.
+    """
+    results = []
+    jobs = []
+    for name, (data, packet, decoder) in DECODE_CASES.items():
+        jobs.append(("decode", name, len(packet), decode_variants(data, decoder), (packet,)))
+    for name, (data, encoder) in ENCODE_CASES.items():
+        jobs.append(("encode", name, len(encoder()), encode_variants(data, encoder), ()))
+    for (direction, name, size, variants, args) in jobs:
+        if cases and name not in cases:
+            continue
+        baseline = rate(variants["struct"], args, min_time)
+        for variant, func in variants.items():
+            speed = baseline if variant == "struct" else rate(func, args, min_time)
+            (blocks, nbytes) = allocations(func, args, count)
+            results.append({
+                "direction": direction,
+                "case": name,
+                "variant": variant,
+                "bytes": size,
+                "packets_per_sec": round(speed),
+                "megabytes_per_sec": round(speed * size / 1e6, 3),
+                "vs_struct": round(speed / baseline, 3),
+                "blocks_per_message": round(blocks, 2),
+                "bytes_per_message": round(nbytes, 1),
+            })
+    return results
+
+
+def report(results, previous=None):
+    """
+    Format results as a table, with the change from previous results of the same case and variant if given.
+    """
+    old = {}
+    for r in previous or ():
+        old[(r["direction"], r["case"], r["variant"])] = r["packets_per_sec"]
+    lines = ["{:<7} {:<15} {:<20} {:>12} {:>9} {:>8} {:>10}{}".format(
+        "", "case", "variant", "packets/s", "vs struct", "blocks", "bytes", "  change" if previous else "")]
+    for r in results:
+        change = ""
+        key = (r["direction"], r["case"], r["variant"])
+        if key in old:
+            change = "  {:+.1%}".format(r["packets_per_sec"] / old[key] - 1)
+        lines.append("{:<7} {:<15} {:<20} {:>12,} {:>9.3f} {:>8.2f} {:>10.1f}{}".format(
+            r["direction"], r["case"], r["variant"], r["packets_per_sec"], r["vs_struct"],
+            r["blocks_per_message"], r["bytes_per_message"], change))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="short timing runs, for a smoke test")
+    parser.add_argument("--case", action="append", help="only run this case (may be repeated)")
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--compare", help="show the change from the results saved in this JSON file")
+    args = parser.parse_args(argv)
+
+    results = run(0.02 if args.quick else 0.2, 100 if args.quick else 1000, args.case)
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)["results"]
+    print(report(results, previous))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "implementation": platform.python_implementation(),
+                "machine": platform.machine(),
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "results": results,
+            }, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
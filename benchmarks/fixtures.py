@@ -0,0 +1,247 @@
+"""
+Canned packets and layouts for the benchmarks, with hand-written struct codecs to compare against.
+"""
+# Author: Justin Roosenschoon <jeroosenschoon@gmail.com>
+
+# Licence: MIT License (c) 2021 Justin Roosenschoon
+
+import struct
+from socket import inet_ntoa
+
+import serializeme
+
+# Layouts from Examples/DNS_example.py.
+DNS_QUERY = {
+    "id": (16, 17),
+    "qr": (),
+    "opcode": 4,
+    "aa": (),
+    "tc": (),
+    "rd": (1, 1),
+    "ra": (),
+    "z": 3,
+    "rcode": 4,
+    "qdcount": ("2B", 1),
+    "ancount": "16b",
+    "nscount": 16,
+    "arcount": 16,
+    "qname": (serializeme.PREFIX_LEN_NULL_TERM, ("yahoo", "com")),
+    "qtype": (16, 1),
+    "qclass": (16, 1)
+}
+
+DNS_RESPONSE = {
+    'pid': ('2B'),
+    'pflags': ('2B'),
+    'qcnt': ('2B'),
+    'acnt': ('2B', '', 'ANSWERS'),
+    'ncnt': ('2B'),
+    'mcnt': ('2B'),
+    'qname': serializeme.DNS_NAME,
+    'qtype': ('2B'),
+    'qclass': ('2B'),
+    'ANSWERS': {
+        'name': serializeme.DNS_NAME,
+        'type': ('2B'),
+        'class': ('2B'),
+        'ttl': ('4B'),
+        'data_length': ('2B'),
+        'address': ('4B', serializeme.IPv4),
+    }
+}
+
+# Layouts from the examples at the bottom of serializeme/deserialize.py.
+DNS_REQUEST = {
+    "ID": "2B",
+    "!!2B": {
+        'QR': '1b',
+        'OPCODE': '4b',
+        'AA': '1b',
+        'TC': '1b',
+        'RD': '1b',
+        'RA': '1b',
+        "Z": "3b",
+        "RCODE": "4b",
+    },
+    "QDCOUNT": ("2B", "", "QUERIES"),
+    "ANCOUNT": "2B",
+    "NSCOUNT": "2B",
+    "ARCOUNT": "2B",
+    "QUERIES": {
+        "QNAME": serializeme.PREFIX_LEN_NULL_TERM,
+        "QTYPE": "2B",
+        "QCLASS": "2B"
+    }
+}
+
+SOCKS5_REQUEST = {
+    "VER": "1B",
+    "CMD": "1B",
+    "RSV": "1B",
+    "ATYP": "1B",
+    "DADDR": (serializeme.PREFIX_LENGTH, serializeme.HOST),
+    "DPORT": "2B",
+}
+
+SOCKS5_REQUEST_LAYOUT = {
+    "VER": ("1B", 5),
+    "CMD": ("1B", 1),
+    "RSV": "1B",
+    "ATYP": ("1B", 3),
+    "DADDR": (serializeme.PREFIX_LENGTH, "www.google.com"),
+    "DPORT": (16, 80),
+}
+
+AUTH = {
+    "VER": "1B",
+    "ID": serializeme.PREFIX_LENGTH,
+    "PW": serializeme.PREFIX_LENGTH
+}
+
+AUTH_LAYOUT = {
+    "VER": ("1B", 1),
+    "ID": (serializeme.PREFIX_LENGTH, "cs158b"),
+    "PW": (serializeme.PREFIX_LENGTH, "Pa55word"),
+}
+
+AUTH_METHODS = {
+    "VER": "1B",
+    "NAUTHS": ('1B', "", "AUTHS"),
+    "AUTHS": {
+        'val': '1B'
+    }
+}
+
+BITS = {
+    "!!2B": {'b0': '',
+             'b1': '3b',
+             'b2': '4b',
+             'b3': '4b',
+             'b4': '4b',
+             }
+}
+
+DNS_RESPONSE_PACKET = (b'\x00\x11\x81\x80\x00\x01\x00\x04\x00\x00\x00\x00\x03www\x07example\x03com\x00\x00\x01\x00\x01'
+                       b'\xc0\x0c\x00\x01\x00\x01\x00\x00\x01\x2c\x00\x04\x5d\xb8\xd8\x22'
+                       b'\xc0\x0c\x00\x01\x00\x01\x00\x00\x01\x2c\x00\x04\x5d\xb8\xd8\x23'
+                       b'\x04mail\xc0\x10\x00\x01\x00\x01\x00\x00\x00\x3c\x00\x04\x5d\xb8\xd8\x24'
+                       b'\xc0\x41\x00\x01\x00\x01\x00\x00\x00\x3c\x00\x04\x5d\xb8\xd8\x25')
+DNS_REQUEST_PACKET = (b'\xccD\x01 \x00\x01\x00\x00\x00\x00\x00\x01\x06google\x03com\x00\x00\x01\x00\x01\x00\x00)\x10'
+                      b'\x00\x00\x00\x00\x00\x00\x0c\x00\n\x00\x08\xd9\xd7\xa3\xbf\xe7\xb3\xae\xb9')
+SOCKS5_REQUEST_PACKET = b'\x05\x01\x00\x03\x0ewww.google.com\x00P'
+AUTH_PACKET = b'\x01\x06cs158b\x08Pa55word'
+AUTH_METHODS_PACKET = b'\x01\x03\x00\x01\x02'
+BITS_PACKET = b'\x41\x33'
+
+_HEADER = struct.Struct('!6H')
+_SHORTS = struct.Struct('!HH')
+_ANSWER = struct.Struct('!HHLH')
+
+
+def _dns_name(packet, index):
+    # Labels, then a pointer or the root label.
+    labels = []
+    end = None
+    while True:
+        length = packet[index]
+        if length >= 0xc0:
+            if end is None:
+                end = index + 2
+            index = ((length & 0x3f) << 8) | packet[index + 1]
+            continue
+        if length == 0:
+            return '.'.join(labels), end if end is not None else index + 1
+        labels.append(str(packet[index + 1:index + length + 1], 'latin-1'))
+        index += length + 1
+
+
+def _host(bites):
+    return ''.join(c if c.isprintable() else '.' for c in str(bites[1:], 'latin-1'))
+
+
+def _prefixed(packet, index):
+    end = index + packet[index] + 1
+    raw = packet[index + 1:end]
+    return (int.from_bytes(raw, "big") if len(raw) in (1, 2, 4) else str(raw, 'latin-1')), end
+
+
+def decode_dns_response(packet):
+    header = _HEADER.unpack_from(packet, 0)
+    qname, index = _dns_name(packet, 12)
+    qtype, qclass = _SHORTS.unpack_from(packet, index)
+    index += 4
+    answers = []
+    for i in range(header[3]):
+        name, index = _dns_name(packet, index)
+        rtype, rclass, ttl, length = _ANSWER.unpack_from(packet, index)
+        answers.append((name, rtype, rclass, ttl, length, inet_ntoa(packet[index + 10:index + 14])))
+        index += 14
+    return header + (qname, qtype, qclass, tuple(answers))
+
+
+def decode_dns_request(packet):
+    ident, flags, qdcount, ancount, nscount, arcount = _HEADER.unpack_from(packet, 0)
+    index = 12
+    queries = []
+    for i in range(qdcount):
+        end = packet.index(b'\x00', index)
+        qtype, qclass = _SHORTS.unpack_from(packet, end + 1)
+        queries.append((_host(packet[index:end]), qtype, qclass))
+        index = end + 5
+    return (ident, flags >> 15, (flags >> 11) & 0xf, (flags >> 10) & 1, (flags >> 9) & 1, (flags >> 8) & 1,
+            (flags >> 7) & 1, (flags >> 4) & 7, flags & 0xf, qdcount, ancount, nscount, arcount, tuple(queries))
+
+
+def decode_socks5_request(packet):
+    end = 5 + packet[4]
+    return (packet[0], packet[1], packet[2], packet[3], _host(packet[4:end]),
+            int.from_bytes(packet[end:end + 2], "big"))
+
+
+def decode_auth(packet):
+    user, index = _prefixed(packet, 1)
+    password, index = _prefixed(packet, index)
+    return packet[0], user, password
+
+
+def decode_auth_methods(packet):
+    return packet[0], packet[1], tuple((packet[2 + i],) for i in range(packet[1]))
+
+
+def decode_bits(packet):
+    word = int.from_bytes(packet[:2], "big")
+    return word >> 15, (word >> 12) & 7, (word >> 8) & 0xf, (word >> 4) & 0xf, word & 0xf
+
+
+def _labels(labels):
+    return b''.join([len(label).to_bytes(1, "big") + label.encode() for label in labels])
+
+
+def encode_dns_query():
+    return _HEADER.pack(17, 0x0100, 1, 0, 0, 0) + _labels(("yahoo", "com")) + b'\x00' + _SHORTS.pack(1, 1)
+
+
+def encode_socks5_request():
+    return b'\x05\x01\x00\x03' + _labels(("www.google.com",)) + b'\x00\x50'
+
+
+def encode_auth():
+    return b'\x01' + _labels(("cs158b", "Pa55word"))
+
+
+# name -> (format, packet, struct decoder)
+DECODE_CASES = {
+    "dns_response": (DNS_RESPONSE, DNS_RESPONSE_PACKET, decode_dns_response),
+    "dns_request": (DNS_REQUEST, DNS_REQUEST_PACKET, decode_dns_request),
+    "socks5_request": (SOCKS5_REQUEST, SOCKS5_REQUEST_PACKET, decode_socks5_request),
+    "auth": (AUTH, AUTH_PACKET, decode_auth),
+    "auth_methods": (AUTH_METHODS, AUTH_METHODS_PACKET, decode_auth_methods),
+    "bit_group": (BITS, BITS_PACKET, decode_bits),
+}
+
+# name -> (layout, struct encoder)
+ENCODE_CASES = {
+    "dns_query": (DNS_QUERY, encode_dns_query),
+    "socks5_request": (SOCKS5_REQUEST_LAYOUT, encode_socks5_request),
+    "auth": (AUTH_LAYOUT, encode_auth),
+}
@@ -0,0 +1,170 @@
+"""
+asyncio adapters that decode datagrams and streams with serializeme schemas.
+"""
+# Author: Justin Roosenschoon <jeroosenschoon@gmail.com>
+
+# Licence: MIT License (c) 2021 Justin Roosenschoon
+
+import asyncio
+
+from serializeme.deserialize import Schema
+from serializeme.stream import StreamDecoder
+
+
+def _to_bytes(message):
+    """
+    Encode a reply: Serialize objects are packetized, anything else must already be bytes-like.
+    """
+    packetize = getattr(message, "packetize", None)
+    return packetize() if packetize is not None else message
+
+
+class DatagramDecoderProtocol(asyncio.DatagramProtocol):
+    """
+    asyncio.DatagramProtocol that decodes every datagram with a schema. Decoded messages are passed to a callback,
+    or queued for iteration with "async for message, addr in protocol". The queue is bounded: when it is full the
+    transport stops reading (so the kernel buffers, and eventually drops, new datagrams) until the consumer has
+    caught up; datagrams that still arrive meanwhile are dropped and counted.
+
+    Parameters
+    ----------
+    :param schema: The Schema, or format dictionary, of each datagram.
+    :param callback: (default=None) Function called as callback(message, addr) instead of queueing.
+    :param maxsize: (default=1024) Maximum number of decoded messages waiting in the queue.
+    :param executor: (default=None) concurrent.futures.Executor used to decode large datagrams off the event loop.
+    :param executor_threshold: (default=0) Datagrams at least this many bytes long are decoded in the executor.
+
+    Attributes
+    ----------
+    transport: The transport, once connected.
+    dropped: Number of datagrams dropped because the queue was full.
+    errors: Number of datagrams that could not be decoded.
+    """
+
+    def __init__(self, schema, callback=None, maxsize=1024, executor=None, executor_threshold=0):
+        self.schema = schema if isinstance(schema, Schema) else Schema(schema)
+        self.callback = callback
+        self.maxsize = maxsize
+        self.executor = executor
+        self.executor_threshold = executor_threshold
+        self.queue = asyncio.Queue(maxsize)
+        self.transport = None
+        self.dropped = 0
+        self.errors = 0
+        self.__paused = False
+        self.__closed = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def connection_lost(self, exc):
+        self.__closed = True
+        if self.callback is None:
+            # Wake up a consumer waiting on an empty queue.
+            try:
+                self.queue.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
+
+    def datagram_received(self, data, addr):
+        if self.executor is not None and len(data) >= self.executor_threshold:
+            future = asyncio.get_running_loop().run_in_executor(self.executor, self.schema.unpack, data)
+            future.add_done_callback(lambda f: self.__decoded(f, addr))
+            return
+        try:
+            message = self.schema.unpack(data)
+        except Exception:
+            self.errors += 1
+            return
+        self.__deliver(message, addr)
+
+    def __decoded(self, future, addr):
+        if future.cancelled() or future.exception() is not None:
+            self.errors += 1
+            return
+        self.__deliver(future.result(), addr)
+
+    def __deliver(self, message, addr):
+        if self.callback is not None:
+            self.callback(message, addr)
+            return
+        try:
+            self.queue.put_nowait((message, addr))
+        except asyncio.QueueFull:
+            self.dropped += 1
+        if self.queue.full() and not self.__paused:
+            pause_reading = getattr(self.transport, "pause_reading", None)
+            if pause_reading is not None:
+                pause_reading()
+                self.__paused = True
+
+    def send(self, message, addr=None):
+        """
+        Send a reply datagram.
+        :param message: A Serialize object, or bytes.
+        :param addr: (default=None) Destination address; None for a connected endpoint.
+        """
+        self.transport.sendto(_to_bytes(message), addr)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.__closed and self.queue.empty():
+            raise StopAsyncIteration
+        item = await self.queue.get()
+        if item is None:
+            raise StopAsyncIteration
+        if self.__paused and self.queue.qsize() <= self.maxsize // 2:
+            self.__paused = False
+            self.transport.resume_reading()
+        return item
+
+
+async def read_messages(reader, schema, length_prefix=0, chunk_size=65536, executor=None, executor_threshold=0):
+    """
+    Decode messages from an asyncio.StreamReader as they arrive. Reading is driven by the consumer, so a slow
+    consumer applies backpressure through the StreamReader's buffer limit.
+    :param reader: The asyncio.StreamReader.
+    :param schema: The Schema, or format dictionary, of each message.
+    :param length_prefix: (default=0) Size in bytes of a big-endian length header in front of every message.
+    :param chunk_size: (default=65536) Maximum number of bytes read at a time.
+    :param executor: (default=None) concurrent.futures.Executor used to decode large chunks off the event loop.
+    :param executor_threshold: (default=0) Chunks at least this many bytes long are decoded in the executor.
+    :return: Asynchronous iterator of Deserialize objects.
+    :raises MalformedPacket: If a length-prefixed message cannot be decoded; see StreamDecoder.feed. The messages
+                             received before it are yielded first.
+    :raises Exception: Without length_prefix, the error decoding a message, after the messages before it.
+    """
+    decoder = StreamDecoder(schema, length_prefix)
+    loop = asyncio.get_running_loop()
+    while True:
+        chunk = await reader.read(chunk_size)
+        if not chunk:
+            decoder.close()
+            return
+        try:
+            if executor is not None and len(chunk) >= executor_threshold:
+                messages = await loop.run_in_executor(executor, decoder.feed, chunk)
+            else:
+                messages = decoder.feed(chunk)
+        except Exception as e:
+            for message in getattr(e, 'messages', ()):
+                yield message
+            raise
+        for message in messages:
+            yield message
+
+
+async def write_message(writer, message, length_prefix=0):
+    """
+    Write a message to an asyncio.StreamWriter and wait until it can take more data.
+    :param writer: The asyncio.StreamWriter.
+    :param message: A Serialize object, or bytes.
+    :param length_prefix: (default=0) Size in bytes of a big-endian length header to write in front of the message.
+    """
+    data = _to_bytes(message)
+    if length_prefix:
+        writer.write(len(data).to_bytes(length_prefix, "big"))
+    writer.write(data)
+    await writer.drain()
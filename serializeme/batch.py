@@ -0,0 +1,211 @@
+"""
+Batch decoding of many fixed-layout packets into NumPy arrays, and batch encoding of columns of values.
+"""
+# Author: Justin Roosenschoon <jeroosenschoon@gmail.com>
+
+# Licence: MIT License (c) 2021 Justin Roosenschoon
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is an optional extra: pip install serializeme[numpy]
+    np = None
+
+from array import array
+
+from serializeme.deserialize import Schema, _INT, _BITS
+from serializeme.serialize import Template, _Run, _fixed_int
+from serializeme.exceptions import InvalidField, IncompletePacket, ValueTooBig
+
+
+def _uint(num_bits):
+    """
+    Smallest native unsigned NumPy dtype holding num_bits bits.
+    """
+    for (limit, dtype) in ((8, 'u1'), (16, 'u2'), (32, 'u4')):
+        if num_bits <= limit:
+            return np.dtype(dtype)
+    return np.dtype('u8')
+
+
+class _Layout:
+    """
+    NumPy view of a fixed-size Schema: a structured dtype over the raw record bytes, and the columns to build from it.
+    """
+    def __init__(self, schema):
+        if schema.size is None:
+            raise InvalidField(schema.data, "Batch decoding needs a fixed-size format. Received")
+        self.size = schema.size
+        names, formats, offsets = [], [], []
+        # columns: (name, raw field, (shift, mask) or None, dtype)
+        self.columns = []
+        offset = 0
+        for step in schema.steps:
+            for (kind, name, nbytes, arg, variable) in step.slots:
+                if kind == _BITS:
+                    raw = '!!' + str(offset)
+                    if nbytes in (1, 2, 4, 8):
+                        raw_format = '>u' + str(nbytes)
+                    else:
+                        raw_format = ('u1', (nbytes,))
+                    if name:
+                        self.columns.append((name, raw, None, _uint(nbytes * 8)))
+                    for (sub_name, shift, mask, nbits) in arg:
+                        self.columns.append((sub_name, raw, (shift, mask), _uint(nbits)))
+                else:
+                    raw = name
+                    # Other fields, including formatted ones (HOST, IPv4, IPv6), are returned as raw bytes.
+                    raw_format = '>u' + str(nbytes) if kind == _INT else 'V' + str(nbytes)
+                    self.columns.append((name, raw, None, None))
+                names.append(raw)
+                formats.append(raw_format)
+                offsets.append(offset)
+                offset += nbytes
+        self.raw_dtype = np.dtype({'names': names, 'formats': formats, 'offsets': offsets, 'itemsize': self.size})
+
+    def records(self, packets):
+        """
+        View packets as an array of raw records.
+        :param packets: One contiguous buffer of concatenated records, or an iterable of packets (only the first
+                        size bytes of each packet are read).
+        """
+        try:
+            buffer = memoryview(packets)
+        except TypeError:
+            chunks = []
+            for packet in packets:
+                if len(packet) < self.size:
+                    raise IncompletePacket(self.size, len(packet))
+                chunks.append(bytes(packet[:self.size]))
+            buffer = b''.join(chunks)
+        else:
+            if buffer.nbytes % self.size:
+                raise IncompletePacket(self.size, buffer.nbytes % self.size, "Trailing partial record. Bytes "
+                                                                             "needed/received")
+        return np.frombuffer(buffer, dtype=self.raw_dtype)
+
+    def column(self, records, raw, bits, dtype):
+        values = records[raw]
+        if values.ndim > 1:
+            # Odd-width bit group: combine its bytes into one integer per record.
+            word = np.zeros(len(values), dtype='u8')
+            for i in range(values.shape[1]):
+                word = (word << 8) | values[:, i]
+            values = word
+        if bits is not None:
+            (shift, mask) = bits
+            values = (values >> shift) & mask
+        return values if dtype is None else values.astype(dtype)
+
+
+def _layout(schema):
+    if np is None:
+        raise ImportError("Batch decoding requires NumPy: pip install serializeme[numpy]")
+    if not isinstance(schema, Schema):
+        schema = Schema(schema)
+    return _Layout(schema)
+
+
+def unpack_columns(schema, packets):
+    """
+    Decode many fixed-layout packets into one NumPy array per field. Plain integer fields are big-endian views of
+    the input buffer; bit group fields are split out with vectorized shifts and masks.
+    :param schema: A Schema, or a format dictionary, with only fixed-size fields and bit groups.
+    :param packets: One contiguous buffer of concatenated records, or an iterable of packets.
+    :return: dictionary of field name -> numpy.ndarray.
+    """
+    layout = _layout(schema)
+    records = layout.records(packets)
+    return {name: layout.column(records, raw, bits, dtype) for (name, raw, bits, dtype) in layout.columns}
+
+
+def unpack_array(schema, packets):
+    """
+    Decode many fixed-layout packets into a NumPy structured array with one named field per packet field.
+    :param schema: A Schema, or a format dictionary, with only fixed-size fields and bit groups.
+    :param packets: One contiguous buffer of concatenated records, or an iterable of packets.
+    :return: numpy.ndarray: structured array with one record per packet.
+    """
+    layout = _layout(schema)
+    records = layout.records(packets)
+    columns = [(name, layout.column(records, raw, bits, dtype)) for (name, raw, bits, dtype) in layout.columns]
+    result = np.empty(len(records), dtype=[(name, values.dtype) for (name, values) in columns])
+    for (name, values) in columns:
+        result[name] = values
+    return result
+
+
+def _pack_many(template, columns, views):
+    """
+    Encode columns that cannot be vectorized with Template.pack_many, with arrays turned into lists of Python values.
+    """
+    columns = {name: column.tolist() if isinstance(column, np.ndarray) else column for name, column in columns.items()}
+    return template.pack_many(columns=columns, views=views)
+
+
+def pack_columns(template, columns, views=False):
+    """
+    Encode many packets from columns of values, like Template.pack_many, with NumPy. When only fixed-width fields
+    change, the packet of defaults is copied once per packet and each byte-aligned group of fields that changes is
+    combined with vectorized shifts and written into every packet at once. Other columns (variable-length fields,
+    bytes values, fields wider than 64 bits) are encoded by Template.pack_many.
+    :param template: A Template, or a layout dictionary.
+    :param columns: dictionary of field_name -> sequence or array of values, one value per packet.
+    :param views: (default=False) Return memoryviews of the packets instead of their offsets.
+    :return: (buffer, offsets) or list of memoryviews, as Template.pack_many.
+    """
+    if np is None:
+        raise ImportError("Batch encoding requires NumPy: pip install serializeme[numpy]")
+    if not isinstance(template, Template):
+        template = Template(template)
+    arrays = {}
+    for name, column in columns.items():
+        index = template.index.get(name)
+        if index is None or not isinstance(template.sizes[index], int):
+            return _pack_many(template, columns, views)
+        values = np.asarray(column)
+        if values.dtype.kind not in 'iu':
+            return _pack_many(template, columns, views)
+        arrays[index] = values
+    if len(set(len(values) for values in arrays.values())) > 1:
+        return _pack_many(template, columns, views)
+    count = len(next(iter(arrays.values()))) if arrays else 0
+
+    defaults = list(template.defaults)
+    # (chunk, offset in the packet) of each byte-aligned group of fields with changing fields.
+    chunks = []
+    for segment, start in zip(template.segments, template._starts(defaults)):
+        if not isinstance(segment, _Run):
+            continue
+        for c in segment.chunks:
+            if any(index in arrays for (index, shift, width) in c.parts):
+                if c.num_bits > 64:
+                    return _pack_many(template, columns, views)
+                chunks.append((c, start))
+            start += c.num_bits // 8
+
+    base = template._pack(defaults)
+    size = len(base)
+    buffer = bytearray(base * count)
+    packets = np.frombuffer(buffer, dtype=np.uint8).reshape(count, size)
+    for (c, start) in chunks:
+        word = 0
+        for (index, shift, width) in c.parts:
+            if index not in arrays:
+                word |= _fixed_int(defaults[index], width) << shift
+        word = np.full(count, word, dtype=np.uint64)
+        for (index, shift, width) in c.parts:
+            values = arrays.get(index)
+            if values is None:
+                continue
+            bad = (values < 0) | ((values >> width) != 0 if width < 64 else False)
+            if bad.any():
+                raise ValueTooBig(width, values[bad][0].item(), "bits")
+            word |= values.astype(np.uint64) << np.uint64(shift)
+        for k in range(c.num_bits // 8):
+            packets[:, start + k] = (word >> np.uint64(c.num_bits - 8 - 8 * k)) & np.uint64(0xff)
+    del packets
+    offsets = array('Q', [size * i for i in range(count + 1)])
+    if views:
+        with memoryview(buffer) as view:
+            return [view[offsets[i]:offsets[i + 1]] for i in range(count)]
+    return buffer, offsets
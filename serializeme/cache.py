@@ -0,0 +1,129 @@
+"""
+Process-wide cache of compiled Schema and Template plans, keyed by the content of their format dictionaries.
+"""
+# Author: Justin Roosenschoon <jeroosenschoon@gmail.com>
+
+# Licence: MIT License (c) 2021 Justin Roosenschoon
+
+from collections import OrderedDict, namedtuple
+from threading import Lock
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+# Types whose values are used in keys as they are.
+_PLAIN = {str, int}
+
+
+def canonical(data):
+    """
+    Build a hashable key from the content of a format dictionary. Nested dictionaries, tuples and lists are walked;
+    field order is kept, as it is the order of the fields in the packet, and types are kept so that 1, True and 1.0
+    or a tuple and a list are different keys.
+    :param data: The format dictionary, or any value in it.
+    :return: tuple: The key. Two dictionaries have equal keys only if they describe the same format.
+    :raises TypeError: If the dictionary holds an unhashable value other than a dict, tuple or list.
+    """
+    cls = data.__class__
+    if cls in _PLAIN:
+        # Most values of a format; they are keys of their own.
+        return data
+    if cls is dict:
+        return (dict,) + tuple([(name if name.__class__ in _PLAIN else canonical(name),
+                                 value if value.__class__ in _PLAIN else canonical(value))
+                                for name, value in data.items()])
+    if cls is tuple or cls is list:
+        return (cls,) + tuple([value if value.__class__ in _PLAIN else canonical(value) for value in data])
+    hash(data)
+    return (cls, data)
+
+
+class PlanCache:
+    """
+    Least-recently-used cache of plans compiled from format dictionaries. Deserialize and Serialize look up their
+    dictionaries in one each, so call sites that pass the same dictionary (or an equal one built again) compile it only
+    once. The cache is safe to use from several threads; a plan may be compiled twice by threads that miss at once.
+
+    Parameters
+    ----------
+    :param maxsize: (default=256) Number of plans kept. With None, the cache is unbounded; with 0, nothing is kept.
+
+    Attributes
+    ----------
+    hits: Number of lookups that found a compiled plan.
+    misses: Number of lookups that compiled one.
+    maxsize: Number of plans kept.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.__plans = OrderedDict()
+        self.__lock = Lock()
+
+    def get(self, data, build, key=None):
+        """
+        Get the plan of a format dictionary, compiling it on a miss.
+        :param data: The format dictionary.
+        :param build: The class (or function) that compiles data, such as Schema. Plans of different classes are
+                      cached separately.
+        :param key: (default=None) Hashable key of the plan, for dictionaries whose plan depends on only part of
+                    their content. None uses the whole content of data.
+        :return: The cached plan, or a new build(data).
+        """
+        try:
+            key = (build, canonical(data) if key is None else key)
+            hash(key)
+        except TypeError:
+            # Values that cannot be compared by content, such as a list in a set: compile without caching.
+            self.misses += 1
+            return build(data)
+        plans = self.__plans
+        with self.__lock:
+            plan = plans.get(key)
+            if plan is not None:
+                plans.move_to_end(key)
+                self.hits += 1
+                return plan
+            self.misses += 1
+        plan = build(data)
+        with self.__lock:
+            if self.maxsize is None or self.maxsize > 0:
+                plans[key] = plan
+                if self.maxsize is not None and len(plans) > self.maxsize:
+                    plans.popitem(last=False)
+        return plan
+
+    def resize(self, maxsize):
+        """
+        Change the number of plans kept, evicting the least recently used ones if there are too many.
+        :param maxsize: Number of plans to keep, or None for no bound.
+        """
+        with self.__lock:
+            self.maxsize = maxsize
+            if maxsize is not None:
+                while len(self.__plans) > maxsize:
+                    self.__plans.popitem(last=False)
+
+    def clear(self):
+        """
+        Drop every plan and reset the hit and miss counts.
+        """
+        with self.__lock:
+            self.__plans.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """
+        :return: CacheInfo: (hits, misses, maxsize, currsize), like functools.lru_cache's cache_info().
+        """
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self.__plans))
+
+
+# The cache of Deserialize schemas.
+plans = PlanCache()
+
+# The cache of Serialize templates, keyed by the names and sizes of their fields only: values change from packet to
+# packet, and are kept by each Serialize object. Kept apart from plans, so that layouts do not evict schemas.
+templates = PlanCache()
@@ -0,0 +1,415 @@
+"""
+Memory-mapped pcap and pcapng reader, and pcap writer, for decoding captures with serializeme schemas.
+"""
+# Author: Justin Roosenschoon <jeroosenschoon@gmail.com>
+
+# Licence: MIT License (c) 2021 Justin Roosenschoon
+
+import mmap
+import struct
+import time
+
+import serializeme
+from serializeme.deserialize import Deserialize, Schema
+from serializeme.serialize import Template
+from serializeme.exceptions import IncompletePacket, InvalidField
+
+# Link-layer header types (https://www.tcpdump.org/linktypes.html).
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101  # Raw IPv4 or IPv6 packets
+LINKTYPE_USER0 = 147  # Reserved for private use: payloads without any headers
+LINKTYPE_IPV4 = 228
+
+# Headers stripped in front of UDP payloads.
+ETHERNET = {
+    "dst": "6B",
+    "src": "6B",
+    "ethertype": "2B",
+}
+
+IPV4 = {
+    "!!1B": {"version": "4b", "ihl": "4b"},
+    "tos": "1B",
+    "total_length": "2B",
+    "id": "2B",
+    "!!2B": {"flags": "3b", "fragment_offset": "13b"},
+    "ttl": "1B",
+    "protocol": "1B",
+    "checksum": "2B",
+    "src": ("4B", serializeme.IPv4),
+    "dst": ("4B", serializeme.IPv4),
+}
+
+UDP = {
+    "sport": "2B",
+    "dport": "2B",
+    "length": "2B",
+    "checksum": "2B",
+}
+
+_ETHERNET = Schema(ETHERNET)
+_IPV4 = Schema(IPV4)
+_UDP = Schema(UDP)
+
+_ETHERTYPE_IPV4 = 0x0800
+_ETHERTYPE_VLAN = (0x8100, 0x88a8)
+_PROTOCOL_UDP = 17
+_MORE_FRAGMENTS = 1  # Value of the MF bit in the 3 bit flags
+
+_PCAP_MAGIC = {
+    b'\xa1\xb2\xc3\xd4': ('>', 1e-6),
+    b'\xd4\xc3\xb2\xa1': ('<', 1e-6),
+    b'\xa1\xb2\x3c\x4d': ('>', 1e-9),
+    b'\x4d\x3c\xb2\xa1': ('<', 1e-9),
+}
+_PCAPNG_SECTION = b'\x0a\x0d\x0d\x0a'
+_PCAPNG_INTERFACE = 1
+_PCAPNG_SIMPLE_PACKET = 3
+_PCAPNG_ENHANCED_PACKET = 6
+_PCAPNG_TSRESOL = 9
+
+
+class Record:
+    """
+    One packet of a capture.
+
+    Attributes
+    ----------
+    timestamp: Capture time, in seconds since the epoch.
+    linktype: Link-layer header type of the packet (LINKTYPE_ETHERNET, ...).
+    data: memoryview of the captured bytes, inside the memory-mapped file.
+    offset: Offset of data in the file.
+    length: Original length of the packet on the wire, which may be more than len(data).
+    """
+    __slots__ = ('timestamp', 'linktype', 'data', 'offset', 'length')
+
+    def __init__(self, timestamp, linktype, data, offset, length):
+        self.timestamp = timestamp
+        self.linktype = linktype
+        self.data = data
+        self.offset = offset
+        self.length = length
+
+
+def udp_payload(data, linktype=LINKTYPE_ETHERNET):
+    """
+    Strip the Ethernet (with any VLAN tags), IPv4 and UDP headers in front of a UDP payload, without copying.
+    :param data: The captured packet.
+    :param linktype: (default=LINKTYPE_ETHERNET) Link-layer header type of the packet.
+    :return: memoryview of the UDP payload, or None if the packet is not a whole IPv4 UDP datagram (other protocols,
+             fragments, truncated captures).
+    """
+    data = memoryview(data)
+    span = _udp_span(data, linktype)
+    if span is None:
+        return None
+    return data[span[0]:span[1]]
+
+
+def _udp_span(data, linktype):
+    """
+    Find the UDP payload of a captured packet, as udp_payload does.
+    :return: (start, end) of the payload in data, or None.
+    """
+    index = 0
+    if linktype == LINKTYPE_ETHERNET:
+        if len(data) < _ETHERNET.size:
+            return None
+        ethertype = _ETHERNET.unpack(data, compact=True).values[2]
+        index = _ETHERNET.size
+        while ethertype in _ETHERTYPE_VLAN and index + 4 <= len(data):
+            ethertype = int.from_bytes(data[index + 2:index + 4], "big")
+            index += 4
+        if ethertype != _ETHERTYPE_IPV4:
+            return None
+    elif linktype not in (LINKTYPE_RAW, LINKTYPE_IPV4):
+        return None
+    if len(data) - index < _IPV4.size:
+        return None
+    (version, ihl, tos, total_length, ident, flags, fragment_offset, ttl, protocol, checksum, src,
+     dst) = _IPV4.unpack(data[index:], compact=True).values
+    if version != 4 or protocol != _PROTOCOL_UDP or fragment_offset or flags & _MORE_FRAGMENTS:
+        return None
+    end = index + total_length
+    index += ihl * 4
+    if end > len(data) or index + _UDP.size > end:
+        return None
+    length = _UDP.unpack(data[index:], compact=True).values[2]
+    if length < _UDP.size or index + length > end:
+        return None
+    return (index + _UDP.size, index + length)
+
+
+class CaptureReader:
+    """
+    Reader of pcap and pcapng files. The file is memory-mapped and every packet is a memoryview into the mapping, so
+    nothing is copied before a schema decodes it. Copy them with bytes() rather than keeping them, as the file stays
+    mapped while any view of it is alive.
+
+    Parameters
+    ----------
+    :param path: Path of the capture file.
+
+    Attributes
+    ----------
+    format: "pcap" or "pcapng".
+    linktype: Link-layer header type of a pcap file, or of the first interface of a pcapng file.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.__map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if f.seek(0, 2) else None
+        self.__view = memoryview(self.__map) if self.__map is not None else memoryview(b'')
+        try:
+            self.__read_header()
+        except BaseException:
+            # The reader is not returned, so nothing else can unmap the file.
+            self.close()
+            raise
+
+    def __read_header(self):
+        magic = bytes(self.__view[:4])
+        if magic in _PCAP_MAGIC:
+            self.format = "pcap"
+            if len(self.__view) < 24:
+                raise IncompletePacket(24, len(self.__view))
+            (self.__order, self.__resolution) = _PCAP_MAGIC[magic]
+            self.linktype = struct.unpack_from(self.__order + 'L', self.__view, 20)[0] & 0xffff
+        elif magic == _PCAPNG_SECTION:
+            self.format = "pcapng"
+            self.linktype = None
+            for record in self.__read_pcapng():
+                self.linktype = record.linktype
+                break
+        else:
+            raise InvalidField(magic, "Not a pcap or pcapng file. Magic number")
+
+    def __iter__(self):
+        return self.records()
+
+    def records(self):
+        """
+        Iterate over the packets of the capture.
+        :return: generator of Record objects, in file order.
+        """
+        if self.format == "pcap":
+            return self.__read_pcap()
+        return self.__read_pcapng()
+
+    def payloads(self, strip=True):
+        """
+        Iterate over the packet data of the capture.
+        :param strip: (default=True) Strip the Ethernet, IPv4 and UDP headers and skip packets that are not UDP
+                      datagrams, as udp_payload does.
+        :return: generator of memoryviews.
+        """
+        for record in self.records():
+            if not strip:
+                yield record.data
+                continue
+            payload = udp_payload(record.data, record.linktype)
+            if payload is not None:
+                yield payload
+
+    def decode(self, schema, strip=True, lazy=False, compact=False):
+        """
+        Decode every packet (or UDP payload, if strip) of the capture with a schema.
+        :param schema: The Schema, or format dictionary, of the packets.
+        :param strip: (default=True) Decode the UDP payloads of the packets; see payloads.
+        :param lazy: (default=False) Decode each field when it is first accessed; see Deserialize.
+        :param compact: (default=False) Only keep a tuple of values per packet; see Deserialize.
+        :return: generator of Deserialize objects.
+        """
+        if not isinstance(schema, Schema):
+            schema = Schema(schema)
+        for payload in self.payloads(strip):
+            yield Deserialize(payload, schema, lazy, compact)
+
+    def close(self):
+        """
+        Unmap the file. If views of its packets are still alive, the mapping is released with the last of them.
+        """
+        self.__view.release()
+        if self.__map is not None:
+            try:
+                self.__map.close()
+            except BufferError:
+                pass
+            self.__map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __read_pcap(self):
+        view = self.__view
+        header = struct.Struct(self.__order + 'LLLL')
+        index = 24
+        while index < len(view):
+            if index + header.size > len(view):
+                raise IncompletePacket(index + header.size, len(view))
+            (seconds, fraction, captured, length) = header.unpack_from(view, index)
+            index += header.size
+            if index + captured > len(view):
+                raise IncompletePacket(index + captured, len(view))
+            yield Record(seconds + fraction * self.__resolution, self.linktype, view[index:index + captured], index,
+                         length)
+            index += captured
+
+    def __read_pcapng(self):
+        view = self.__view
+        order = '<'
+        interfaces = []
+        index = 0
+        while index < len(view):
+            if index + 12 > len(view):
+                raise IncompletePacket(index + 12, len(view))
+            if view[index:index + 4] == _PCAPNG_SECTION:
+                # Section header: its byte-order magic sets the endianness of the whole section.
+                order = '<' if view[index + 8:index + 12] == b'\x4d\x3c\x2b\x1a' else '>'
+                interfaces = []
+            (block_type, block_length) = struct.unpack_from(order + 'LL', view, index)
+            if block_length < 12 or index + block_length > len(view):
+                raise IncompletePacket(index + max(block_length, 12), len(view))
+            body = index + 8
+            if block_type == _PCAPNG_INTERFACE:
+                linktype = struct.unpack_from(order + 'H', view, body)[0]
+                interfaces.append((linktype, self.__tsresol(view, order, body + 8, index + block_length - 4)))
+            elif block_type == _PCAPNG_ENHANCED_PACKET:
+                (interface, high, low, captured, length) = struct.unpack_from(order + 'LLLLL', view, body)
+                (linktype, resolution) = interfaces[interface]
+                start = body + 20
+                yield Record(((high << 32) | low) * resolution, linktype, view[start:start + captured], start, length)
+            elif block_type == _PCAPNG_SIMPLE_PACKET:
+                length = struct.unpack_from(order + 'L', view, body)[0]
+                start = body + 4
+                captured = min(length, index + block_length - 4 - start)
+                yield Record(None, interfaces[0][0], view[start:start + captured], start, length)
+            index += block_length
+
+    @staticmethod
+    def __tsresol(view, order, index, end):
+        """
+        Timestamp resolution in seconds, from the if_tsresol option of an interface description block.
+        """
+        while index + 4 <= end:
+            (code, length) = struct.unpack_from(order + 'HH', view, index)
+            if code == 0:
+                break
+            if code == _PCAPNG_TSRESOL:
+                value = view[index + 4]
+                return 2.0 ** -(value & 0x7f) if value & 0x80 else 10.0 ** -value
+            index += 4 + (length + 3) // 4 * 4
+        return 1e-6
+
+
+_ETHERNET_LAYOUT = Template({
+    "dst": ("6B", b'\x02\x00\x00\x00\x00\x02'),
+    "src": ("6B", b'\x02\x00\x00\x00\x00\x01'),
+    "ethertype": ("2B", _ETHERTYPE_IPV4),
+})
+
+_IPV4_LAYOUT = Template({
+    "version": (4, 4),
+    "ihl": (4, 5),
+    "tos": "1B",
+    "total_length": "2B",
+    "id": "2B",
+    "flags": (3, 2),  # Don't fragment
+    "fragment_offset": 13,
+    "ttl": ("1B", 64),
+    "protocol": ("1B", _PROTOCOL_UDP),
+    "checksum": "2B",
+    "src": (serializeme.IPv4, "10.0.0.1"),
+    "dst": (serializeme.IPv4, "10.0.0.2"),
+})
+
+_UDP_LAYOUT = Template({
+    "sport": "2B",
+    "dport": "2B",
+    "length": "2B",
+    "checksum": "2B",  # 0: not computed
+})
+
+
+def _checksum(header):
+    """
+    Internet checksum (RFC 1071) of an IPv4 header.
+    """
+    total = sum(struct.unpack('!%dH' % (len(header) // 2), header))
+    while total >> 16:
+        total = (total & 0xffff) + (total >> 16)
+    return ~total & 0xffff
+
+
+class CaptureWriter:
+    """
+    Writer of pcap files, to replay encoded packets in tests. Each packet is written as the payload of a UDP datagram
+    in an Ethernet frame (headers built with serializeme templates), or as it is.
+
+    Parameters
+    ----------
+    :param file: Path of the file to create, or a binary file object.
+    :param src: (default=("10.0.0.1", 1024)) Source IPv4 address and UDP port of the datagrams.
+    :param dst: (default=("10.0.0.2", 53)) Destination IPv4 address and UDP port of the datagrams.
+    :param udp: (default=True) Wrap packets in Ethernet, IPv4 and UDP headers. With False, the file has the
+                LINKTYPE_USER0 link type and holds the packets only.
+    """
+
+    def __init__(self, file, src=("10.0.0.1", 1024), dst=("10.0.0.2", 53), udp=True):
+        if isinstance(file, (str, bytes)) or hasattr(file, '__fspath__'):
+            self.file = open(file, 'wb')
+            self.__owned = True
+        else:
+            self.file = file
+            self.__owned = False
+        self.src = src
+        self.dst = dst
+        self.udp = udp
+        self.__ident = 0
+        self.file.write(struct.pack('<LHHlLLL', 0xa1b2c3d4, 2, 4, 0, 0, 65535,
+                                    LINKTYPE_ETHERNET if udp else LINKTYPE_USER0))
+
+    def write(self, packet, timestamp=None):
+        """
+        Add a packet to the capture.
+        :param packet: The packet: bytes-like, or an object with a packetize() method such as Serialize.
+        :param timestamp: (default=None) Capture time in seconds since the epoch; now if None.
+        """
+        packetize = getattr(packet, "packetize", None)
+        data = packetize() if packetize is not None else bytes(packet)
+        if self.udp:
+            data = self.__frame(data)
+        if timestamp is None:
+            timestamp = time.time()
+        seconds = int(timestamp)
+        self.file.write(struct.pack('<LLLL', seconds, int(round((timestamp - seconds) * 1e6)), len(data), len(data)))
+        self.file.write(data)
+
+    def __frame(self, payload):
+        ip_size = _IPV4_LAYOUT.size()
+        udp_size = _UDP_LAYOUT.size()
+        header = bytearray(_ETHERNET_LAYOUT.size() + ip_size + udp_size)
+        offset = _ETHERNET_LAYOUT.pack_into(header)
+        self.__ident = (self.__ident + 1) & 0xffff
+        end = _IPV4_LAYOUT.pack_into(header, offset, total_length=ip_size + udp_size + len(payload), id=self.__ident,
+                                     src=self.src[0], dst=self.dst[0])
+        header[offset + 10:offset + 12] = _checksum(header[offset:end]).to_bytes(2, "big")
+        _UDP_LAYOUT.pack_into(header, end, sport=self.src[1], dport=self.dst[1], length=udp_size + len(payload))
+        return bytes(header) + payload
+
+    def close(self):
+        """
+        Flush the capture, and close the file if the writer opened it.
+        """
+        self.file.flush()
+        if self.__owned:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,145 @@
+"""
+Registry of value codecs: matched functions that turn the raw bytes of a field into a value, and a value back into
+bytes, for formats such as IPv4 and IPv6 addresses.
+"""
+# Author: Justin Roosenschoon <jeroosenschoon@gmail.com>
+
+# Licence: MIT License (c) 2021 Justin Roosenschoon
+
+import re
+from socket import inet_aton, inet_ntoa, inet_ntop, inet_pton, AF_INET6
+
+from serializeme.cache import plans, templates
+from serializeme.exceptions import InvalidField, InvalidValue
+
+HOST = "host"
+IPv4 = "IPv4"
+IPv6 = "IPv6"
+MAC = "MAC"
+
+# Field kinds and sizes ("2B", "16b") that are not codecs, and cannot be registered as one.
+_RESERVED = ("null_terminate", "prefix_length", "prefix_len_null_term", "dns_name", "sized")
+_SIZE = re.compile("[0-9]+b$")
+
+
+class Codec:
+    """
+    Matched decode and encode functions of a value format.
+
+    Parameters
+    ----------
+    :param name: Name of the format, used in format dictionaries. Names are case-insensitive.
+    :param decode: Function of the raw bytes of a field (bytes or memoryview) returning its value.
+    :param encode: (default=None) Function of a value returning its bytes, or None if the format is decode-only.
+    :param size: (default=None) Size in bytes of every encoded value, or None if it varies.
+    """
+    __slots__ = ('name', 'decode', 'encode', 'size')
+
+    def __init__(self, name, decode, encode=None, size=None):
+        self.name = name
+        self.decode = decode
+        self.encode = encode
+        self.size = size
+
+    def measure(self, value):
+        """
+        Number of bytes value takes once encoded.
+        """
+        if self.size is not None:
+            return self.size
+        return len(self.encode(value))
+
+
+_CODECS = {}
+
+
+def register(name, decode, encode=None, size=None, replace=False):
+    """
+    Register a value codec. Schemas and templates look codecs up when they are compiled, so register them once, at
+    import time, before the formats that use them are compiled.
+    :param name: Name of the format (case-insensitive), as used in format dictionaries: ("16B", name) for
+                 Deserialize and (name, value) for Serialize. Fields of a codec with a size may also be given by name
+                 alone in Deserialize formats.
+    :param decode: Function of the raw bytes of a field (bytes or memoryview) returning its value.
+    :param encode: (default=None) Function of a value returning its bytes, or None if the format is decode-only.
+    :param size: (default=None) Size in bytes of every encoded value, or None if it varies.
+    :param replace: (default=False) Replace a codec of the same name. The plans compiled with the old codec are
+                    dropped from serializeme.cache.plans and serializeme.cache.templates; Schema and Template objects
+                    compiled before keep it.
+    :return: Codec: The registered codec.
+    :raises InvalidField: If the name is taken and not replace, or is a size or one of the variable-length kinds.
+    """
+    key = name.lower()
+    if key in _RESERVED or _SIZE.match(key):
+        raise InvalidField(name, "Not a codec name")
+    if key in _CODECS and not replace:
+        raise InvalidField(name, "Codec already registered")
+    codec = Codec(name, decode, encode, size)
+    _CODECS[key] = codec
+    if replace:
+        plans.clear()
+        templates.clear()
+    return codec
+
+
+def lookup(name):
+    """
+    Get the codec of a format name.
+    :param name: The name (case-insensitive).
+    :return: Codec, or None if no codec has that name.
+    """
+    if not isinstance(name, str):
+        return None
+    return _CODECS.get(name.lower())
+
+
+def _decode_ipv4(bites):
+    if len(bites) == 4:
+        return inet_ntoa(bites)
+    return '.'.join(map(str, bites))
+
+
+def _decode_ipv6(bites):
+    if len(bites) == 16:
+        return inet_ntop(AF_INET6, bites)
+    digits = bites.hex()
+    return ':'.join(digits[i:i + 4] for i in range(0, len(digits), 4))
+
+
+def _encode_ipv6(value):
+    return inet_pton(AF_INET6, value)
+
+
+# Latin-1 characters that are not printable are shown as '.'.
+_PRINTABLE = bytes(c if chr(c).isprintable() else ord('.') for c in range(256))
+
+
+def _decode_host(bites):
+    # The first byte is the length of the first label; the lengths of the others become dots.
+    return bytes(bites[1:]).translate(_PRINTABLE).decode('latin-1')
+
+
+def _encode_host(value):
+    labels = [label.encode() for label in value.strip('.').split('.')] if value.strip('.') else []
+    return b''.join([bytes((len(label),)) + label for label in labels])
+
+
+def _decode_mac(bites):
+    return bites.hex(':')
+
+
+def _encode_mac(value):
+    if isinstance(value, str):
+        try:
+            value = bytes.fromhex(value.replace(':', '').replace('-', ''))
+        except ValueError:
+            raise InvalidValue(value, "Invalid MAC address")
+    if len(value) != 6:
+        raise InvalidValue(value, "Invalid MAC address")
+    return bytes(value)
+
+
+register(IPv4, _decode_ipv4, inet_aton, 4)
+register(IPv6, _decode_ipv6, _encode_ipv6, 16)
+register(HOST, _decode_host, _encode_host)
+register(MAC, _decode_mac, _encode_mac, 6)
@@ -0,0 +1,83 @@
+"""
+Helpers to generate, and exec, straight-line Python functions for compiled layouts.
+"""
+# Author: Justin Roosenschoon <jeroosenschoon@gmail.com>
+
+# Licence: MIT License (c) 2021 Justin Roosenschoon
+
+import linecache
+from itertools import count
+from types import MethodType, BuiltinMethodType
+
+_SERIAL = count()
+
+
+class Source:
+    """
+    Builder for the source of generated functions, in the spirit of namedtuple and dataclasses. Objects the code needs
+    (struct methods, formatters, exceptions) are bound as globals of the generated functions rather than looked up
+    per call.
+
+    Attributes
+    ----------
+    lines: list of source lines written so far.
+    namespace: dictionary of globals the source is executed with.
+    """
+
+    def __init__(self):
+        self.lines = []
+        self.namespace = {}
+        self.__level = 0
+        self.__names = {}
+        self.__consts = {}
+
+    def line(self, text):
+        """
+        Add a line at the current indentation.
+        """
+        self.lines.append('    ' * self.__level + text)
+
+    def indent(self, level=1):
+        """
+        Change the indentation of the following lines by level.
+        """
+        self.__level += level
+
+    def name(self, hint):
+        """
+        Get a fresh local variable name.
+        :param hint: Prefix of the name.
+        :return: str: hint followed by a number unique in this source.
+        """
+        number = self.__names.get(hint, 0)
+        self.__names[hint] = number + 1
+        return hint + str(number)
+
+    def const(self, value, hint):
+        """
+        Bind an object as a global of the generated code. The same object is bound once.
+        :param value: The object.
+        :param hint: Prefix of the global name.
+        :return: str: The name to use in the source.
+        """
+        # Bound methods are created on every attribute access but compare equal; anything else is bound by identity.
+        key = value if isinstance(value, (MethodType, BuiltinMethodType)) else id(value)
+        if key not in self.__consts:
+            name = '_' + self.name(hint)
+            self.namespace[name] = value
+            # Keep a reference so the id cannot be reused by another object while the source is built.
+            self.__consts[key] = (name, value)
+        return self.__consts[key][0]
+
+    def build(self, label):
+        """
+        Execute the source and return the functions it defines. The source is registered with linecache, so
+        tracebacks and inspect.getsource() show the generated lines.
+        :param label: Short description used in the file name of the source.
+        :return: (namespace, source): the globals after execution, and the source text.
+        """
+        source = '\n'.join(self.lines) + '\n'
+        filename = '<serializeme {} {}>'.format(label, next(_SERIAL))
+        exec(compile(source, filename, 'exec'), self.namespace)
+        linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+        return self.namespace, source
@@ -1,300 +1,1340 @@
+import re
 import struct
+from operator import itemgetter
+from time import perf_counter
 
 from serializeme.field import Field
+from serializeme.codegen import Source
+from serializeme.instrument import Stats, StepProbe
+from serializeme.cache import plans
+from serializeme.codec import lookup, HOST, IPv4, IPv6, MAC
+from serializeme.exceptions import InvalidSize, InvalidField, IncompletePacket, FieldNotFound
 
-HOST = "host"
-IPv4 = "IPv4"
-IPv6 = "IPv6"
 NULL_TERMINATE = "null_terminate"  # two \x00\x00
 PREFIX_LEN_NULL_TERM = "prefix_len_null_term"
 PREFIX_LENGTH = "prefix_length"  # \x03 = length of 3
+DNS_NAME = "dns_name"  # \x06google\x03com\x00, or labels ending in a \xc0 compression pointer
+SIZED = "sized"  # as many bytes as the value of the length field that names it, such as RDATA after RDLENGTH
+
+
+_NULL = re.compile(b'\x00')
+
+# Default formatter of PREFIX_LEN_NULL_TERM fields.
+_format_hostname = lookup(HOST).decode
 
 
 class Deserialize:
-    __sizes = {
-        'b': 1,  # bit
-        'B': 1  # byte
-    }
-    __struct_sizes = {
-        'b': 'b',
-        'B': {
-            1: 'B',
-            2: 'H',
-            4: 'L',
-            8: 'Q'
-        }
-    }
-
-    def __init__(self, packet, data):
+    """
+    Deserialize object that decodes a packet given the way its bytes are laid out. The packet may be any object
+    supporting the buffer protocol (bytes, bytearray, memoryview, mmap); fields are read in place with
+    struct.unpack_from and terminator searches, without copying the packet.
+
+    Parameters
+    ----------
+    :param packet: The packet to decode.
+    :param data: The packet format dictionary, or a Schema compiled from one. Dictionaries are compiled once per
+                 process and kept in serializeme.cache.plans.
+    :param lazy: (default=False) Only locate the fields when the object is created. Each field is then decoded the
+                 first time get_field or get_value asks for it (or for a field decoded along with it), and cached.
+                 Accessing fields decodes everything.
+    :param compact: (default=False) Only store a tuple of the decoded values, in the order of fields; count sections
+                    are tuples of record tuples. get_value reads the tuple directly, while get_field and fields build
+                    Field objects from the schema on demand. Variable-length fields of these Field objects have their
+                    kind (NULL_TERMINATE, ...) as size. Cannot be combined with lazy.
+
+    Attributes
+    ----------
+    fields: list of Field objects decoded from the packet.
+    variables: dictionary of section name -> count, from the fields that drive count sections.
+    values: tuple of the decoded values, or None unless compact.
+    size: Number of bytes of the packet that were decoded.
+    """
+
+    def __init__(self, packet, data, lazy=False, compact=False):
+        if lazy and compact:
+            raise ValueError("lazy and compact cannot be combined")
         self.packet = packet
-        self.data = data
-        self.fields = []
         self.variables = {}
-        self.__readPacket()
+        if isinstance(data, Schema):
+            self.data = data.data
+        else:
+            self.data = data
+            data = plans.get(data, Schema)
+        self.__schema = data
+        self.__offsets = None
+        self.values = None
+        if lazy:
+            self.__offsets = []
+            self.__decoded = {}
+            self.size = data._locate(packet, 0, self.__offsets, self.variables)
+        elif compact:
+            values = []
+            self.size = data._read_values(packet, 0, values, self.variables)
+            self.values = tuple(values)
+        else:
+            self.fields = []
+            self.size = data._read(packet, 0, self.fields, self.variables)
+        self.variables.pop(_NAMES, None)
+
+    def __getattr__(self, name):
+        # Only called for missing attributes: the fields of a lazy or compact object, built on first access.
+        if name != "fields":
+            raise AttributeError(name)
+        if self.__dict__.get("_Deserialize__offsets") is not None:
+            fields = []
+            for number in range(len(self.__offsets)):
+                fields.extend(self.__decode_step(number))
+        elif self.__dict__.get("values") is not None:
+            fields = _views(self.__schema.descriptors, self.__schema.sections, self.values)
+        else:
+            raise AttributeError(name)
+        self.fields = fields
+        return fields
+
+    def __decode_step(self, number):
+        """
+        Decode one step of a lazy object, once.
+        :return: list of Field objects of that step.
+        """
+        fields = self.__decoded.get(number)
+        if fields is None:
+            fields = []
+            self.__schema.steps[number].read(self.packet, self.__offsets[number], fields, self.variables)
+            self.variables.pop(_NAMES, None)
+            self.__decoded[number] = fields
+        return fields
+
+    @staticmethod
+    def compile(data, codegen=False):
+        """
+        Compile a packet format dictionary into a reusable Schema.
+        :param data: The packet format dictionary, as passed to Deserialize.
+        :param codegen: (default=False) Also generate straight-line Python decode functions for the format; the
+                        generated code is in the schema's source attribute.
+        :return: Schema: decode plan whose unpack(packet) returns a Deserialize object.
+        """
+        return Schema(data, codegen)
+
+    def get_field(self, field_name, *path):
+        """
+        Get a field by name (case-insensitive) or by its position in fields, using the schema's index. Fields of
+        count sections are reached with a path of record numbers and field names, such as
+        get_field("ANSWERS", 3, "ttl").
+        :param field_name: The name or position of the desired field.
+        :param path: Alternating record numbers and field names inside count sections.
+        :return: Field: Field object found, or None if there is no such field.
+        """
+        schema = self.__schema
+        if self.values is not None and "fields" not in self.__dict__:
+            return self.__view(field_name, path)
+        if isinstance(field_name, int):
+            f = self.fields[field_name]
+        elif self.__offsets is not None:
+            location = schema.locations.get(field_name.lower())
+            if location is None:
+                return None
+            f = self.__decode_step(location[0])[location[1]]
+        else:
+            position = schema.index.get(field_name.lower())
+            if position is None:
+                return None
+            f = self.fields[position]
+        if path:
+            if len(path) % 2:
+                raise InvalidField(path, "Path must alternate record numbers and field names. Received")
+            sections = schema.sections
+            for record, sub_name in zip(path[::2], path[1::2]):
+                section = sections.get(f.name.lower())
+                if section is None:
+                    raise InvalidField(f.name, "Not a count section")
+                position = section.index.get(sub_name.lower())
+                if position is None:
+                    return None
+                f = f.value[record][position]
+                sections = section.sections
+        return f
+
+    def get_value(self, field_name, *path):
+        """
+        Get the value of a field; see get_field.
+        :return: The value of the field, or None if there is no such field.
+        """
+        if self.values is not None:
+            found = self.__lookup(field_name, path)
+            if found is None:
+                return None
+            descriptors, sections, values, position = found
+            value = values[position]
+            section = sections.get(descriptors[position][0].lower()) if descriptors[position][1] is None else None
+            if section is not None:
+                return [_views(section.descriptors, section.sections, record) for record in value]
+            return value
+        f = self.get_field(field_name, *path)
+        return None if f is None else f.value
+
+    def __lookup(self, field_name, path):
+        """
+        Find a field in the values tuple of a compact object.
+        :return: (descriptors, sections, values, position) of the record holding the field, or None.
+        """
+        schema = self.__schema
+        descriptors, sections, values = schema.descriptors, schema.sections, self.values
+        if isinstance(field_name, int):
+            position = range(len(values))[field_name]
+        else:
+            position = schema.index.get(field_name.lower())
+            if position is None:
+                return None
+        if len(path) % 2:
+            raise InvalidField(path, "Path must alternate record numbers and field names. Received")
+        for record, sub_name in zip(path[::2], path[1::2]):
+            name = descriptors[position][0]
+            section = sections.get(name.lower()) if descriptors[position][1] is None else None
+            if section is None:
+                raise InvalidField(name, "Not a count section")
+            values = values[position][record]
+            position = section.index.get(sub_name.lower())
+            if position is None:
+                return None
+            descriptors, sections = section.descriptors, section.sections
+        return descriptors, sections, values, position
+
+    def __view(self, field_name, path):
+        found = self.__lookup(field_name, path)
+        if found is None:
+            return None
+        descriptors, sections, values, position = found
+        return _view(descriptors, sections, values, position)
+
+
+# Struct codes for byte-aligned integers, keyed by width in bytes.
+_INT_CODES = {1: 'B', 2: 'H', 4: 'L', 8: 'Q'}
+
+# Slot kinds used by _FixedRun.
+_INT = 0  # unsigned big-endian integer
+_STR = 1  # raw bytes of any other width, decoded as latin-1
+_FMT = 2  # raw bytes handed to a formatter (HOST, IPv4, IPv6)
+_BITS = 3  # "!!" bit group split with shifts and masks; "NAME!!2B" also gives a dict of all its flags
+
+
+def _parse_size(size_str):
+    """
+    Parse a size string such as '2B' or '4b' into a (count, unit) pair. An empty string is one bit.
+    :param size_str: The size string.
+    :return: (int, str): The count and the unit ('b' or 'B').
+    """
+    if size_str == "":
+        return 1, 'b'
+    if not isinstance(size_str, str) or len(size_str) < 2 or size_str[-1] not in 'bB' \
+            or not size_str[:-1].isdigit():
+        raise InvalidSize(size_str)
+    return int(size_str[:-1]), size_str[-1]
+
+
+def _find_null(packet, index):
+    """
+    Find the next null byte at or after index in any buffer.
+    """
+    try:
+        end = packet.find(b'\x00', index)
+    except AttributeError:
+        # memoryview has no find(); re searches any buffer in place.
+        match = _NULL.search(packet, index)
+        end = match.start() if match else -1
+    if end < 0:
+        raise IncompletePacket(len(packet) + 1, len(packet))
+    return end
+
+
+# Key of the per-packet memo of decoded DNS names in Deserialize.variables; popped once a packet is decoded.
+_NAMES = object()
+
+
+def _read_name(packet, index, variables):
+    """
+    Decode a possibly compressed DNS name (RFC 1035 4.1.4). Names are memoized by offset for the packet, so a suffix
+    that many names point to is only decoded once. A pointer must point before the labels it ends, which rules out
+    loops.
+    :return: (name, end): The dotted name, and the offset just past it in the packet.
+    """
+    memo = variables.get(_NAMES)
+    if memo is None:
+        memo = variables[_NAMES] = {}
+    labels = []
+    end = None
+    start = position = index
+    while True:
+        if position >= len(packet):
+            raise IncompletePacket(position + 1, len(packet))
+        length = packet[position]
+        if length == 0:
+            position += 1
+            suffix = ''
+            break
+        if length >= 0xc0:
+            if position + 2 > len(packet):
+                raise IncompletePacket(position + 2, len(packet))
+            target = ((length & 0x3f) << 8) | packet[position + 1]
+            if end is None:
+                end = position + 2
+            if target >= start:
+                raise InvalidField(target, "DNS name pointer does not point back. Received")
+            if target in memo:
+                suffix = memo[target]
+                break
+            start = position = target
+            continue
+        if length > 63:
+            raise InvalidField(length, "Unsupported DNS label type. Received")
+        label_end = position + length + 1
+        if label_end > len(packet):
+            raise IncompletePacket(label_end, len(packet))
+        labels.append((position, str(packet[position + 1:label_end], 'latin-1')))
+        position = label_end
+    if end is None:
+        end = position
+    name = suffix
+    for (offset, label) in reversed(labels):
+        name = label + '.' + name if name else label
+        memo[offset] = name
+    return name, end
+
+
+def _skip_name(packet, index):
+    """
+    Find the end of a DNS name without decoding it: the inline labels end at a null byte or a pointer.
+    """
+    position = index
+    while True:
+        if position >= len(packet):
+            raise IncompletePacket(position + 1, len(packet))
+        length = packet[position]
+        if length == 0:
+            return position + 1
+        if length >= 0xc0:
+            if position + 2 > len(packet):
+                raise IncompletePacket(position + 2, len(packet))
+            return position + 2
+        position += length + 1
+
+
+def _raw_value(bites):
+    """
+    Convert raw bytes to a field value: 1, 2 and 4 byte fields are integers, anything else is a latin-1 string.
+    """
+    if len(bites) in (1, 2, 4):
+        return int.from_bytes(bites, "big")
+    return str(bites, 'latin-1')
+
 
-    def __read_portion(self, index, name, size, format, variable):
-        length = size * self.__sizes[format]
-        new_index = index + length
-        struct_str = '!'
+class _FixedRun:
+    """
+    A run of consecutive fixed-width fields decoded with a single struct.Struct.
+    """
+    def __init__(self):
+        self.codes = []
+        self.slots = []
+        self.size = 0
+        self.struct = None
 
-        if size in [1, 2, 4]:
-            struct_str += self.__struct_sizes[format][size]
+    def add(self, kind, name, nbytes, arg=None, variable=''):
+        if kind == _STR or kind == _FMT or nbytes not in _INT_CODES:
+            self.codes.append(str(nbytes) + 's')
         else:
-            for i in range(0, size):
-                struct_str += 'B'
+            self.codes.append(_INT_CODES[nbytes])
+        self.slots.append((kind, name, nbytes, arg, variable))
+        self.size += nbytes
 
-        val = struct.unpack(struct_str, self.packet[index:new_index])
+    def seal(self):
+        self.struct = struct.Struct('!' + ''.join(self.codes))
+        self.slots = tuple(self.slots)
+        # Label of the run, for instrumentation: the names of its fields (or of the flags of an unnamed bit group).
+        self.name = ','.join(name or ','.join(sub[0] for sub in arg) for (kind, name, nbytes, arg, variable)
+                             in self.slots)
+        # Runs of plain integers without count fields need no per-value work.
+        self.plain = all(kind == _INT and not variable for (kind, name, nbytes, arg, variable) in self.slots)
+        # Integer count fields, so skip() can set variables without decoding the rest of the run.
+        self.counts = []
+        offset = 0
+        for (kind, name, nbytes, arg, variable) in self.slots:
+            if variable:
+                if kind != _INT:
+                    self.counts = None
+                    break
+                self.counts.append((offset, struct.Struct('!' + _INT_CODES[nbytes]), variable))
+            offset += nbytes
 
-        if len(val) > 1:
-            val = ''.join(chr(i) for i in val)
+    def read_values(self, packet, index, values, variables):
+        try:
+            raw = self.struct.unpack_from(packet, index)
+        except struct.error:
+            raise IncompletePacket(index + self.size, len(packet))
+        if self.plain:
+            values.extend(raw)
+            return index + self.size
+        for (kind, name, nbytes, arg, variable), val in zip(self.slots, raw):
+            if kind == _BITS:
+                if nbytes not in _INT_CODES:
+                    val = int.from_bytes(val, "big")
+                if name:
+                    values.append({sub_name: (val >> shift) & mask for (sub_name, shift, mask, nbits) in arg})
+                values.extend([(val >> shift) & mask for (sub_name, shift, mask, nbits) in arg])
+                continue
+            if kind == _STR:
+                val = str(val, 'latin-1')
+            elif kind == _FMT:
+                val = arg(val)
+            if variable:
+                variables[variable] = val
+            values.append(val)
+        return index + self.size
+
+    def emit(self, src, target, values):
+        """
+        Write the source of read (or read_values, if values) for this run. The generated code uses the local names
+        packet, index and variables, and appends to the list named target.
+        """
+        raw = [src.name('v') for slot in self.slots]
+        src.line('try:')
+        src.line('    {} = {}(packet, index)'.format(', '.join(raw) + (',' if len(raw) == 1 else ''),
+                                               src.const(self.struct.unpack_from, 'unpack')))
+        src.line('except {}:'.format(src.const(struct.error, 'struct_error')))
+        src.line('    raise {}(index + {}, len(packet))'.format(src.const(IncompletePacket, 'IncompletePacket'),
+                                                            self.size))
+        field = src.const(Field, 'Field')
+        items = []
+        for (kind, name, nbytes, arg, variable), val in zip(self.slots, raw):
+            if kind == _BITS:
+                if nbytes not in _INT_CODES:
+                    src.line('{0} = {1}({0}, "big")'.format(val, src.const(int.from_bytes, 'from_bytes')))
+                subs = [(sub_name, '({} >> {}) & {}'.format(val, shift, mask), nbits)
+                        for (sub_name, shift, mask, nbits) in arg]
+                if name:
+                    group = '{' + ', '.join('{!r}: {}'.format(sub_name, expr) for (sub_name, expr, nbits) in subs) + '}'
+                    items.append(group if values else '{}({!r}, {!r}, {})'.format(field, name, nbytes * 8, group))
+                for (sub_name, expr, nbits) in subs:
+                    items.append(expr if values else '{}({!r}, {!r}, {})'.format(field, sub_name, nbits, expr))
+                continue
+            if kind == _STR:
+                src.line("{0} = str({0}, 'latin-1')".format(val))
+            elif kind == _FMT:
+                src.line('{0} = {1}({0})'.format(val, src.const(arg, 'format')))
+                nbytes = str(nbytes) + 'B'
+            if variable:
+                src.line('variables[{!r}] = {}'.format(variable, val))
+            items.append(val if values else '{}({!r}, {!r}, {})'.format(field, name, nbytes, val))
+        src.line('{}.extend([{}])'.format(target, ', '.join(items)))
+        src.line('index += {}'.format(self.size))
+
+    def skip(self, packet, index, fields, variables):
+        if self.counts is None:
+            return self.read(packet, index, [], variables)
+        if index + self.size > len(packet):
+            raise IncompletePacket(index + self.size, len(packet))
+        for (offset, count, variable) in self.counts:
+            variables[variable] = count.unpack_from(packet, index + offset)[0]
+        return index + self.size
+
+    def read(self, packet, index, fields, variables):
+        try:
+            values = self.struct.unpack_from(packet, index)
+        except struct.error:
+            raise IncompletePacket(index + self.size, len(packet))
+        for (kind, name, nbytes, arg, variable), val in zip(self.slots, values):
+            if kind == _BITS:
+                if nbytes not in _INT_CODES:
+                    val = int.from_bytes(val, "big")
+                if name:
+                    fields.append(Field(name, nbytes * 8, {sub_name: (val >> shift) & mask
+                                                           for (sub_name, shift, mask, nbits) in arg}))
+                for (sub_name, shift, mask, nbits) in arg:
+                    fields.append(Field(sub_name, nbits, (val >> shift) & mask))
+                continue
+            if kind == _STR:
+                val = str(val, 'latin-1')
+            elif kind == _FMT:
+                val = arg(val)
+                nbytes = str(nbytes) + 'B'
+            if variable:
+                variables[variable] = val
+            fields.append(Field(name, nbytes, val))
+        return index + self.size
+
+
+class _Terminated:
+    """
+    A NULL_TERMINATE or PREFIX_LEN_NULL_TERM field, read up to (and past) the next null byte.
+    """
+    def __init__(self, name, kind, formatter, variable):
+        self.name = name
+        self.kind = kind
+        self.formatter = formatter
+        self.variable = variable
+
+    def read(self, packet, index, fields, variables):
+        end = _find_null(packet, index)
+        val = self.formatter(packet[index:end])
+        if self.variable:
+            variables[self.variable] = val
+        fields.append(Field(self.name, str(end + 1 - index) + 'B', val))
+        return end + 1
+
+    def read_values(self, packet, index, values, variables):
+        end = _find_null(packet, index)
+        val = self.formatter(packet[index:end])
+        if self.variable:
+            variables[self.variable] = val
+        values.append(val)
+        return end + 1
+
+    def emit(self, src, target, values):
+        end = src.name('end')
+        val = src.name('v')
+        src.line('{} = {}(packet, index)'.format(end, src.const(_find_null, 'find_null')))
+        src.line('{} = {}(packet[index:{}])'.format(val, src.const(self.formatter, 'format'), end))
+        if self.variable:
+            src.line('variables[{!r}] = {}'.format(self.variable, val))
+        if values:
+            src.line('{}.append({})'.format(target, val))
+        else:
+            src.line("{}.append({}({!r}, str({} + 1 - index) + 'B', {}))".format(
+                target, src.const(Field, 'Field'), self.name, end, val))
+        src.line('index = {} + 1'.format(end))
+
+    def skip(self, packet, index, fields, variables):
+        if self.variable:
+            return self.read(packet, index, [], variables)
+        return _find_null(packet, index) + 1
+
+
+class _Prefixed:
+    """
+    A PREFIX_LENGTH field: one length byte followed by that many bytes of data.
+    """
+    kind = PREFIX_LENGTH
+
+    def __init__(self, name, formatter, variable):
+        self.name = name
+        self.formatter = formatter
+        self.variable = variable
+
+    def read(self, packet, index, fields, variables):
+        if index >= len(packet):
+            raise IncompletePacket(index + 1, len(packet))
+        size = packet[index]
+        end = index + size + 1
+        if end > len(packet):
+            raise IncompletePacket(end, len(packet))
+        if self.formatter is not None:
+            # Formatters see the length byte too, so HOST can treat it as the first label length.
+            val = self.formatter(packet[index:end])
+            f = Field(self.name, str(size) + 'B', val)
+        else:
+            val = _raw_value(packet[index + 1:end])
+            f = Field(self.name, size, val)
+        if self.variable:
+            variables[self.variable] = val
+        fields.append(f)
+        return end
+
+    def read_values(self, packet, index, values, variables):
+        if index >= len(packet):
+            raise IncompletePacket(index + 1, len(packet))
+        end = index + packet[index] + 1
+        if end > len(packet):
+            raise IncompletePacket(end, len(packet))
+        if self.formatter is not None:
+            val = self.formatter(packet[index:end])
+        else:
+            val = _raw_value(packet[index + 1:end])
+        if self.variable:
+            variables[self.variable] = val
+        values.append(val)
+        return end
+
+    def emit(self, src, target, values):
+        incomplete = src.const(IncompletePacket, 'IncompletePacket')
+        size = src.name('size')
+        end = src.name('end')
+        val = src.name('v')
+        src.line('if index >= len(packet):')
+        src.line('    raise {}(index + 1, len(packet))'.format(incomplete))
+        src.line('{} = packet[index]'.format(size))
+        src.line('{} = index + {} + 1'.format(end, size))
+        src.line('if {} > len(packet):'.format(end))
+        src.line('    raise {}({}, len(packet))'.format(incomplete, end))
+        if self.formatter is not None:
+            src.line('{} = {}(packet[index:{}])'.format(val, src.const(self.formatter, 'format'), end))
+            size = "str({}) + 'B'".format(size)
         else:
-            val = val[0]
+            src.line('{} = {}(packet[index + 1:{}])'.format(val, src.const(_raw_value, 'raw_value'), end))
+        if self.variable:
+            src.line('variables[{!r}] = {}'.format(self.variable, val))
+        if values:
+            src.line('{}.append({})'.format(target, val))
+        else:
+            src.line('{}.append({}({!r}, {}, {}))'.format(target, src.const(Field, 'Field'), self.name, size, val))
+        src.line('index = {}'.format(end))
+
+    def skip(self, packet, index, fields, variables):
+        if self.variable:
+            return self.read(packet, index, [], variables)
+        if index >= len(packet):
+            raise IncompletePacket(index + 1, len(packet))
+        end = index + packet[index] + 1
+        if end > len(packet):
+            raise IncompletePacket(end, len(packet))
+        return end
+
+
+class _Sized:
+    """
+    A SIZED field: as many bytes as the value of the earlier field whose variable is its name.
+    """
+    kind = SIZED
+
+    def __init__(self, name, formatter, variable):
+        self.name = name
+        self.formatter = formatter
+        self.variable = variable
+
+    def read(self, packet, index, fields, variables):
+        end = index + variables[self.name]
+        if end > len(packet):
+            raise IncompletePacket(end, len(packet))
+        if self.formatter is not None:
+            val = self.formatter(packet[index:end])
+        else:
+            val = _raw_value(packet[index:end])
+        if self.variable:
+            variables[self.variable] = val
+        fields.append(Field(self.name, str(end - index) + 'B', val))
+        return end
+
+    def read_values(self, packet, index, values, variables):
+        end = index + variables[self.name]
+        if end > len(packet):
+            raise IncompletePacket(end, len(packet))
+        if self.formatter is not None:
+            val = self.formatter(packet[index:end])
+        else:
+            val = _raw_value(packet[index:end])
+        if self.variable:
+            variables[self.variable] = val
+        values.append(val)
+        return end
 
-        if 'variable' in locals() and len(variable) > 0:
-            self.variables[variable] = val
+    def emit(self, src, target, values):
+        end = src.name('end')
+        val = src.name('v')
+        src.line('{} = index + variables[{!r}]'.format(end, self.name))
+        src.line('if {} > len(packet):'.format(end))
+        src.line('    raise {}({}, len(packet))'.format(src.const(IncompletePacket, 'IncompletePacket'), end))
+        src.line('{} = {}(packet[index:{}])'.format(
+            val, src.const(self.formatter or _raw_value, 'format'), end))
+        if self.variable:
+            src.line('variables[{!r}] = {}'.format(self.variable, val))
+        if values:
+            src.line('{}.append({})'.format(target, val))
+        else:
+            src.line("{}.append({}({!r}, str({} - index) + 'B', {}))".format(
+                target, src.const(Field, 'Field'), self.name, end, val))
+        src.line('index = {}'.format(end))
+
+    def skip(self, packet, index, fields, variables):
+        if self.variable:
+            return self.read(packet, index, [], variables)
+        end = index + variables[self.name]
+        if end > len(packet):
+            raise IncompletePacket(end, len(packet))
+        return end
+
+
+class _Name:
+    """
+    A DNS_NAME field: a sequence of labels that may end in a compression pointer, decoded to a dotted name.
+    """
+    kind = DNS_NAME
+
+    def __init__(self, name, variable):
+        self.name = name
+        self.variable = variable
+
+    def read(self, packet, index, fields, variables):
+        (val, end) = _read_name(packet, index, variables)
+        if self.variable:
+            variables[self.variable] = val
+        fields.append(Field(self.name, str(end - index) + 'B', val))
+        return end
+
+    def read_values(self, packet, index, values, variables):
+        (val, end) = _read_name(packet, index, variables)
+        if self.variable:
+            variables[self.variable] = val
+        values.append(val)
+        return end
+
+    def emit(self, src, target, values):
+        val = src.name('v')
+        end = src.name('end')
+        src.line('{}, {} = {}(packet, index, variables)'.format(val, end, src.const(_read_name, 'read_name')))
+        if self.variable:
+            src.line('variables[{!r}] = {}'.format(self.variable, val))
+        if values:
+            src.line('{}.append({})'.format(target, val))
+        else:
+            src.line("{}.append({}({!r}, str({} - index) + 'B', {}))".format(
+                target, src.const(Field, 'Field'), self.name, end, val))
+        src.line('index = {}'.format(end))
 
-        f = Field(name, length, val)
+    def skip(self, packet, index, fields, variables):
+        if self.variable:
+            return self.read(packet, index, [], variables)
+        return _skip_name(packet, index)
 
-        return [new_index, f]
 
-    def __read_bit_string(self, bit_string):
-        if bit_string == "":
-            return [1, 'b']
-        size = ''
-        format = ''
-        # convert string into useful info
-        for c in list(bit_string):
-            if (c.isnumeric()):
-                size += c
+class _Section:
+    """
+    A count-driven section, repeated as many times as the value of the field that names it.
+    """
+    def __init__(self, name, steps):
+        self.name = name
+        self.steps = steps
+        (self.index, self.locations, self.sections, self.descriptors) = _index_steps(steps)
+
+    def read(self, packet, index, fields, variables):
+        start = index
+        all_data = []
+        for i in range(variables[self.name]):
+            data = []
+            for step in self.steps:
+                index = step.read(packet, index, data, variables)
+            all_data.append(data)
+        fields.append(Field(self.name, str(index - start) + 'B', all_data))
+        return index
+
+    def read_values(self, packet, index, values, variables):
+        records = []
+        for i in range(variables[self.name]):
+            record = []
+            for step in self.steps:
+                index = step.read_values(packet, index, record, variables)
+            records.append(tuple(record))
+        values.append(tuple(records))
+        return index
+
+    def emit(self, src, target, values):
+        start = src.name('start')
+        records = src.name('records')
+        record = src.name('record')
+        src.line('{} = index'.format(start))
+        src.line('{} = []'.format(records))
+        src.line('for _ in range(variables[{!r}]):'.format(self.name))
+        src.indent()
+        src.line('{} = []'.format(record))
+        for step in self.steps:
+            step.emit(src, record, values)
+        src.line('{}.append({})'.format(records, 'tuple({})'.format(record) if values else record))
+        src.indent(-1)
+        if values:
+            src.line('{}.append(tuple({}))'.format(target, records))
+        else:
+            src.line("{}.append({}({!r}, str(index - {}) + 'B', {}))".format(
+                target, src.const(Field, 'Field'), self.name, start, records))
+
+    def skip(self, packet, index, fields, variables):
+        for i in range(variables[self.name]):
+            for step in self.steps:
+                index = step.skip(packet, index, fields, variables)
+        return index
+
+
+def _compile_steps(data, counted):
+    """
+    Turn a Deserialize format dictionary into a tuple of decode steps.
+    :param data: The format dictionary.
+    :param counted: Set of section and SIZED field names referenced by count or length fields so far; updated in
+                    place.
+    :return: tuple of steps.
+    """
+    steps = []
+    run = None
+    for name, stuff in data.items():
+        if isinstance(stuff, dict) and '!!' not in name:
+            if name not in counted:
+                raise InvalidField(name, "No count field refers to section")
+            steps.append(_Section(name, _compile_steps(stuff, counted)))
+            run = None
+            continue
+
+        if '!!' in name:
+            (group, size_str) = name.split('!!', 1)
+            (size, unit) = _parse_size(size_str)
+            if unit == 'b':
+                if size % 8:
+                    raise InvalidSize(name, "Bit groups must be whole bytes. Received")
+                size //= 8
+            subs = []
+            shift = size * 8
+            for sub_name, sub_size in stuff.items():
+                (nbits, sub_unit) = _parse_size(sub_size)
+                if sub_unit == 'B':
+                    nbits *= 8
+                shift -= nbits
+                subs.append((sub_name, shift, (1 << nbits) - 1, nbits))
+            if shift < 0:
+                raise InvalidSize(name, "Bit group sub-fields do not fit in")
+            kind, name, nbytes, arg, variable = _BITS, group, size, tuple(subs), ''
+        else:
+            if isinstance(stuff, tuple):
+                format_str = stuff[0]
+                value_format = stuff[1] if len(stuff) > 1 else ''
+                variable = stuff[2] if len(stuff) > 2 else ''
             else:
-                format = c
-        return [int(size), format]
-
-    def __format_hostname(self, bites):
-        temp_str = []
-        for i in range(1, len(bites)):
-            char = bites[i:i+1].decode()
-            if char.isprintable():
-                temp_str.append(char)
+                format_str, value_format, variable = stuff, '', ''
+            formatter = None
+            if value_format:
+                codec = lookup(value_format)
+                if codec is None:
+                    raise InvalidField(value_format, "Unknown value format")
+                formatter = codec.decode
+            if variable:
+                counted.add(variable)
+
+            if format_str == NULL_TERMINATE or format_str == PREFIX_LEN_NULL_TERM:
+                if formatter is None:
+                    formatter = _format_hostname if format_str == PREFIX_LEN_NULL_TERM else _latin1
+                steps.append(_Terminated(name, format_str, formatter, variable))
+                run = None
+                continue
+            if format_str == PREFIX_LENGTH:
+                steps.append(_Prefixed(name, formatter, variable))
+                run = None
+                continue
+            if format_str == DNS_NAME:
+                if formatter is not None:
+                    raise InvalidField(value_format, "DNS_NAME fields are always decoded to dotted names. Received")
+                steps.append(_Name(name, variable))
+                run = None
+                continue
+            if format_str == SIZED:
+                if name not in counted:
+                    raise InvalidField(name, "No length field refers to field")
+                steps.append(_Sized(name, formatter, variable))
+                run = None
+                continue
+
+            codec = lookup(format_str)
+            if codec is not None and codec.size is not None:
+                # A codec name alone: a field of the codec's size, decoded by it.
+                (size, unit) = (codec.size, 'B')
+                formatter = formatter or codec.decode
+            else:
+                (size, unit) = _parse_size(format_str)
+            if unit == 'b':
+                if size % 8:
+                    raise InvalidSize(format_str, "Bit sizes outside a !! group must be whole bytes. Received")
+                size //= 8
+            nbytes = size
+            if formatter is not None:
+                kind, arg = _FMT, formatter
+            elif nbytes in (1, 2, 4):
+                kind, arg = _INT, None
             else:
-                temp_str.append('.')
-        return ''.join(temp_str)
-
-    def __format_ipv4(self, bites):
-        address = bites.hex()
-        s = str(address)
-        ip_address = ('.'.join(str(int(i, 16))
-                      for i in ([s[i:i + 2] for i in range(0, len(s), 2)])))
-        return ip_address
-
-    def __format_ipv6(self, bites):
-        s = str(bites.hex())
-        ip_address = ':'.join(s[i:i + 4] for i in (range(0, 16, 4)))
-        return ip_address
-
-    def __handle_custom_formatting(self, format, bits):
-        if format == IPv4:
-            return self.__format_ipv4(bits)
-        elif format == IPv6:
-            return self.__format_ipv6(bits)
-        elif format == HOST:
-            return self.__format_hostname(bits)
+                kind, arg = _STR, None
+
+        if run is None:
+            run = _FixedRun()
+            steps.append(run)
+        run.add(kind, name, nbytes, arg, variable)
+
+    for step in steps:
+        if isinstance(step, _FixedRun):
+            step.seal()
+    return tuple(steps)
+
+
+def _index_steps(steps):
+    """
+    Index the fields a tuple of steps produces. The number of fields each step appends is fixed, so positions can be
+    computed once per schema.
+    :return: (index, locations, sections, descriptors): dictionaries of lower-cased field name -> position in the
+             field list, -> (step number, position within the step), and -> _Section for count sections; and a
+             tuple of (name, size) for every position. The size is the one Field objects of fixed-width fields get;
+             variable-length fields have their kind (NULL_TERMINATE, ...) and count sections None.
+    """
+    index, locations, sections = {}, {}, {}
+    descriptors = []
+    for number, step in enumerate(steps):
+        if isinstance(step, _FixedRun):
+            names = []
+            for (kind, name, nbytes, arg, variable) in step.slots:
+                if kind == _BITS:
+                    if name:
+                        names.append((name, nbytes * 8))
+                    names.extend((sub[0], sub[3]) for sub in arg)
+                elif kind == _FMT:
+                    names.append((name, str(nbytes) + 'B'))
+                else:
+                    names.append((name, nbytes))
+        elif isinstance(step, _Section):
+            names = [(step.name, None)]
+            sections.setdefault(step.name.lower(), step)
         else:
-            return None
+            names = [(step.name, step.kind)]
+        for i, (name, size) in enumerate(names):
+            key = name.lower()
+            if key not in index:
+                index[key] = len(descriptors) + i
+                locations[key] = (number, i)
+        descriptors.extend(names)
+    return index, locations, sections, tuple(descriptors)
 
-    def __readPacket(self):
-        index = 0
-        for name, stuff in self.data.items():
-            if '!!' in name:
-                # Handle the bit issue
-                (size, n) = self.__read_bit_string(name[2:])
-                new_index = index + size
-                bits = bin(int.from_bytes(
-                    self.packet[index:new_index], byteorder="big")).strip('0b')
-                while len(bits) < size * 8:
-                    bits = "0" + bits
-                ind = 0
-                for thing in stuff:
-                    (s, form) = self.__read_bit_string(stuff[thing])
-                    new_ind = ind + s
-                    val = bits[ind:new_ind]
-                    val = int(val, 2)
-                    fp = Field(thing, s, val)
-                    self.fields.append(fp)
-                    ind = new_ind
-                index = new_index
-
-            elif type(stuff) == dict:
-                old_index = index  # save for length
-                all_data = []
-                for i in range(0, self.variables[name]):
-                    data = []
-                    for sub_name, sub_stuff in stuff.items():
-                        if type(sub_stuff) == tuple:
-                            (format_str, value_format) = sub_stuff
-                            if format_str == NULL_TERMINATE or format_str == PREFIX_LEN_NULL_TERM:
-                                null_count = 0
-                                front = index + 1
-                                back = index
-                                byte_queue = b''
-                                while null_count < 1:
-                                    if self.packet[back:front] == b'\x00':
-                                        null_count += 1
-                                    else:
-                                        byte_queue += self.packet[back:front]
-                                    front += 1
-                                    back += 1
-                                val = self.__handle_custom_formatting(
-                                    value_format, byte_queue)
-                                f = Field(sub_name, format_str, val)
-                                new_index = back  # dont forgot to update index for variable length
-                            elif format_str == PREFIX_LENGTH:
-                                size = int.from_bytes(
-                                    self.packet[index:index+1], "big")
-                                index = index + 1
-                                (new_index, f) = self.__read_portion(
-                                    index, name, size, 'B', '')
-                            else:
-                                (size, format) = self.__read_bit_string(format_str)
-                                length = size * self.__sizes[format]
-                                new_index = index + length
-                                dirty_bytes = self.packet[index:new_index]
-                                val = self.__handle_custom_formatting(
-                                    value_format, dirty_bytes)
-                                f = Field(sub_name, new_index - index, val)
-                        else:
-                            if sub_stuff == NULL_TERMINATE or sub_stuff == PREFIX_LEN_NULL_TERM:
-                                null_count = 0
-                                front = index + 1
-                                back = index
-                                byte_queue = b''
-                                while null_count < 1:
-                                    if self.packet[back:front] == b'\x00':
-                                        null_count += 1
-                                        break
-                                    else:
-                                        byte_queue += self.packet[back:front]
-                                    front += 1
-                                    back += 1
-                                if value_format != "":
-                                    val = self.__handle_custom_formatting(
-                                        value_format, byte_queue)
-                                else:
-                                    val = self.__format_hostname(byte_queue)
-                                f = Field(sub_name, sub_stuff, val)
-                                new_index = back  # dont forgot to update index for variable length
-                            elif sub_stuff == PREFIX_LENGTH:
-                                size = int.from_bytes(
-                                    self.packet[index:index+1], "big")
-                                index = index + 1
-                                (new_index, f) = self.__read_portion(
-                                    index, name, size, 'B', '')
-                            else:
-                                (size, format) = self.__read_bit_string(sub_stuff)
-                                (new_index, f) = self.__read_portion(
-                                    index, sub_name, size, format, "")
-                        data.append(f)
-                        index = new_index
-                    all_data.append(data)
-                custom_length = str(index - old_index) + 'B'
-                var_field = Field(name, custom_length, all_data)
-                self.fields.append(var_field)
+
+def _view(descriptors, sections, values, position):
+    """
+    Build a Field object for one position of a values tuple decoded with compact=True.
+    """
+    name, size = descriptors[position]
+    value = values[position]
+    if size is None:
+        section = sections[name.lower()]
+        value = [_views(section.descriptors, section.sections, record) for record in value]
+    return Field(name, size, value)
+
+
+def _views(descriptors, sections, values):
+    return [_view(descriptors, sections, values, position) for position in range(len(values))]
+
+
+def _latin1(bites):
+    return str(bites, 'latin-1')
+
+
+class _Picked:
+    """
+    The fields of a _FixedRun that a projection needs: the projected ones, and count fields. The struct skips the
+    bytes of the others as padding, so they are neither unpacked nor converted.
+    """
+    def __init__(self, run, wanted):
+        codes = []
+        slots = []
+        self.names = []
+        pad = 0
+        wanted = set(wanted)
+        for (kind, name, nbytes, arg, variable), code in zip(run.slots, run.codes):
+            if kind == _BITS:
+                group = name if name and name.lower() in wanted else ''
+                wanted.discard(group.lower())
+                subs = []
+                for sub in arg:
+                    if sub[0].lower() in wanted:
+                        subs.append(sub)
+                        wanted.discard(sub[0].lower())
+                keep = group or subs
+                if keep:
+                    self.names.extend(([group] if group else []) + [sub[0] for sub in subs])
+                    arg = (arg, tuple(subs))
+            else:
+                keep = name.lower() in wanted
+                if keep:
+                    self.names.append(name)
+                    wanted.discard(name.lower())
+            if not (keep or variable):
+                pad += nbytes
+                continue
+            if pad:
+                codes.append(str(pad) + 'x')
+                pad = 0
+            codes.append(code)
+            slots.append((kind, group if kind == _BITS else name, nbytes, arg, variable, bool(keep)))
+        if pad:
+            # Trailing padding still checks that the packet holds the whole run.
+            codes.append(str(pad) + 'x')
+        self.struct = struct.Struct('!' + ''.join(codes))
+        self.slots = tuple(slots)
+        self.size = run.size
+        self.plain = all(kind == _INT and not variable for (kind, name, nbytes, arg, variable, keep) in self.slots)
+
+    def read_values(self, packet, index, values, variables):
+        try:
+            raw = self.struct.unpack_from(packet, index)
+        except struct.error:
+            raise IncompletePacket(index + self.size, len(packet))
+        if self.plain:
+            values.extend(raw)
+            return index + self.size
+        for (kind, name, nbytes, arg, variable, keep), val in zip(self.slots, raw):
+            if kind == _BITS:
+                if nbytes not in _INT_CODES:
+                    val = int.from_bytes(val, "big")
+                (flags, subs) = arg
+                if name:
+                    values.append({sub_name: (val >> shift) & mask for (sub_name, shift, mask, nbits) in flags})
+                values.extend([(val >> shift) & mask for (sub_name, shift, mask, nbits) in subs])
+                continue
+            if kind == _STR:
+                val = str(val, 'latin-1')
+            elif kind == _FMT:
+                val = arg(val)
+            if variable:
+                variables[variable] = val
+            if keep:
+                values.append(val)
+        return index + self.size
+
+
+class _PickedSection:
+    """
+    A count section of which a projection needs only some fields. Every record is still walked, to find where the
+    next one starts.
+    """
+    def __init__(self, name, reads):
+        self.name = name
+        self.reads = reads
+
+    def read_values(self, packet, index, values, variables):
+        records = []
+        for i in range(variables[self.name]):
+            record = []
+            for read in self.reads:
+                index = read(packet, index, record, variables)
+            records.append(tuple(record))
+        values.append(tuple(records))
+        return index
+
+
+def _project_steps(steps, wanted, last):
+    """
+    Compile the steps a projection runs in place of a tuple of decode steps.
+    :param steps: The steps of a schema or count section.
+    :param wanted: Dictionary of lower-cased field name -> set of the paths asked for inside it, as tuples of
+                   lower-cased names; the empty path asks for the whole field.
+    :param last: Drop the steps after the last one with a projected field, as nothing needs to be found after it.
+                 Inside count sections, every step is run to find the next record.
+    :return: (reads, level): a tuple of functions called like read_values, which append the projected values only;
+             and (positions, levels): dictionaries of lower-cased field name -> position of its value, and of count
+             section name -> level of the section's records.
+    """
+    reads = []
+    positions = {}
+    levels = {}
+    needed = 0
+    for step in steps:
+        if isinstance(step, StepProbe):
+            step = step.step
+        if isinstance(step, _FixedRun):
+            # Only the first field of a name is projected, as get_value finds.
+            picked = _Picked(step, {key for key in wanted if key not in positions})
+            if picked.names:
+                for name in picked.names:
+                    positions[name.lower()] = len(positions)
+                reads.append(picked.read_values)
+                needed = len(reads)
+            else:
+                reads.append(step.skip)
+            continue
+        key = step.name.lower()
+        paths = wanted.get(key)
+        if paths is None or key in positions:
+            reads.append(step.skip)
+            continue
+        positions[key] = len(positions)
+        if isinstance(step, _Section):
+            if () in paths:
+                reads.append(step.read_values)
+                levels[key] = _full_level(step)
             else:
-                if (type(stuff) == tuple):
-                    format_str = stuff[0]
-                    value_format = stuff[1]
-                    variable = stuff[2] if len(stuff) > 2 else ''
-                    # handle variable length
-                    if format_str == NULL_TERMINATE or format_str == PREFIX_LEN_NULL_TERM:
-                        null_count = 0
-                        front = index + 1
-                        back = index
-                        byte_queue = b''
-                        while null_count < 1:
-                            if (self.packet[back:front] == b'\x00'):
-                                null_count += 1
-                            else:
-                                byte_queue += self.packet[back:front]
-                            front += 1
-                            back += 1
-                        val = self.__handle_custom_formatting(
-                            value_format, byte_queue)
-                        f = Field(name, str(back - index) + 'B', val)
-                        new_index = back
-                    elif format_str == PREFIX_LENGTH:
-                        if value_format != None:
-                            size = int.from_bytes(
-                                self.packet[index:index+1], "big")
-                            val = self.__handle_custom_formatting(
-                                value_format, self.packet[index:index+size+1])
-                            f = Field(name, str(size) + 'B', val)
-                            new_index = index + size + 1
-                        else:
-                            size = int.from_bytes(
-                                self.packet[index:index+1], "big")
-                            index = index + 1
-                            (new_index, f) = self.__read_portion(
-                                index, name, size, 'B', variable)
-                    else:
-                        if value_format in [HOST, IPv4, IPv6]:
-                            (size, format) = self.__read_bit_string(format_str)
-                            c = 0
-                            front = index + 1
-                            back = index
-                            byte_queue = b''
-                            while c < size:
-                                byte_queue += self.packet[back:front]
-                                front += 1
-                                back += 1
-                                c = c + 1
-                            val = self.__handle_custom_formatting(
-                                value_format, byte_queue)
-                            f = Field(name, str(back - index) + 'B', val)
-                            new_index = back
-                        else:
-                            (size, format) = self.__read_bit_string(format_str)
-                            (new_index, f) = self.__read_portion(
-                                index, name, size, format, variable)
+                (sub_reads, levels[key]) = _project_steps(step.steps, _group(paths, step.name), False)
+                reads.append(_PickedSection(step.name, sub_reads).read_values)
+        else:
+            if paths != {()}:
+                raise InvalidField(step.name, "Not a count section")
+            reads.append(step.read_values)
+        needed = len(reads)
+    if last:
+        reads = reads[:needed]
+    return tuple(reads), (positions, levels)
+
+
+def _full_level(section):
+    """
+    Level of the records of a count section decoded whole, as with compact=True.
+    """
+    steps = [step.step if isinstance(step, StepProbe) else step for step in section.steps]
+    return (section.index, {key: _full_level(sub) for key, sub in _index_steps(steps)[2].items()})
+
+
+def _group(paths, name):
+    """
+    Group paths by their first name.
+    :return: Dictionary of first name -> set of the rest of each path.
+    """
+    wanted = {}
+    for path in paths:
+        if not path:
+            raise InvalidField(name, "Empty field path")
+        wanted.setdefault(path[0], set()).add(path[1:])
+    return wanted
+
+
+def _split_path(path):
+    """
+    Split a field path such as "ANSWERS.address" or "ANSWERS[*].address" into lower-cased names.
+    """
+    if isinstance(path, str):
+        return tuple(name.lower() for name in path.replace('[*]', '').split('.'))
+    return tuple(name.lower() for name in path)
+
+
+def _getter(level, path, parts):
+    """
+    Build the function that takes the value of one path from the projected values.
+    """
+    (positions, levels) = level
+    position = positions.get(parts[0])
+    if position is None:
+        raise FieldNotFound(path)
+    if len(parts) == 1:
+        return itemgetter(position)
+    if parts[0] not in levels:
+        raise InvalidField(parts[0], "Not a count section")
+    inner = _getter(levels[parts[0]], path, parts[1:])
+    return lambda values: tuple([inner(record) for record in values[position]])
+
+
+class Projection:
+    """
+    Decode plan that reads only some fields of a Schema's format. Fixed-width fields outside the projection are
+    skipped by offset, variable-length ones by scanning their length byte or terminator, SIZED fields by the value
+    of their length field, and count sections that hold no projected field record by record without decoding them.
+    Nothing is read after the last projected field, so a packet truncated after it is not an error.
+
+    Parameters
+    ----------
+    :param schema: The Schema to project.
+    :param paths: Field paths (case-insensitive): a field name, or a count section name and the names inside it
+                  separated by dots, such as "ANSWERS.address" (or "ANSWERS[*].address"). A path may also be a
+                  tuple of names.
+
+    Attributes
+    ----------
+    schema: The projected Schema.
+    paths: tuple of the field paths, in the order of the values unpack returns.
+    """
+
+    def __init__(self, schema, paths):
+        self.schema = schema
+        self.paths = tuple(paths)
+        parts = [_split_path(path) for path in self.paths]
+        (self.reads, level) = _project_steps(schema.steps, _group(parts, self.paths), True)
+        getters = [_getter(level, path, names) for path, names in zip(self.paths, parts)]
+        positions = [level[0].get(names[0]) if len(names) == 1 else None for names in parts]
+        if positions == list(range(len(level[0]))):
+            # Top-level fields asked for in the order of the packet: the values are already in place.
+            self.__take = tuple
+        else:
+            self.__take = lambda values: tuple([get(values) for get in getters])
+
+    def unpack(self, packet):
+        """
+        Decode the projected fields of a packet.
+        :param packet: The packet to decode, as for Deserialize.
+        :return: tuple of the values of the paths, in their order. A path inside a count section gives a tuple with
+                 one value per record; a count section gives a tuple of record tuples, as with compact=True.
+        :raises IncompletePacket: If the packet ends before the last projected field.
+        """
+        values = []
+        variables = {}
+        index = 0
+        for read in self.reads:
+            index = read(packet, index, values, variables)
+        return self.__take(values)
+
+
+class Schema:
+    """
+    Compiled decode plan for a Deserialize format dictionary. The dictionary is parsed once: runs of fixed-width
+    fields are coalesced into struct.Struct objects, "!!" bit groups get precomputed shifts and masks, and value
+    formatters are resolved up front. Decoding a packet is then only the byte work.
+
+    Parameters
+    ----------
+    :param data: dictionary
+        The packet format, in the same syntax accepted by Deserialize.
+    :param codegen: (default=False) Generate and exec straight-line Python functions that decode this format, like
+                    namedtuple and dataclasses do, instead of looping over the compiled steps.
+
+    Attributes
+    ----------
+    data: The format dictionary the schema was compiled from.
+    size: Size in bytes of every packet of this format, or None if the format has variable-length parts.
+    offsets: Dictionary of field name -> byte offset for fields whose position does not depend on the packet.
+    index: Dictionary of lower-cased field name -> position of the field in Deserialize.fields.
+    locations: Dictionary of lower-cased field name -> (number of the step that decodes it, position in that step).
+    sections: Dictionary of lower-cased count section name -> compiled section, with its own index.
+    descriptors: tuple of (name, size) for each field, shared by every packet decoded with compact=True.
+    source: Source of the generated decode functions, or None unless codegen.
+    stats: Stats counters while the schema is instrumented, or None.
+    """
+
+    def __init__(self, data, codegen=False):
+        self.data = data
+        self.steps = _compile_steps(data, set())
+        (self.index, self.locations, self.sections, self.descriptors) = _index_steps(self.steps)
+        self.offsets = {}
+        self.size = None
+        offset = 0
+        for step in self.steps:
+            if not isinstance(step, _FixedRun):
+                break
+            for (kind, name, nbytes, arg, variable) in step.slots:
+                if kind == _BITS:
+                    if name:
+                        self.offsets[name] = offset
+                    for sub in arg:
+                        self.offsets[sub[0]] = offset
                 else:
-                    if stuff == NULL_TERMINATE or stuff == PREFIX_LEN_NULL_TERM:
-                        null_count = 0
-                        front = index + 1
-                        back = index
-                        byte_queue = b''
-                        while null_count < 1:
-                            if (self.packet[back:front] == b'\x00'):
-                                null_count += 1
-                            else:
-                                byte_queue += self.packet[back:front]
-                            front += 1
-                            back += 1
-                        val = self.__handle_custom_formatting(
-                            value_format, byte_queue)
-                        f = Field(name, str(back - index) + 'B', val)
-                        new_index = back
-                    elif stuff == PREFIX_LENGTH:
-                        size = int.from_bytes(
-                            self.packet[index:index+1], "big")
-                        index = index + 1
-                        (new_index, f) = self.__read_portion(
-                            index, name, size, 'B', '')
-                    else:
-                        (size, format) = self.__read_bit_string(stuff)
-                        (new_index, f) = self.__read_portion(
-                            index, name, size, format, '')
-
-                self.fields.append(f)
-                index = new_index
-
-    def get_field(self, field_name):
-        for f in self.fields:
-            if f.name.lower() == field_name.lower():
-                return f
-            # elif if variables
-        return None
-
-    def get_value(self, field_name):
-        return self.get_field(field_name).value
+                    self.offsets[name] = offset
+                offset += nbytes
+        else:
+            self.size = offset
+        self.source = None
+        self.stats = None
+        self.__projections = {}
+        if codegen:
+            self.__generate()
+
+    def instrument(self, enabled=True):
+        """
+        Start or stop counting the packets decoded with this schema: per-schema messages, bytes, errors and time,
+        and calls, bytes and time of every field (or run of fixed-width fields) and count section. While
+        instrumented, the schema decodes step by step even if it was compiled with codegen. A schema that is not
+        instrumented runs no counting code at all.
+        :param enabled: (default=True) False stops counting and restores the uninstrumented decoders.
+        :return: Stats: The counters, which can be read with snapshot() and cleared with reset(); None when disabling.
+        """
+        if not enabled:
+            if self.stats is not None:
+                for (section, steps) in self.__sections:
+                    section.steps = steps
+                self.steps = self.__steps
+                for name in ('_read', '_read_values', '_locate'):
+                    del self.__dict__[name]
+                self.__dict__.update(self.__generated)
+                self.stats = None
+            return None
+        if self.stats is None:
+            self.stats = Stats()
+            self.__steps = self.steps
+            self.__sections = []
+            self.__generated = {name: self.__dict__[name] for name in ('_read', '_read_values')
+                                if name in self.__dict__}
+            self.steps = self.__probe(self.steps, '')
+            self._read = self.__count(Schema._read)
+            self._read_values = self.__count(Schema._read_values)
+            self._locate = self.__count(Schema._locate)
+        return self.stats
+
+    def __probe(self, steps, prefix):
+        """
+        Wrap steps, and the steps of count sections in them, in probes counting their calls.
+        """
+        probes = []
+        for step in steps:
+            if isinstance(step, _Section):
+                self.__sections.append((step, step.steps))
+                step.steps = self.__probe(step.steps, prefix + step.name + '/')
+            probes.append(StepProbe(step, self.stats.counter(prefix + step.name)))
+        return tuple(probes)
+
+    def __count(self, method):
+        """
+        Wrap a whole-packet decode method to count messages, bytes, errors and time.
+        """
+        stats = self.stats
+
+        def counted(packet, index, out, variables):
+            start = perf_counter()
+            try:
+                end = method(self, packet, index, out, variables)
+            except Exception:
+                stats.errors += 1
+                raise
+            stats.add(end - index, start)
+            return end
+        return counted
+
+    def __generate(self):
+        """
+        Replace the step-by-step decode loops with straight-line functions generated for this schema: the struct
+        calls, shifts and terminator scans of every step are inlined, with no dispatch per field.
+        """
+        src = Source()
+        for name, values in (('read', False), ('read_values', True)):
+            src.line('def {}(packet, index, {}, variables):'.format(name, 'values' if values else 'fields'))
+            src.indent()
+            for step in self.steps:
+                step.emit(src, 'values' if values else 'fields', values)
+            src.line('return index')
+            src.indent(-1)
+            src.line('')
+        namespace, self.source = src.build('schema')
+        self._read = namespace['read']
+        self._read_values = namespace['read_values']
+
+    def unpack(self, packet, lazy=False, compact=False):
+        """
+        Decode a packet with this schema.
+        :param packet: The packet to decode.
+        :param lazy: (default=False) Only locate the fields now, and decode each one when it is first accessed.
+        :param compact: (default=False) Store only a tuple of values; see Deserialize.
+        :return: Deserialize: The decoded packet.
+        """
+        return Deserialize(packet, self, lazy, compact)
+
+    def project(self, *paths):
+        """
+        Compile a projection that decodes only some fields of this format. Projections are kept by the schema, so
+        asking again for the same paths is cheap.
+        :param paths: Field paths, such as "rcode" or "ANSWERS.address"; see Projection.
+        :return: Projection: plan whose unpack(packet) returns the values of the paths.
+        :raises FieldNotFound: If a path names no field.
+        """
+        paths = tuple([path if isinstance(path, str) else tuple(path) for path in paths])
+        projection = self.__projections.get(paths)
+        if projection is None:
+            projection = self.__projections[paths] = Projection(self, paths)
+        return projection
+
+    def select(self, packet, *paths):
+        """
+        Decode only some fields of a packet; see project.
+        :return: tuple of the values of the paths, in their order.
+        """
+        return self.project(*paths).unpack(packet)
+
+    def _read(self, packet, index, fields, variables):
+        for step in self.steps:
+            index = step.read(packet, index, fields, variables)
+        return index
+
+    def _read_values(self, packet, index, values, variables):
+        for step in self.steps:
+            index = step.read_values(packet, index, values, variables)
+        return index
+
+    def _locate(self, packet, index, offsets, variables):
+        """
+        Find where every step starts without decoding values; only count fields are read.
+        :param offsets: list that receives the start index of each step.
+        :return: int: The index just past the packet.
+        """
+        for step in self.steps:
+            offsets.append(index)
+            index = step.skip(packet, index, None, variables)
+        return index
+
 
 # TODO: Fix test cases into file lol
 
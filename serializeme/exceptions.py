@@ -86,3 +86,37 @@ class FieldNotFound(Exception):
     
     def __str__(self):
         return "{} -> {}".format(self.name, self.msg)
+
+class IncompletePacket(Exception):
+    """
+    Exception raised when a packet ends before all of its fields could be read.
+    Attributes:
+        needed  : Number of bytes needed to read the next field, when known.
+        received: Number of bytes available.
+        msg     : Explanation of the error.
+    """
+    def __init__(self, needed, received, msg="Packet too short. Bytes needed/received"):
+        self.needed = needed
+        self.received = received
+        self.msg = msg
+
+    def __str__(self):
+        return "{}: {}/{}".format(self.msg, self.needed, self.received)
+
+class MalformedPacket(Exception):
+    """
+    Exception raised when a complete message (such as a length-prefixed frame) is too short for its format.
+    Attributes:
+        needed  : Number of bytes needed to read the next field, when known.
+        received: Number of bytes in the message.
+        messages: Messages decoded before the malformed one, which would otherwise be lost.
+        msg     : Explanation of the error.
+    """
+    def __init__(self, needed, received, messages=(), msg="Message too short for its format. Bytes needed/received"):
+        self.needed = needed
+        self.received = received
+        self.messages = messages
+        self.msg = msg
+
+    def __str__(self):
+        return "{}: {}/{}".format(self.msg, self.needed, self.received)
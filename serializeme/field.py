@@ -22,6 +22,8 @@ class Field:
     :param size: The number of bits of the field.
     :param value: (default=0) The value of the field.
     """
+    __slots__ = ('name', 'size', 'value')
+
     def __init__(self, name, size, value=0):
         self.name = name
         self.size = size
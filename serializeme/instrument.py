@@ -0,0 +1,118 @@
+"""
+Opt-in counters for compiled Schema and Template objects, to find which fields a slow format spends its time on.
+"""
+# Author: Justin Roosenschoon <jeroosenschoon@gmail.com>
+
+# Licence: MIT License (c) 2021 Justin Roosenschoon
+
+from time import perf_counter
+
+
+class Counter:
+    """
+    Calls, bytes and cumulative time of one field, run of fields, or count section.
+
+    Attributes
+    ----------
+    calls: Number of times the field was decoded, skipped or encoded.
+    bytes: Number of bytes it consumed or produced.
+    time: Cumulative time spent on it, in seconds. A section's time includes the fields inside it.
+    """
+    __slots__ = ('calls', 'bytes', 'time')
+
+    def __init__(self):
+        self.calls = 0
+        self.bytes = 0
+        self.time = 0.0
+
+    def add(self, nbytes, start):
+        self.calls += 1
+        self.bytes += nbytes
+        self.time += perf_counter() - start
+
+
+class Stats:
+    """
+    Counters of an instrumented Schema or Template. They are updated without locks, so totals from several threads
+    are approximate.
+
+    Attributes
+    ----------
+    messages: Number of packets decoded (or located, for lazy objects) or encoded.
+    bytes: Number of bytes in those packets.
+    errors: Number of packets that raised an exception.
+    time: Cumulative time spent on them, in seconds.
+    fields: Dictionary of field label -> Counter. Runs of fixed-width fields that are decoded together are labelled
+            with their names joined by ','; fields inside count sections are prefixed with the section name and '/'.
+    """
+
+    def __init__(self):
+        self.fields = {}
+        self.reset()
+
+    def reset(self):
+        """
+        Set every counter back to zero.
+        """
+        self.messages = 0
+        self.bytes = 0
+        self.errors = 0
+        self.time = 0.0
+        for counter in self.fields.values():
+            counter.__init__()
+
+    def counter(self, label):
+        """
+        Get the Counter of a field label, creating it if needed.
+        """
+        if label not in self.fields:
+            self.fields[label] = Counter()
+        return self.fields[label]
+
+    def add(self, nbytes, start):
+        self.messages += 1
+        self.bytes += nbytes
+        self.time += perf_counter() - start
+
+    def snapshot(self):
+        """
+        Copy the counters, for reporting while they keep changing.
+        :return: dictionary with messages, bytes, errors, time, and fields: label -> {calls, bytes, time}.
+        """
+        return {
+            "messages": self.messages,
+            "bytes": self.bytes,
+            "errors": self.errors,
+            "time": self.time,
+            "fields": {label: {"calls": c.calls, "bytes": c.bytes, "time": c.time} for label, c in self.fields.items()},
+        }
+
+
+class StepProbe:
+    """
+    Decode step wrapper that counts the calls of the step it wraps. Other attributes are the step's own.
+    """
+    def __init__(self, step, counter):
+        self.step = step
+        self.counter = counter
+
+    def __getattr__(self, name):
+        return getattr(self.step, name)
+
+    def read(self, packet, index, fields, variables):
+        start = perf_counter()
+        end = self.step.read(packet, index, fields, variables)
+        self.counter.add(end - index, start)
+        return end
+
+    def read_values(self, packet, index, values, variables):
+        start = perf_counter()
+        end = self.step.read_values(packet, index, values, variables)
+        self.counter.add(end - index, start)
+        return end
+
+    def skip(self, packet, index, fields, variables):
+        start = perf_counter()
+        end = self.step.skip(packet, index, fields, variables)
+        self.counter.add(end - index, start)
+        return end
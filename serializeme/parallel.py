@@ -0,0 +1,208 @@
+"""
+Decoding of many messages across a pool of processes.
+"""
+# Author: Justin Roosenschoon <jeroosenschoon@gmail.com>
+
+# Licence: MIT License (c) 2021 Justin Roosenschoon
+
+import mmap
+import os
+from itertools import islice
+from multiprocessing import Pool
+
+from serializeme.deserialize import Deserialize, Schema
+from serializeme.capture import CaptureReader, _udp_span
+from serializeme.exceptions import IncompletePacket, InvalidField
+
+# State of a worker process: (schema, func, view of the mapped input file or None).
+_worker = None
+
+
+def _values(message):
+    return message.values
+
+
+def _start_worker(data, codegen, func, path):
+    """
+    Compile the schema once per worker, and map the input file if the messages are read from one.
+    """
+    global _worker
+    view = None
+    if path is not None and os.path.getsize(path):
+        with open(path, 'rb') as f:
+            view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    _worker = (Schema(data, codegen), func, view)
+
+
+def _decode_chunk(task):
+    """
+    Decode the messages of one chunk.
+    :param task: (blob, spans): the (start, end) of each message in blob, or in the mapped file if blob is None.
+    :return: list of results, in the order of spans.
+    """
+    (schema, func, view) = _worker
+    (blob, spans) = task
+    buffer = view if blob is None else memoryview(blob)
+    return [func(Deserialize(buffer[start:end], schema, compact=True)) for (start, end) in spans]
+
+
+def _frames(view, schema, length_prefix):
+    """
+    Split a buffer of concatenated messages. The messages are only located here, not decoded: by their length
+    header, by the schema's size if it is fixed, or by skipping over their fields.
+    :return: generator of (start, end) of each message in view.
+    """
+    index = 0
+    while index < len(view):
+        if length_prefix:
+            start = index + length_prefix
+            end = start + int.from_bytes(view[index:start], "big")
+        elif schema.size:
+            start = index
+            end = index + schema.size
+        else:
+            start = index
+            end = schema._locate(view, index, [], {})
+        if end > len(view):
+            raise IncompletePacket(end - index, len(view) - index, "Trailing partial message. Bytes needed/received")
+        yield (start, end)
+        index = end
+
+
+def _capture_spans(reader, strip):
+    """
+    Locate the packets (or UDP payloads, if strip) of a capture file.
+    :return: generator of (start, end) in the file.
+    """
+    for record in reader:
+        if not strip:
+            yield (record.offset, record.offset + len(record.data))
+            continue
+        span = _udp_span(record.data, record.linktype)
+        if span is not None:
+            yield (record.offset + span[0], record.offset + span[1])
+        record.data.release()
+
+
+def _file_tasks(path, schema, chunk_size, length_prefix, strip):
+    """
+    Chunks of (start, end) offsets into the file, which workers map themselves: no message bytes are sent to them.
+    """
+    try:
+        reader = CaptureReader(path)
+    except InvalidField:
+        reader = None
+    if reader is not None:
+        with reader:
+            yield from _chunks(_capture_spans(reader, strip), None, chunk_size)
+        return
+    with open(path, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+            yield from _chunks(_frames(view, schema, length_prefix), None, chunk_size)
+
+
+def _buffer_tasks(buffer, schema, chunk_size, length_prefix):
+    """
+    Chunks of a buffer in memory. Each chunk is sent as one copy of the bytes its messages span.
+    """
+    with memoryview(buffer) as view:
+        frames = _frames(view, schema, length_prefix)
+        while True:
+            spans = list(islice(frames, chunk_size))
+            if not spans:
+                return
+            base = spans[0][0] - (length_prefix or 0)
+            blob = bytes(view[base:spans[-1][1]])
+            yield (blob, [(start - base, end - base) for (start, end) in spans])
+
+
+def _iterable_tasks(packets, chunk_size):
+    """
+    Chunks of an iterable of packets, joined into one blob per chunk.
+    """
+    packets = iter(packets)
+    while True:
+        chunk = list(islice(packets, chunk_size))
+        if not chunk:
+            return
+        spans = []
+        end = 0
+        for packet in chunk:
+            spans.append((end, end + len(packet)))
+            end += len(packet)
+        yield (b''.join(chunk), spans)
+
+
+def _chunks(spans, blob, chunk_size):
+    spans = iter(spans)
+    while True:
+        chunk = list(islice(spans, chunk_size))
+        if not chunk:
+            return
+        yield (blob, chunk)
+
+
+def unpack_parallel(schema, source, workers=None, chunk_size=1000, ordered=True, func=None, length_prefix=0,
+                    strip=True, codegen=False):
+    """
+    Decode many messages across a pool of processes. Each worker compiles the schema once, decodes chunks of
+    messages with compact=True, and sends back one result per message.
+
+    When the source is a file, workers map the file themselves and only (start, end) offsets are sent to them. A
+    buffer in memory is sent as one copy of each chunk's bytes, and an iterable as one joined copy of each chunk.
+    :param schema: The Schema, or format dictionary, of the messages. Only its format dictionary is sent to workers.
+    :param source: The messages. One of:
+                   a path (str or os.PathLike): a pcap or pcapng capture file, whose packets (or UDP payloads, if
+                   strip) are decoded, or else a file of concatenated messages;
+                   a buffer (bytes, bytearray, memoryview, mmap) of concatenated messages;
+                   an iterable of packets, one message each.
+                   Concatenated messages are delimited by length_prefix, by the size of a fixed-size schema, or by
+                   locating the fields of each message.
+    :param workers: (default=None) Number of worker processes; None uses os.cpu_count(). With 0, messages are
+                    decoded in the calling process, in order.
+    :param chunk_size: (default=1000) Number of messages sent to a worker at a time.
+    :param ordered: (default=True) Yield results in the order of the messages. With False, the results of each chunk
+                    are yielded as soon as it is decoded, which keeps every worker busy when chunks take unequal time.
+    :param func: (default=None) Picklable function (defined at module level) that workers call with each decoded
+                 Deserialize object, returning the result to send back. None returns the values tuple of the message
+                 (see Deserialize's compact parameter), as Deserialize objects are not sent between processes.
+    :param length_prefix: (default=0) Size in bytes of a big-endian length header in front of every concatenated
+                          message, as in StreamDecoder.
+    :param strip: (default=True) Decode the UDP payloads of the packets of a capture file; see CaptureReader.payloads.
+    :param codegen: (default=False) Compile the schema with codegen in the workers.
+    :return: generator of results. Stopping early terminates the workers.
+    :raises IncompletePacket: If a message is too short for the schema, or concatenated messages end in the middle
+                              of one. Results of the chunks decoded before it have been yielded.
+    """
+    if not isinstance(schema, Schema):
+        schema = Schema(schema)
+    if func is None:
+        func = _values
+    path = None
+    if isinstance(source, (str, os.PathLike)):
+        path = os.fspath(source)
+        tasks = _file_tasks(path, schema, chunk_size, length_prefix, strip)
+    else:
+        try:
+            memoryview(source).release()
+        except TypeError:
+            tasks = _iterable_tasks(source, chunk_size)
+        else:
+            tasks = _buffer_tasks(source, schema, chunk_size, length_prefix)
+
+    initargs = (schema.data, codegen, func, path)
+    if workers == 0:
+        global _worker
+        _start_worker(*initargs)
+        try:
+            for task in tasks:
+                yield from _decode_chunk(task)
+        finally:
+            _worker = None
+        return
+    with Pool(workers, _start_worker, initargs) as pool:
+        decode = pool.imap if ordered else pool.imap_unordered
+        for results in decode(_decode_chunk, tasks):
+            yield from results
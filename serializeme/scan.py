@@ -0,0 +1,115 @@
+"""
+Filtering of many messages by a predicate over a few of their fields, without decoding the rest.
+"""
+# Author: Justin Roosenschoon <jeroosenschoon@gmail.com>
+
+# Licence: MIT License (c) 2021 Justin Roosenschoon
+
+import mmap
+import os
+
+from serializeme.deserialize import Schema
+from serializeme.capture import CaptureReader
+from serializeme.parallel import _frames
+from serializeme.exceptions import InvalidField
+
+
+class Scan:
+    """
+    The messages of a source that match a predicate. Only the fields the predicate reads are decoded, through a
+    projection of the schema (see Schema.project): no Field objects or Deserialize objects are built, and nothing
+    after the last of those fields is read. Iterating over the scan goes through the source once, yielding the
+    matching messages (or their indexes) as they are found.
+
+    Parameters
+    ----------
+    :param schema: The Schema, or format dictionary, of the messages.
+    :param source: The messages. One of:
+                   a path (str or os.PathLike): a pcap or pcapng capture file, whose packets (or UDP payloads, if
+                   strip) are scanned, or else a file of concatenated messages;
+                   a buffer (bytes, bytearray, memoryview, mmap) of concatenated messages;
+                   an iterable of packets, one message each.
+                   Concatenated messages are delimited as in unpack_parallel.
+    :param fields: Path of the field the predicate reads, such as "RCODE", or a tuple of paths.
+    :param predicate: Function called with the value of each field in fields, in order, returning whether the
+                      message matches; for example lambda rcode: rcode != 0.
+    :param indexes: (default=False) Yield the index of each matching message in the source, rather than the message.
+    :param length_prefix: (default=0) Size in bytes of a big-endian length header in front of every concatenated
+                          message.
+    :param strip: (default=True) Scan the UDP payloads of the packets of a capture file; see CaptureReader.payloads.
+
+    Attributes
+    ----------
+    projection: The Projection of fields that the predicate is called with.
+    scanned: Number of messages the predicate was evaluated on so far, since iteration over the scan last started.
+    matched: Number of them that matched.
+    """
+
+    def __init__(self, schema, source, fields, predicate, indexes=False, length_prefix=0, strip=True):
+        if not isinstance(schema, Schema):
+            schema = Schema(schema)
+        if isinstance(fields, str):
+            fields = (fields,)
+        self.schema = schema
+        self.source = source
+        self.projection = schema.project(*fields)
+        self.predicate = predicate
+        self.indexes = indexes
+        self.length_prefix = length_prefix
+        self.strip = strip
+        self.scanned = 0
+        self.matched = 0
+
+    def __iter__(self):
+        self.scanned = 0
+        self.matched = 0
+        source = self.source
+        if isinstance(source, (str, os.PathLike)):
+            return self.__file(os.fspath(source))
+        try:
+            memoryview(source).release()
+        except TypeError:
+            return self.__filter(source)
+        return self.__buffer(source)
+
+    def __filter(self, messages):
+        """
+        Yield the matching messages of an iterable, counting as it goes.
+        """
+        unpack = self.projection.unpack
+        predicate = self.predicate
+        indexes = self.indexes
+        for number, message in enumerate(messages):
+            self.scanned = number + 1
+            if predicate(*unpack(message)):
+                self.matched += 1
+                yield number if indexes else message
+
+    def __buffer(self, buffer):
+        with memoryview(buffer) as view:
+            frames = _frames(view, self.schema, self.length_prefix)
+            yield from self.__filter(view[start:end] for (start, end) in frames)
+
+    def __file(self, path):
+        try:
+            reader = CaptureReader(path)
+        except InvalidField:
+            reader = None
+        if reader is not None:
+            with reader:
+                yield from self.__filter(reader.payloads(self.strip))
+            return
+        with open(path, 'rb') as f:
+            if not os.fstat(f.fileno()).st_size:
+                return
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        yield from self.__buffer(mapped)
+
+    def count(self):
+        """
+        Go through the source without keeping the matches.
+        :return: int: The number of matching messages.
+        """
+        for message in self:
+            pass
+        return self.matched
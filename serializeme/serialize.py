@@ -6,9 +6,17 @@ Serialize object that can encode data into a byte array.
 # Licence: MIT License (c) 2021 Justin Roosenschoon
 
 import re
+import struct
+from array import array
+from time import perf_counter
 from math import ceil
 from socket import inet_aton
 from serializeme.field import Field
+from serializeme.codegen import Source
+from serializeme.instrument import Stats
+from serializeme.cache import templates
+from serializeme.codec import lookup
+from serializeme.exceptions import ValueTooBig, InvalidValue, InvalidField, FieldNotFound
 
 # Constants representing various ways to handle variable-length data.
 NULL_TERMINATE = "null_terminate"  # Data + byte of zeros
@@ -16,8 +24,995 @@ PREFIX_LENGTH = "prefix_length"  # Length of data (in bytes) + Data
 # Length of data (in bytes) + Data + bytes of zeros
 PREFIX_LEN_NULL_TERM = "prefix_len_null_term"
 IPv4 = "ipv4"
+DNS_NAME = "dns_name"  # Labels of a domain name, compressed against the names before it in the packet
 VAR_PREFIXES = [NULL_TERMINATE, PREFIX_LENGTH, PREFIX_LEN_NULL_TERM]
 
+_SIZE_PATTERN = re.compile("[0-9]+[bB]")
+
+
+def _parse_spec(data):
+    """
+    Parse a Serialize dictionary into a list of Field objects, in order.
+    :param data: The dictionary of fields, as described in Serialize.
+    :return: list of Field objects.
+    """
+    fields = []
+    for name, stuff in data.items():
+        if stuff == ():  # Empty tuple == 1 bit, value of 0
+            fields.append(Field(name=name, value=0, size=1))
+        elif isinstance(stuff, int):  # int == specified value, value of 0
+            fields.append(Field(name=name, value=0, size=stuff))
+        elif isinstance(stuff, str):  # str == specified value, value of 0
+            if _SIZE_PATTERN.match(stuff):
+                if "b" in stuff: # bits specified
+                    size = int(stuff[:stuff.lower().index("b")])
+                    fields.append(Field(name=name, value=0, size=size))
+                elif "B" in stuff: # Bytes specified
+                    size = int(stuff[:stuff.lower().index("b")]) * 8
+                    fields.append(Field(name=name, value=0, size=size))
+            else: # No other string option, so must have been one of the "vary" constants from above.
+                fields.append(Field(name=name, value=stuff, size="vary"))
+        elif isinstance(stuff, tuple) or isinstance(stuff, list):  # specified value and size.
+            if isinstance(stuff[0], str):
+                if lookup(stuff[0]) is not None:  # A value codec, such as IPv4 or MAC.
+                    fields.append(Field(name=name, value=stuff[1], size=stuff[0].lower()))
+                elif "b" in stuff[0]: # Bits
+                    size = int(stuff[0][:stuff[0].lower().index("b")])
+                   # if not self.__check_bit_size(stuff[1], size):
+                    #    raise Exception("error. " + str(stuff[1]) + " cannot be fit in " + str(size) + " bits.")
+                    fields.append(Field(name=name, value=stuff[1], size=size))
+                elif "B" in stuff[0]: # Bytes
+                    size = int(stuff[0][:stuff[0].lower().index("b")]) * 8
+                   # if not self.__check_bit_size(stuff[1], size):
+                     #   raise Exception("error. " + str(stuff[1]) + " cannot be fit in " + str(size) + " bits.")
+                    fields.append(Field(name=name, value=stuff[1], size=size))
+                elif stuff[0].lower() == NULL_TERMINATE:
+                    fields.append(Field(name=name, value=stuff[1], size=NULL_TERMINATE))
+                elif stuff[0].lower() == PREFIX_LENGTH:
+                    fields.append(Field(name=name, value=stuff[1], size=PREFIX_LENGTH))
+                elif stuff[0].lower() == PREFIX_LEN_NULL_TERM:
+                    fields.append(Field(name=name, value=stuff[1], size=PREFIX_LEN_NULL_TERM))
+                elif stuff[0].lower() == DNS_NAME:
+                    fields.append(Field(name=name, value=stuff[1], size=DNS_NAME))
+            elif isinstance(stuff[0], int):
+               # if not self.__check_bit_size(stuff[1], stuff[0]):
+                 #   raise Exception("error. " + str(stuff[1]) + " cannot be fit in " + str(stuff[0]) + " bits.")
+                fields.append(Field(name=name, value=stuff[1], size=stuff[0]))
+    return fields
+
+
+# Struct codes for byte-aligned unsigned integers, keyed by width in bits.
+_INT_CODES = {8: 'B', 16: 'H', 32: 'L', 64: 'Q'}
+
+
+def _as_bytes(value):
+    """
+    Strings are UTF-8 encoded; bytes-like values are used as they are.
+    """
+    return value.encode() if isinstance(value, str) else value
+
+
+def _encode_null_term(value):
+    return bytes(_as_bytes(value)) + b'\x00'
+
+
+def _encode_prefix_length(value):
+    return b''.join(_prefix_length_parts(value))
+
+
+def _encode_prefix_length_null_term(value):
+    return _encode_prefix_length(value) + b'\x00'
+
+
+def _null_term_parts(value):
+    return [_as_bytes(value), b'\x00']
+
+
+def _prefix_length_parts(value):
+    """
+    The length bytes and data of a PREFIX_LENGTH field, with bytes-like data kept as it is rather than copied.
+    """
+    if isinstance(value, (str, bytes, bytearray, memoryview)):
+        value = (value,)
+    parts = []
+    for part in value:
+        part = _as_bytes(part)
+        parts.append(len(part).to_bytes(1, "big"))
+        parts.append(part)
+    return parts
+
+
+def _prefix_length_null_term_parts(value):
+    return _prefix_length_parts(value) + [b'\x00']
+
+
+def _encode_name(value, names, position):
+    """
+    Encode a domain name as DNS labels (RFC 1035 4.1.4). The longest suffix already written to the packet is
+    replaced by a 2 byte pointer to it, and the new suffixes are added to names.
+    :param value: A dotted name ("www.google.com") or a sequence of labels.
+    :param names: Dictionary of suffix (tuple of labels) -> offset in the packet, shared by the names of a packet.
+    :param position: Offset of the name from the start of the packet.
+    :return: The byte string of the name.
+    """
+    if isinstance(value, str):
+        value = value.rstrip('.').split('.') if value.strip('.') else ()
+    labels = tuple(_as_bytes(label) for label in value)
+    parts = []
+    for i in range(len(labels)):
+        suffix = labels[i:]
+        pointer = names.get(suffix)
+        if pointer is not None:
+            parts.append((0xc000 | pointer).to_bytes(2, "big"))
+            return b''.join(parts)
+        if position < 0x4000:
+            # Pointers have 14 bits, so later suffixes cannot be reached.
+            names[suffix] = position
+        if len(labels[i]) > 63:
+            raise ValueTooBig(63, labels[i], "bytes")
+        parts.append(len(labels[i]).to_bytes(1, "big"))
+        parts.append(labels[i])
+        position += len(labels[i]) + 1
+    parts.append(b'\x00')
+    return b''.join(parts)
+
+
+def _null_term_size(value):
+    return _text_size(value) + 1
+
+
+def _prefix_length_size(value):
+    if isinstance(value, (str, bytes, bytearray, memoryview)):
+        return _text_size(value) + 1
+    return sum([_text_size(part) + 1 for part in value])
+
+
+def _prefix_length_null_term_size(value):
+    return _prefix_length_size(value) + 1
+
+
+def _text_size(value):
+    """
+    Number of bytes value takes once encoded, without encoding ASCII strings.
+    """
+    if isinstance(value, str) and value.isascii():
+        return len(value)
+    return len(_as_bytes(value))
+
+
+_VAR_ENCODERS = {
+    NULL_TERMINATE: _encode_null_term,
+    PREFIX_LENGTH: _encode_prefix_length,
+    PREFIX_LEN_NULL_TERM: _encode_prefix_length_null_term,
+}
+
+_VAR_SIZES = {
+    NULL_TERMINATE: _null_term_size,
+    PREFIX_LENGTH: _prefix_length_size,
+    PREFIX_LEN_NULL_TERM: _prefix_length_null_term_size,
+}
+
+_VAR_PARTS = {
+    NULL_TERMINATE: _null_term_parts,
+    PREFIX_LENGTH: _prefix_length_parts,
+    PREFIX_LEN_NULL_TERM: _prefix_length_null_term_parts,
+}
+
+# Parts of at least this many bytes are passed by reference by Template.pack_buffers; smaller ones are copied into
+# the chunks around them, as a copy of a few bytes is cheaper than one more buffer to send.
+_SCATTER_MIN = 1024
+
+
+def _var_codec(kind):
+    """
+    Get the encode and size functions of a field that is not fixed-width: one of the variable-length kinds above,
+    or a value codec from serializeme.codec.
+    :param kind: The size of the field, such as NULL_TERMINATE or IPv4.
+    :return: (encode, measure), or None if kind is neither (DNS_NAME fields are encoded with _encode_name).
+    """
+    if kind in _VAR_ENCODERS:
+        return _VAR_ENCODERS[kind], _VAR_SIZES[kind]
+    codec = lookup(kind)
+    if codec is None:
+        return None
+    if codec.encode is None:
+        raise InvalidField(kind, "Value codec cannot encode")
+    return codec.encode, codec.measure
+
+
+def _check_room(buffer, offset, size):
+    """
+    Check that size bytes fit in buffer at offset.
+    """
+    if offset < 0 or offset + size > len(buffer):
+        raise ValueTooBig(len(buffer) - offset, size, "bytes", "byte message cannot fit in")
+
+
+def _fixed_int(value, num_bits):
+    """
+    Check and convert the value of a fixed-width field to an int. Bytes values are read as big-endian integers.
+    :param value: The int or bytes value of the field.
+    :param num_bits: The width of the field in bits.
+    :return: int: The value as an integer that fits in num_bits bits.
+    """
+    if isinstance(value, (bytes, bytearray)):
+        if len(value) * 8 > num_bits:
+            raise ValueTooBig(num_bits, value, "bits")
+        return int.from_bytes(value, "big")
+    if not isinstance(value, int):
+        raise InvalidValue(value)
+    if value < 0 or value >> num_bits:
+        raise ValueTooBig(num_bits, value, "bits")
+    return int(value)
+
+
+class _Chunk:
+    """
+    A byte-aligned group of fixed-width fields inside a template run. A single field that is 8, 16, 32 or 64 bits
+    wide is packed directly by struct; anything else is OR-ed together with precomputed shifts first.
+    """
+    def __init__(self, parts, num_bits):
+        # parts: tuple of (slot index, shift, width in bits)
+        self.parts = parts
+        self.num_bits = num_bits
+        self.direct = len(parts) == 1 and parts[0][2] == num_bits and num_bits in _INT_CODES
+        self.code = _INT_CODES.get(num_bits, str(num_bits // 8) + 's')
+
+    def value(self, values):
+        if self.direct:
+            # struct range-checks plain ints itself; see _Run.encode.
+            value = values[self.parts[0][0]]
+            return value if value.__class__ is int else _fixed_int(value, self.num_bits)
+        acc = 0
+        for (index, shift, width) in self.parts:
+            value = values[index]
+            if value.__class__ is not int or value >> width:
+                value = _fixed_int(value, width)
+            acc |= value << shift
+        if self.num_bits in _INT_CODES:
+            return acc
+        return acc.to_bytes(self.num_bits // 8, "big")
+
+
+class _Run:
+    """
+    Consecutive fixed-width fields, encoded by a single precomputed struct.Struct. A run that is not a whole number
+    of bytes is padded with zero bits before its first field, like Serialize.
+    """
+    def __init__(self, widths):
+        # widths: list of (slot index, width in bits)
+        chunks = []
+        parts = []
+        # Leading padding, so the run ends on a byte boundary.
+        position = -sum(width for (index, width) in widths) % 8
+        for (index, width) in widths:
+            parts.append((index, position, width))
+            position += width
+            if position % 8 == 0:
+                chunks.append(self.__chunk(parts, position))
+                parts = []
+                position = 0
+        self.chunks = tuple(chunks)
+        self.struct = struct.Struct('!' + ''.join(c.code for c in chunks))
+        self.size = self.struct.size
+
+    @staticmethod
+    def __chunk(parts, num_bits):
+        # Positions were counted from the first bit of the chunk; turn them into shifts from its last bit.
+        return _Chunk(tuple((index, num_bits - position - width, width) for (index, position, width) in parts),
+                      num_bits)
+
+    def encode(self, values):
+        try:
+            return self.struct.pack(*[c.value(values) for c in self.chunks])
+        except struct.error:
+            self.__recheck(values)
+            raise
+
+    def encode_into(self, values, buffer, offset):
+        try:
+            self.struct.pack_into(buffer, offset, *[c.value(values) for c in self.chunks])
+        except struct.error:
+            self.__recheck(values)
+            raise
+        return offset + self.size
+
+    def measure(self, values):
+        return self.size
+
+    def emit(self, src):
+        """
+        Write the source that checks and combines the values of this run, from the local sequence named values.
+        :return: (args, recheck): the names of the arguments for the run's struct, and the name bound to the
+                 method that reports which value was out of range.
+        """
+        fixed_int = src.const(_fixed_int, 'fixed_int')
+        args = []
+        for c in self.chunks:
+            if c.direct:
+                (index, shift, width) = c.parts[0]
+                val = src.name('v')
+                src.line('{} = values[{}]'.format(val, index))
+                src.line('if {}.__class__ is not int:'.format(val))
+                src.line('    {0} = {1}({0}, {2})'.format(val, fixed_int, width))
+                args.append(val)
+                continue
+            terms = []
+            for (index, shift, width) in c.parts:
+                val = src.name('v')
+                src.line('{} = values[{}]'.format(val, index))
+                src.line('if {0}.__class__ is not int or {0} >> {1}:'.format(val, width))
+                src.line('    {0} = {1}({0}, {2})'.format(val, fixed_int, width))
+                terms.append('{} << {}'.format(val, shift) if shift else val)
+            expr = ' | '.join(terms)
+            if c.num_bits not in _INT_CODES:
+                expr = '({}).to_bytes({}, "big")'.format(expr, c.num_bits // 8)
+            args.append(expr)
+        return args, src.const(self.__recheck, 'recheck')
+
+    def __recheck(self, values):
+        # Out of range value in a directly packed field: redo the checks to report which one.
+        for c in self.chunks:
+            for (index, shift, width) in c.parts:
+                _fixed_int(values[index], width)
+
+
+class _Name:
+    """
+    A DNS_NAME field. Its encoding depends on the names before it, so it is encoded with the packet's suffix
+    dictionary and its position in the packet.
+    """
+    def __init__(self, index):
+        self.index = index
+
+    def encode(self, values, names, position):
+        return _encode_name(values[self.index], names, position)
+
+
+class _Var:
+    """
+    A variable-length (or otherwise non-integer) field encoded by one of the _VAR_ENCODERS or a value codec.
+    """
+    def __init__(self, index, encoder, sizer, splitter=None):
+        self.index = index
+        self.encoder = encoder
+        self.sizer = sizer
+        self.splitter = splitter
+
+    def encode(self, values):
+        return self.encoder(values[self.index])
+
+    def parts(self, values):
+        """
+        The field as a list of byte strings, with the caller's bytes-like data among them if the kind allows it.
+        """
+        if self.splitter is not None:
+            return self.splitter(values[self.index])
+        return [self.encoder(values[self.index])]
+
+    def encode_into(self, values, buffer, offset):
+        data = self.encoder(values[self.index])
+        end = offset + len(data)
+        buffer[offset:end] = data
+        return end
+
+    def measure(self, values):
+        return self.sizer(values[self.index])
+
+
+class Template:
+    """
+    Compiled, reusable Serialize layout. The dictionary is parsed once; consecutive fixed-width fields are coalesced
+    into precomputed struct layouts (sub-byte fields are combined with shifts), so pack() only does the byte work.
+
+    Parameters
+    ----------
+    :param data: dictionary
+        The packet layout, in the same syntax accepted by Serialize. The values given in the dictionary are the
+        defaults used for any field not passed to pack().
+    :param codegen: (default=False) Generate and exec straight-line Python functions that encode this layout, like
+                    namedtuple and dataclasses do, instead of looping over the compiled segments.
+
+    Attributes
+    ----------
+    data: The dictionary the template was compiled from.
+    names: tuple of field names, in packet order.
+    defaults: tuple of default values, in packet order.
+    sizes: tuple of field sizes in bits, or their kind (NULL_TERMINATE, ...) for variable-length fields.
+    source: Source of the generated encode functions, or None unless codegen.
+    stats: Stats counters while the template is instrumented, or None.
+    """
+
+    def __init__(self, data, codegen=False):
+        self.data = data
+        fields = _parse_spec(data)
+        self.names = tuple(f.name for f in fields)
+        self.defaults = tuple(f.value for f in fields)
+        self.sizes = tuple(f.size for f in fields)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        # Case-insensitive name -> position of its first field, for Serialize.get_field.
+        self.lookup = {}
+        for i, name in enumerate(self.names):
+            self.lookup.setdefault(name.lower(), i)
+
+        segments = []
+        widths = []
+        for i, field in enumerate(fields):
+            if isinstance(field.size, int):
+                widths.append((i, field.size))
+                continue
+            if widths:
+                segments.append(_Run(widths))
+                widths = []
+            if field.size == DNS_NAME:
+                segments.append(_Name(i))
+            elif _var_codec(field.size) is not None:
+                segments.append(_Var(i, *_var_codec(field.size), _VAR_PARTS.get(field.size)))
+        if widths:
+            segments.append(_Run(widths))
+        self.segments = tuple(segments)
+        # DNS names are compressed against each other, so they are encoded knowing their position in the packet.
+        self.compress = any(isinstance(segment, _Name) for segment in segments)
+        # Field index -> (segment number, bit offset in the segment, width in bits), or (segment number, None, None)
+        # for fields that are not fixed-width, for Message.
+        positions = [None] * len(fields)
+        for number, segment in enumerate(segments):
+            if not isinstance(segment, _Run):
+                positions[segment.index] = (number, None, None)
+                continue
+            bit = 0
+            for c in segment.chunks:
+                for (index, shift, width) in c.parts:
+                    positions[index] = (number, bit + c.num_bits - shift - width, width)
+                bit += c.num_bits
+        self.positions = tuple(positions)
+        self.source = None
+        self.stats = None
+        if codegen:
+            self.__generate()
+
+    def instrument(self, enabled=True):
+        """
+        Start or stop counting the packets encoded with this template: messages, bytes, errors and time, and calls,
+        bytes and time of every variable-length field and run of fixed-width fields. While instrumented, the
+        template encodes segment by segment even if it was compiled with codegen. A template that is not
+        instrumented runs no counting code at all.
+        :param enabled: (default=True) False stops counting and restores the uninstrumented encoders.
+        :return: Stats: The counters, which can be read with snapshot() and cleared with reset(); None when disabling.
+        """
+        if not enabled:
+            if self.stats is not None:
+                del self.__dict__['_pack'], self.__dict__['_pack_into']
+                self.__dict__.update(self.__generated)
+                self.stats = None
+            return None
+        if self.stats is None:
+            self.stats = Stats()
+            self.__generated = {name: self.__dict__[name] for name in ('_pack', '_pack_into')
+                                if name in self.__dict__}
+            labels = []
+            for segment in self.segments:
+                if isinstance(segment, _Run):
+                    labels.append(','.join(self.names[c_index] for c in segment.chunks
+                                           for (c_index, shift, width) in c.parts))
+                else:
+                    labels.append(self.names[segment.index])
+            self.__counters = tuple(self.stats.counter(label) for label in labels)
+            self._pack = self.__counted_pack
+            self._pack_into = self.__counted_pack_into
+        return self.stats
+
+    def __counted_pack(self, values):
+        buffer = bytearray(self._size(values))
+        self.__counted_pack_into(values, buffer, 0)
+        return bytes(buffer)
+
+    def __counted_pack_into(self, values, buffer, offset):
+        # _pack_into, timing every segment.
+        stats = self.stats
+        start = perf_counter()
+        first = offset
+        names = {}
+        try:
+            _check_room(buffer, offset, self._size(values))
+            with memoryview(buffer) as view:
+                for segment, counter in zip(self.segments, self.__counters):
+                    begin = perf_counter()
+                    end = offset
+                    if isinstance(segment, _Name):
+                        data = segment.encode(values, names, offset - first)
+                        end += len(data)
+                        view[offset:end] = data
+                    else:
+                        end = segment.encode_into(values, view, offset)
+                    counter.add(end - offset, begin)
+                    offset = end
+        except Exception:
+            stats.errors += 1
+            raise
+        stats.add(offset - first, start)
+        return offset
+
+    def __generate(self):
+        """
+        Replace the per-segment loops of _pack, _size and _pack_into with straight-line functions generated for this
+        template, with the struct calls and shifts of every run inlined.
+        """
+        src = Source()
+        struct_error = src.const(struct.error, 'struct_error')
+
+        src.line('def size(values):')
+        if self.compress:
+            # The length of DNS names depends on the names before them.
+            src.line('    return {}(values)'.format(src.const(self._size, 'size')))
+        else:
+            fixed = sum([segment.size for segment in self.segments if isinstance(segment, _Run)])
+            terms = [str(fixed)] + ['{}(values[{}])'.format(src.const(segment.sizer, 'size'), segment.index)
+                                    for segment in self.segments if isinstance(segment, _Var)]
+            src.line('    return ' + ' + '.join(terms))
+        src.line('')
+
+        if self.compress:
+            # Encode into a buffer of the right size, rather than joining parts whose offsets are needed.
+            src.line('def pack(values):')
+            src.line('    buffer = bytearray(size(values))')
+            src.line('    pack_into(values, buffer, 0)')
+            src.line('    return bytes(buffer)')
+            src.line('')
+        for name in ('pack_into',) if self.compress else ('pack', 'pack_into'):
+            into = name == 'pack_into'
+            src.line('def {}(values{}):'.format(name, ', buffer, offset' if into else ''))
+            src.indent()
+            if into:
+                src.line('{}(buffer, offset, size(values))'.format(src.const(_check_room, 'check_room')))
+                if self.compress:
+                    src.line('names = {}')
+                    src.line('start = offset')
+                src.line('with memoryview(buffer) as view:')
+                src.indent()
+            parts = []
+            for segment in self.segments:
+                if isinstance(segment, (_Var, _Name)):
+                    data = src.name('data')
+                    if isinstance(segment, _Name):
+                        src.line('{} = {}(values[{}], names, offset - start)'.format(
+                            data, src.const(_encode_name, 'encode_name'), segment.index))
+                    else:
+                        src.line('{} = {}(values[{}])'.format(data, src.const(segment.encoder, 'encode'),
+                                                              segment.index))
+                    if into:
+                        src.line('view[offset:offset + len({0})] = {0}'.format(data))
+                        src.line('offset += len({})'.format(data))
+                    parts.append(data)
+                    continue
+                args, recheck = segment.emit(src)
+                src.line('try:')
+                if into:
+                    src.line('    {}(view, offset, {})'.format(src.const(segment.struct.pack_into, 'pack_into'),
+                                                           ', '.join(args)))
+                else:
+                    data = src.name('data')
+                    src.line('    {} = {}({})'.format(data, src.const(segment.struct.pack, 'pack'), ', '.join(args)))
+                    parts.append(data)
+                src.line('except {}:'.format(struct_error))
+                src.line('    {}(values)'.format(recheck))
+                src.line('    raise')
+                if into:
+                    src.line('offset += {}'.format(segment.size))
+            if into:
+                src.line('return offset')
+                src.indent(-1)
+            else:
+                src.line("return b''.join([{}])".format(', '.join(parts)))
+            src.indent(-1)
+            src.line('')
+        namespace, self.source = src.build('template')
+        self._size = namespace['size']
+        self._pack = namespace['pack']
+        self._pack_into = namespace['pack_into']
+
+    def pack_many(self, records=None, columns=None, views=False):
+        """
+        Encode many packets into one contiguous buffer. Fields that no packet sets are encoded once: when only
+        fixed-width fields change, the packet of defaults is copied once per packet and only the runs of fixed-width
+        fields that change are encoded into each copy. Otherwise segments without changing fields are encoded once
+        and joined with the others. See serializeme.batch.pack_columns to encode columns with NumPy.
+        :param records: iterable of dictionaries of field_name=value pairs, one per packet. Fields missing from a
+                        record keep their defaults.
+        :param columns: dictionary of field_name -> sequence of values, one value per packet. Give records or
+                        columns, not both.
+        :param views: (default=False) Return memoryviews of the packets instead of their offsets.
+        :return: (buffer, offsets): bytearray of the packets one after another, and array('Q') of the offset of
+                 each packet followed by the end of the last one; or, with views, list of memoryviews of the packets
+                 in buffer.
+        """
+        (indexes, rows) = self.__rows(records, columns)
+        varying = set(indexes)
+        changing = []
+        for segment in self.segments:
+            if isinstance(segment, _Run):
+                changing.append(any(index in varying for c in segment.chunks for (index, shift, width) in c.parts))
+            else:
+                changing.append(segment.index in varying)
+        values = list(self.defaults)
+        if not any(change and not isinstance(segment, _Run) for segment, change in zip(self.segments, changing)):
+            # Every packet has the size of the packet of defaults.
+            base = self._pack(values)
+            size = len(base)
+            buffer = bytearray(base * len(rows))
+            # (value of the chunk, its struct's pack_into, offset in the packet) of each chunk with changing fields.
+            chunks = []
+            for segment, start, change in zip(self.segments, self._starts(values), changing):
+                if not change:
+                    continue
+                for c in segment.chunks:
+                    if any(index in varying for (index, shift, width) in c.parts):
+                        chunks.append((c.value, struct.Struct('!' + c.code).pack_into, start))
+                    start += c.num_bits // 8
+            offset = 0
+            try:
+                for row in rows:
+                    for index, value in zip(indexes, row):
+                        values[index] = value
+                    for (value, pack_into, start) in chunks:
+                        pack_into(buffer, offset + start, value(values))
+                    offset += size
+            except struct.error:
+                # Out of range value in a directly packed field: report which one, as _Run does.
+                for index in indexes:
+                    _fixed_int(values[index], self.sizes[index])
+                raise
+            offsets = array('Q', [size * i for i in range(len(rows) + 1)])
+        else:
+            constants = [None if change or isinstance(segment, _Name) else segment.encode(values)
+                         for segment, change in zip(self.segments, changing)]
+            parts = []
+            offsets = array('Q', [0])
+            total = 0
+            for row in rows:
+                for index, value in zip(indexes, row):
+                    values[index] = value
+                if self.compress:
+                    data = self._pack(values)
+                    parts.append(data)
+                    total += len(data)
+                else:
+                    for segment, data in zip(self.segments, constants):
+                        if data is None:
+                            data = segment.encode(values)
+                        parts.append(data)
+                        total += len(data)
+                offsets.append(total)
+            buffer = bytearray(b''.join(parts))
+        if views:
+            with memoryview(buffer) as view:
+                return [view[offsets[i]:offsets[i + 1]] for i in range(len(rows))]
+        return buffer, offsets
+
+    def __rows(self, records, columns):
+        """
+        Turn the records or columns of pack_many into rows of values.
+        :return: (indexes, rows): the field indexes that are set, and a list of one tuple of their values per packet.
+        """
+        if (records is None) == (columns is None):
+            raise ValueError("Give either records or columns")
+        if columns is not None:
+            names = list(columns)
+            lengths = set(len(column) for column in columns.values())
+            if len(lengths) > 1:
+                raise ValueError("Columns have different lengths: {}".format(sorted(lengths)))
+            rows = list(zip(*columns.values()))
+        else:
+            records = list(records)
+            names = list(dict.fromkeys(name for record in records for name in record))
+            rows = None
+        indexes = []
+        for name in names:
+            try:
+                indexes.append(self.index[name])
+            except KeyError:
+                raise FieldNotFound(name)
+        if rows is None:
+            rows = [tuple(record.get(name, self.defaults[index]) for name, index in zip(names, indexes))
+                    for record in records]
+        return indexes, rows
+
+    def _starts(self, values):
+        """
+        Offset of every segment in the packet of values.
+        """
+        starts = []
+        names = {}
+        offset = 0
+        for segment in self.segments:
+            starts.append(offset)
+            if isinstance(segment, _Name):
+                offset += len(segment.encode(values, names, offset))
+            else:
+                offset += segment.measure(values)
+        return starts
+
+    def message(self, **values):
+        """
+        Encode a packet into a Message, whose fields can then be changed in place.
+        :param values: field_name=value pairs overriding the defaults.
+        :return: Message: The encoded packet.
+        """
+        return Message(self, self.__slots(values))
+
+    def pack(self, **values):
+        """
+        Encode a packet, using the template's defaults for any field not given.
+        :param values: field_name=value pairs overriding the defaults.
+        :return: A byte string of the packet.
+        """
+        return self._pack(self.__slots(values))
+
+    def size(self, **values):
+        """
+        Compute the exact length of the packet pack(**values) would return, without encoding it.
+        :param values: field_name=value pairs overriding the defaults.
+        :return: int: The length in bytes.
+        """
+        return self._size(self.__slots(values))
+
+    def pack_into(self, buffer, offset=0, **values):
+        """
+        Encode a packet directly into a writable buffer, such as a bytearray or memoryview.
+        :param buffer: The buffer to write into.
+        :param offset: (default=0) Where in the buffer to start writing.
+        :param values: field_name=value pairs overriding the defaults.
+        :return: int: The offset just past the end of the packet.
+        """
+        return self._pack_into(self.__slots(values), buffer, offset)
+
+    def pack_buffers(self, **values):
+        """
+        Encode a packet as a list of buffers, to be sent with socket.sendmsg or os.writev without joining them. The
+        bytes-like data of NULL_TERMINATE and PREFIX_LENGTH fields (and codec encodings) of at least 1 KiB are in
+        the list as they are, not copied; everything else is joined into the chunks between them. The buffers must
+        not be changed until the packet is sent.
+        :param values: field_name=value pairs overriding the defaults.
+        :return: list of bytes objects and the caller's bytes-like values, whose concatenation is pack(**values).
+        """
+        return list(self._buffers(self.__slots(values)))
+
+    def iter_buffers(self, **values):
+        """
+        Encode a packet chunk by chunk, as pack_buffers does, for streaming a large packet: each chunk is encoded
+        only when the one before it has been taken.
+        :param values: field_name=value pairs overriding the defaults.
+        :return: generator of buffers, whose concatenation is pack(**values).
+        """
+        return self._buffers(self.__slots(values))
+
+    def _buffers(self, values):
+        pending = []
+        names = {}
+        offset = 0
+        for segment in self.segments:
+            if isinstance(segment, _Name):
+                parts = (segment.encode(values, names, offset),)
+            elif isinstance(segment, _Var):
+                parts = segment.parts(values)
+            else:
+                parts = (segment.encode(values),)
+            for part in parts:
+                size = len(part)
+                offset += size
+                if size < _SCATTER_MIN:
+                    pending.append(part)
+                    continue
+                if pending:
+                    yield b''.join(pending)
+                    pending = []
+                yield part
+        if pending:
+            yield b''.join(pending)
+
+    def __slots(self, values):
+        slots = list(self.defaults)
+        for name, value in values.items():
+            try:
+                slots[self.index[name]] = value
+            except KeyError:
+                raise FieldNotFound(name)
+        return slots
+
+    def _pack(self, values):
+        """
+        Encode a packet from a sequence holding one value per field, in packet order.
+        """
+        if self.compress:
+            buffer = bytearray(self._size(values))
+            self._pack_into(values, buffer, 0)
+            return bytes(buffer)
+        return b''.join([segment.encode(values) for segment in self.segments])
+
+    def _size(self, values):
+        if self.compress:
+            names = {}
+            size = 0
+            for segment in self.segments:
+                if isinstance(segment, _Name):
+                    size += len(segment.encode(values, names, size))
+                else:
+                    size += segment.measure(values)
+            return size
+        return sum([segment.measure(values) for segment in self.segments])
+
+    def _pack_into(self, values, buffer, offset):
+        _check_room(buffer, offset, self._size(values))
+        names = {}
+        start = offset
+        with memoryview(buffer) as view:
+            for segment in self.segments:
+                if isinstance(segment, _Name):
+                    data = segment.encode(values, names, offset - start)
+                    view[offset:offset + len(data)] = data
+                    offset += len(data)
+                else:
+                    offset = segment.encode_into(values, view, offset)
+        return offset
+
+
+class Message:
+    """
+    Packet encoded from a Template into a bytearray, which is patched in place when fields change. The message
+    remembers where every field starts: setting a fixed-width field rewrites only the bytes it covers (with the other
+    bits of those bytes kept, for sub-byte fields), and setting a variable-length field re-encodes the packet from
+    that field onward, or only the field if its length does not change. Sending the same packet with a new ID is
+    then a few byte writes instead of a whole encode.
+
+    Parameters
+    ----------
+    :param template: The Template of the packet.
+    :param values: list holding one value per field of the template, in packet order. It is kept, not copied.
+
+    Attributes
+    ----------
+    template: The Template of the packet.
+    buffer: bytearray of the encoded packet, which can be sent as it is. Its length changes when a variable-length
+            field does.
+    values: list of the current field values, in packet order.
+    """
+
+    def __init__(self, template, values):
+        self.template = template
+        self.values = values
+        self.buffer = bytearray()
+        # Byte offset of each template segment in buffer.
+        self.__starts = []
+        self.__encode(0)
+
+    def __getitem__(self, name):
+        return self.values[self.__index(name)]
+
+    def __setitem__(self, name, value):
+        self.update(**{name: value})
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def __bytes__(self):
+        return bytes(self.buffer)
+
+    def update(self, **values):
+        """
+        Change fields of the packet, patching the buffer. If a value cannot be encoded, the exception is raised with
+        the message unchanged.
+        :param values: field_name=value pairs.
+        """
+        template = self.template
+        patches = []
+        changes = []
+        # First segment to re-encode, or None.
+        first = None
+        for name, value in values.items():
+            index = self.__index(name)
+            changes.append((index, value, self.values[index]))
+            (number, bit, width) = template.positions[index]
+            if bit is not None:
+                patches.append((number, bit, width, _fixed_int(value, width)))
+                continue
+            segment = template.segments[number]
+            if isinstance(segment, _Var):
+                data = segment.encoder(value)
+                if len(data) == self.__length(number):
+                    patches.append((number, None, None, data))
+                    continue
+            if first is None or number < first:
+                first = number
+        for (index, value, previous) in changes:
+            self.values[index] = value
+        if first is not None:
+            try:
+                self.__encode(first)
+            except Exception:
+                for (index, value, previous) in changes:
+                    self.values[index] = previous
+                raise
+        for (number, bit, width, data) in patches:
+            if first is not None and number >= first:
+                continue
+            if bit is None:
+                start = self.__starts[number]
+                self.buffer[start:start + len(data)] = data
+            else:
+                self.__patch(self.__starts[number] * 8 + bit, width, data)
+
+    def offset(self, name):
+        """
+        Get where a field starts in the buffer.
+        :param name: The name of the field.
+        :return: int: Its offset in bits from the start of the packet.
+        """
+        (number, bit, width) = self.template.positions[self.__index(name)]
+        return self.__starts[number] * 8 + (bit or 0)
+
+    def __index(self, name):
+        try:
+            return self.template.index[name]
+        except KeyError:
+            raise FieldNotFound(name)
+
+    def __length(self, number):
+        """
+        Number of bytes of a segment in the buffer.
+        """
+        starts = self.__starts
+        end = starts[number + 1] if number + 1 < len(starts) else len(self.buffer)
+        return end - starts[number]
+
+    def __patch(self, first, width, value):
+        """
+        Write an integer over the width bits starting at bit first of the buffer, keeping the bits around it.
+        """
+        lo = first >> 3
+        hi = (first + width + 7) >> 3
+        shift = (hi << 3) - first - width
+        if not shift and not first & 7 and width in _PATCH_STRUCTS:
+            _PATCH_STRUCTS[width].pack_into(self.buffer, lo, value)
+            return
+        mask = ((1 << width) - 1) << shift
+        word = int.from_bytes(self.buffer[lo:hi], "big")
+        self.buffer[lo:hi] = ((word & ~mask) | (value << shift)).to_bytes(hi - lo, "big")
+
+    def __encode(self, number):
+        """
+        Encode the packet again from a segment to the end. The buffer is only changed once every segment is encoded.
+        """
+        template = self.template
+        starts = self.__starts
+        offset = starts[number] if number < len(starts) else len(self.buffer)
+        names = {}
+        if template.compress:
+            # Suffixes of the names before the segment, which the names after it may point to.
+            for i in range(number):
+                if isinstance(template.segments[i], _Name):
+                    template.segments[i].encode(self.values, names, starts[i])
+        parts = []
+        positions = []
+        position = offset
+        for segment in template.segments[number:]:
+            positions.append(position)
+            if isinstance(segment, _Name):
+                data = segment.encode(self.values, names, position)
+            else:
+                data = segment.encode(self.values)
+            parts.append(data)
+            position += len(data)
+        self.buffer[offset:] = b''.join(parts)
+        starts[number:] = positions
+
+
+# Structs writing byte-aligned fields of Message, keyed by width in bits.
+_PATCH_STRUCTS = {width: struct.Struct('!' + code) for width, code in _INT_CODES.items()}
+
+
+# Marks the values of fields given by size alone in Serialize layouts.
+_DEFAULT = object()
+
 
 class Serialize:
     """
@@ -39,6 +1034,10 @@ class Serialize:
                   zero x-bytes
         If any of the values cannot be held in the specified number of bits or bytes, an exception will be thrown.
 
+    The dictionary is compiled into a Template once per process for each layout of field names and sizes (see
+    serializeme.cache.templates), so creating Serialize objects for the same layout with other values only parses
+    the dictionary.
+
     Attributes
     ----------
     fields: list of Field objects representing the Fields that were generated by the dictionary.
@@ -48,47 +1047,166 @@ class Serialize:
     def __init__(self, data):
         self.data = data
 
-        self.fields = []
+        # The template is shared by every layout with the same field names and sizes, and only holds the encoding
+        # plan; the fields hold this dictionary's own values.
+        shape = []
+        values = []
+        for name, stuff in data.items():
+            if isinstance(stuff, (tuple, list)) and stuff:
+                shape.append((name, stuff[0]))
+                values.append(stuff[1])
+            else:
+                # Fields without a value: zero, or the constant itself, neither of which can be changed in place.
+                shape.append((name, stuff))
+                values.append(_DEFAULT)
+        self.__template = template = templates.get(data, Template, tuple(shape))
+        if len(template.names) == len(values):
+            self.fields = list(map(Field, template.names, template.sizes,
+                                   [default if value is _DEFAULT else value
+                                    for value, default in zip(values, template.defaults)]))
+        else:
+            # Entries that are not fields are left out of the template.
+            self.fields = _parse_spec(data)
 
-        self.__extract_fields()
+        # Case-insensitive name -> position in fields, for get_field.
+        self.__index = template.lookup
 
+    @staticmethod
+    def compile(data, codegen=False):
+        """
+        Compile a packet layout dictionary into a reusable Template.
+        :param data: The dictionary of fields, as passed to Serialize.
+        :param codegen: (default=False) Also generate straight-line Python encode functions for the layout; the
+                        generated code is in the template's source attribute.
+        :return: Template: compiled layout whose pack(**values) returns the packet bytes.
+        """
+        return Template(data, codegen)
 
     def packetize(self):
         """
-        Generate a byte string from the list of fields in the object.
+        Generate a byte string from the list of fields in the object. The packet is encoded once into a buffer of
+        exactly size() bytes.
         :return: A byte string of the fields.
         """
-        byte_str = b''
+        values = self.__values()
+        if values is not None:
+            return self.__template._pack(values)
+        buffer = bytearray(self.size())
+        self.packetize_into(buffer)
+        return bytes(buffer)
 
-        # Bit string to accumulate bit values until we are ready to convert it into bytes
-        bit_str = ""
+    def packetize_buffers(self):
+        """
+        Generate the packet as a list of buffers for socket.sendmsg or os.writev, with large bytes-like values of
+        variable-length fields passed by reference rather than copied; see Template.pack_buffers.
+        :return: list of buffers, whose concatenation is packetize().
+        """
+        values = self.__values()
+        if values is not None:
+            return list(self.__template._buffers(values))
+        return [self.packetize()]
 
+    def size(self):
+        """
+        Compute the exact length of the packet packetize() would return, without encoding it.
+        :return: int: The length in bytes.
+        """
+        values = self.__values()
+        if values is not None:
+            return self.__template._size(values)
+        size = 0
+        num_bits = 0
+        # Suffixes of the DNS names so far, since compression changes their length.
+        names = {}
         for field in self.fields:
-            #if the current field is a special type, the bit_str value to the byte string and clear the accumulated bit_str.
-            if not isinstance(field.size, int) and len(bit_str) != 0:
-                byte_str += self.encode_bit_str(bit_str)
-                bit_str = ""
-            if field.size == NULL_TERMINATE:
-                byte_str += self.encode_null_term(field.value)
-            elif field.size == PREFIX_LENGTH:
-                byte_str += self.encode_prefix_length(field.value)
-            elif field.size == PREFIX_LEN_NULL_TERM:
-                byte_str += self.encode_prefix_length_null_term(field.value)
-            elif field.size == IPv4:
-                byte_str += self.encode_ipv4(field.value)
-            elif field.size == 1:  # One bit, just add it to our bit string.
-                bit_str += "0" if field.value == 0 else "1"
-            else:
-                if isinstance(field.value, int):
-                        bit_str += "0" * (field.size - len(bin(field.value)[2:])) + bin(field.value)[2:]
-                elif isinstance(field.value, bytes):
-                        bit_str += field.value.decode('latin-1')
-        #clear the bit string one last time
-        if len(bit_str) != 0:
-            byte_str += self.encode_bit_str(bit_str)
-            bit_str = ""
+            if isinstance(field.size, int):
+                num_bits += field.size
+                continue
+            size += (num_bits + 7) // 8
+            num_bits = 0
+            if field.size == DNS_NAME:
+                size += len(_encode_name(field.value, names, size))
+            elif _var_codec(field.size) is not None:
+                size += _var_codec(field.size)[1](field.value)
+        return size + (num_bits + 7) // 8
+
+    def packetize_into(self, buffer, offset=0):
+        """
+        Encode the fields directly into a writable buffer, such as a bytearray or memoryview. Consecutive fixed-width
+        fields are packed most significant bit first into one integer, written when a variable-length field or the
+        end of the packet is reached. A run of fixed-width fields that is not a whole number of bytes is padded with
+        zero bits before its first field, as encode_bit_str does. Bytes values of fixed-width fields are read as
+        big-endian integers. DNS_NAME fields are compressed against the names before them in the packet.
+        :param buffer: The buffer to write into.
+        :param offset: (default=0) Where in the buffer to start writing.
+        :return: int: The offset just past the end of the packet.
+        """
+        values = self.__values()
+        if values is not None:
+            return self.__template._pack_into(values, buffer, offset)
+        _check_room(buffer, offset, self.size())
+
+        # Accumulate fixed-width values until they fill a whole number of bytes.
+        acc = 0
+        num_bits = 0
+        # Suffixes of the DNS names written so far -> their offset from the start of the packet.
+        names = {}
+        start = offset
+
+        with memoryview(buffer) as view:
+            for field in self.fields:
+                if isinstance(field.size, int):
+                    acc = (acc << field.size) | _fixed_int(field.value, field.size)
+                    num_bits += field.size
+                    continue
+                # If the current field is a special type, flush the accumulated bits first.
+                if num_bits:
+                    offset = self.__write(view, offset, self.__flush_bits(acc, num_bits))
+                    acc = 0
+                    num_bits = 0
+                if field.size == DNS_NAME:
+                    offset = self.__write(view, offset, _encode_name(field.value, names, offset - start))
+                elif _var_codec(field.size) is not None:
+                    offset = self.__write(view, offset, _var_codec(field.size)[0](field.value))
+            # Flush the accumulated bits one last time.
+            if num_bits:
+                offset = self.__write(view, offset, self.__flush_bits(acc, num_bits))
+
+        return offset
 
-        return byte_str
+    # Helper
+    def __values(self):
+        """
+        Helper function to get the values of the fields for the compiled template.
+        :return: list of the field values, or None if fields no longer match the template (fields were added,
+                 removed or resized), in which case the fields are encoded one by one.
+        """
+        sizes = self.__template.sizes
+        if len(self.fields) != len(sizes):
+            return None
+        values = []
+        for field, size in zip(self.fields, sizes):
+            if field.size != size:
+                return None
+            values.append(field.value)
+        return values
+
+    # Helper
+    def __write(self, view, offset, data):
+        end = offset + len(data)
+        view[offset:end] = data
+        return end
+
+    # Helper
+    def __flush_bits(self, acc, num_bits):
+        """
+        Helper function to turn accumulated bits into bytes. If their number is not divisible by 8, they are padded
+        with zero bits in front, like encode_bit_str.
+        :param acc: The accumulated bits, as an integer.
+        :param num_bits: How many bits acc holds.
+        :return: The byte string equivalent.
+        """
+        return acc.to_bytes((num_bits + 7) // 8, "big")
 
     def encode_bit_str(self, input):
         """
@@ -106,7 +1224,7 @@ class Serialize:
         :param input: a string or a list of string
         :return: The byte string equivalent.
         """
-        return self.encode_prefix_length(input) + b'\x00'
+        return _encode_prefix_length_null_term(input)
 
     def encode_null_term(self, input):
         """
@@ -114,7 +1232,7 @@ class Serialize:
         :param input: a string
         :return: The byte string equivalent, with a null character at the end.
         """
-        return input.encode() + b'\x00'
+        return _encode_null_term(input)
 
     def encode_prefix_length(self, input):
         """
@@ -122,13 +1240,7 @@ class Serialize:
         :param input: a string or a list of string
         :return: The byte string equivalent.
         """
-        if isinstance(input, str):
-            return len(input).to_bytes(1, "big") + input.encode()
-        else :
-            byte_str = b''
-            for part in input:
-                byte_str += len(part).to_bytes(1, "big") + part.encode()
-            return byte_str
+        return _encode_prefix_length(input)
 
     def encode_ipv4(self, input):
         """
@@ -138,15 +1250,34 @@ class Serialize:
         """
         return inet_aton(input)
 
+    def encode_dns_name(self, input, names=None, position=0):
+        """
+        Helper function to encode a domain name into DNS labels, using pointers to names already in the packet
+        :param input: a dotted name or a list of labels
+        :param names: (default=None) dictionary of the suffixes written so far -> offset, updated in place
+        :param position: (default=0) offset of the name in the packet
+        :return: The byte string equivalent.
+        """
+        return _encode_name(input, {} if names is None else names, position)
+
     def get_field(self, field_name):
         """
         Get a specified field from the fields list, or return None if specified field does not exist.
-        :param field_name: The name of the desired field to find.
+        :param field_name: The name (case-insensitive) or position of the desired field to find.
         :return: Field: Field object with the specified name.
         """
-        for f in self.fields:
-            if f.name.lower() == field_name.lower():
-                return f
+        if isinstance(field_name, int):
+            return self.fields[field_name]
+        key = field_name.lower()
+        fields = self.fields
+        position = self.__index.get(key)
+        if position is not None and len(fields) == len(self.__template.names) \
+                and fields[position].name.lower() == key:
+            return fields[position]
+        # The fields were edited (added, removed or renamed) since they were built from the template.
+        for field in fields:
+            if field.name.lower() == key:
+                return field
         return None
 
     # Helper
@@ -162,52 +1293,6 @@ class Serialize:
             is_fit = True
         return is_fit
 
-    # Helper
-    def __extract_fields(self):
-        """
-        Helper function to parse the user-specified dictionary of fields upon creation of Serialize object.
-        """
-        for name, stuff in self.data.items():
-            if stuff == ():  # Empty tuple == 1 bit, value of 0
-                self.fields.append(Field(name=name, value=0, size=1))
-            elif isinstance(stuff, int):  # int == specified value, value of 0
-                self.fields.append(Field(name=name, value=0, size=stuff))
-            elif isinstance(stuff, str):  # str == specified value, value of 0
-                pattern = re.compile("[0-9]+[bB]")
-                if pattern.match(stuff):
-                    if "b" in stuff: # bits specified
-                        size = int(stuff[:stuff.lower().index("b")])
-                        self.fields.append(Field(name=name, value=0, size=size))
-                    elif "B" in stuff: # Bytes specified
-                        size = int(stuff[:stuff.lower().index("b")]) * 8
-                        self.fields.append(Field(name=name, value=0, size=size))
-                else: # No other string option, so must have been one of the "vary" constants from above.
-                    self.fields.append(Field(name=name, value=stuff, size="vary"))
-            elif isinstance(stuff, tuple) or isinstance(stuff, list):  # specified value and size.
-                if isinstance(stuff[0], str):
-                    if "b" in stuff[0]: # Bits
-                        size = int(stuff[0][:stuff[0].lower().index("b")])
-                       # if not self.__check_bit_size(stuff[1], size):
-                        #    raise Exception("error. " + str(stuff[1]) + " cannot be fit in " + str(size) + " bits.")
-                        self.fields.append(Field(name=name, value=stuff[1], size=size))
-                    elif "B" in stuff[0]: # Bytes
-                        size = int(stuff[0][:stuff[0].lower().index("b")]) * 8
-                       # if not self.__check_bit_size(stuff[1], size):
-                         #   raise Exception("error. " + str(stuff[1]) + " cannot be fit in " + str(size) + " bits.")
-                        self.fields.append(Field(name=name, value=stuff[1], size=size))
-                    elif stuff[0].lower() == NULL_TERMINATE:
-                        self.fields.append(Field(name=name, value=stuff[1], size=NULL_TERMINATE))
-                    elif stuff[0].lower() == PREFIX_LENGTH:
-                        self.fields.append(Field(name=name, value=stuff[1], size=PREFIX_LENGTH))
-                    elif stuff[0].lower() == PREFIX_LEN_NULL_TERM:
-                        self.fields.append(Field(name=name, value=stuff[1], size=PREFIX_LEN_NULL_TERM))
-                    elif stuff[0].lower() == IPv4:
-                        self.fields.append(Field(name=name, value=stuff[1], size=IPv4))
-                elif isinstance(stuff[0], int):
-                   # if not self.__check_bit_size(stuff[1], stuff[0]):
-                     #   raise Exception("error. " + str(stuff[1]) + " cannot be fit in " + str(stuff[0]) + " bits.")
-                    self.fields.append(Field(name=name, value=stuff[1], size=stuff[0]))
-
     def __str__(self):
         """
         Generate a string representation of the Serialize object by listing out all of the fields, their value,
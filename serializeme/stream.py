@@ -0,0 +1,137 @@
+"""
+Incremental decoder for byte streams that deliver messages in arbitrary chunks.
+"""
+# Author: Justin Roosenschoon <jeroosenschoon@gmail.com>
+
+# Licence: MIT License (c) 2021 Justin Roosenschoon
+
+from serializeme.deserialize import Deserialize, Schema
+from serializeme.exceptions import IncompletePacket, MalformedPacket
+
+
+class StreamDecoder:
+    """
+    Sans-IO decoder that turns chunks of a byte stream (TCP, pipes, files) into decoded messages. Bytes are fed in
+    as they arrive and each complete message is decoded as soon as all of it is buffered; a partial message is kept
+    until the rest of it is fed.
+
+    Parameters
+    ----------
+    :param schema: The Schema, or format dictionary, of each message.
+    :param length_prefix: (default=0) Size in bytes of a big-endian length header in front of every message, such
+                          as 2 for DNS over TCP. With 0, messages are delimited by the schema itself.
+
+    Attributes
+    ----------
+    schema: The Schema used to decode messages.
+    """
+
+    def __init__(self, schema, length_prefix=0):
+        self.schema = schema if isinstance(schema, Schema) else Schema(schema)
+        self.length_prefix = length_prefix
+        self.__buffer = bytearray()
+        # Bytes needed before the next message can possibly be decoded.
+        self.__needed = length_prefix or 1
+
+    def feed(self, chunk):
+        """
+        Add bytes from the stream and decode every message they complete.
+        :param chunk: The bytes received.
+        :return: list of Deserialize objects, one per complete message, in stream order.
+        :raises MalformedPacket: If a length-prefixed frame cannot be decoded, because it is too short for the schema
+                                 or holds an invalid field. The frame is dropped and the messages decoded before it
+                                 are in the exception's messages; feed(b'') decodes the ones buffered after it.
+        :raises Exception: Without length_prefix, any error decoding a message other than the stream ending inside
+                           it, such as InvalidField for a bad DNS_NAME pointer. The messages decoded before it are
+                           in the exception's messages attribute. Where the bad message ends is unknown, so its
+                           bytes stay buffered and every later feed raises again: drop them with discard() (all of
+                           them, or as many as the protocol allows to resynchronize), or close the stream.
+        """
+        buffer = self.__buffer
+        buffer += chunk
+        messages = []
+        start = 0
+        try:
+            while len(buffer) - start >= self.__needed:
+                if self.length_prefix:
+                    message = self.__read_framed(start)
+                else:
+                    message = self.__read_delimited(start)
+                if message is None:
+                    break
+                start += self.__needed
+                self.__needed = self.length_prefix or 1
+                messages.append(message)
+        except Exception as e:
+            if not self.length_prefix:
+                # Keep the bytes of the bad message, but not the messages before it.
+                e.messages = messages
+                raise
+            # The whole frame is buffered, so it will never decode: drop it along with the messages before it.
+            received = self.__needed - self.length_prefix
+            start += self.__needed
+            self.__needed = self.length_prefix
+            if isinstance(e, IncompletePacket):
+                raise MalformedPacket(e.needed, e.received, messages)
+            raise MalformedPacket(None, received, messages,
+                                  "Message cannot be decoded ({}). Bytes needed/received".format(e)) from e
+        finally:
+            del buffer[:start]
+        return messages
+
+    def __read_framed(self, start):
+        """
+        Decode the message at start if its length header and body are buffered. Otherwise, remember how many bytes
+        are needed and return None.
+        """
+        buffer = self.__buffer
+        header_end = start + self.length_prefix
+        length = int.from_bytes(buffer[start:header_end], "big")
+        if len(buffer) < header_end + length:
+            self.__needed = self.length_prefix + length
+            return None
+        self.__needed = self.length_prefix + length
+        return Deserialize(bytes(buffer[header_end:header_end + length]), self.schema)
+
+    def __read_delimited(self, start):
+        """
+        Try to decode a message at start. If the buffer ends inside it, remember how many bytes are needed at least
+        and return None.
+        """
+        with memoryview(self.__buffer) as view, view[start:] as rest:
+            try:
+                message = Deserialize(rest, self.schema)
+            except IncompletePacket as e:
+                self.__needed = max(e.needed, len(rest) + 1)
+                return None
+            # Do not keep a view of the buffer: it is resized by the next feed.
+            message.packet = bytes(rest[:message.size])
+        self.__needed = message.size
+        return message
+
+    def discard(self, nbytes=None):
+        """
+        Drop buffered bytes, such as those of a message that cannot be decoded.
+        :param nbytes: (default=None) Number of bytes to drop from the start of the buffer, or None for all of them.
+        :return: int: The number of bytes dropped.
+        """
+        buffer = self.__buffer
+        nbytes = len(buffer) if nbytes is None else min(nbytes, len(buffer))
+        del buffer[:nbytes]
+        self.__needed = self.length_prefix or 1
+        return nbytes
+
+    @property
+    def pending(self):
+        """
+        Number of bytes buffered for a message that is not complete yet.
+        """
+        return len(self.__buffer)
+
+    def close(self):
+        """
+        Signal the end of the stream.
+        :raises IncompletePacket: If the stream ended in the middle of a message.
+        """
+        if self.__buffer:
+            raise IncompletePacket(self.__needed, len(self.__buffer))
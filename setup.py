@@ -14,6 +14,9 @@ setup(
     long_description=LONG_DESCRIPTION,
     packages=find_packages(),
     install_requires=[],
+    extras_require={
+        'numpy': ['numpy'],
+    },
 
     keywords=['python', 'network', 'packet', 'serialize', 'networking'],
     classifiers=[
@@ -0,0 +1,134 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import serializeme
+from serializeme import Serialize
+from serializeme.aio import DatagramDecoderProtocol, read_messages, write_message
+from serializeme.exceptions import MalformedPacket
+
+QUERY = {
+    "ID": "2B",
+    "QNAME": (serializeme.PREFIX_LEN_NULL_TERM, serializeme.HOST),
+}
+
+
+def query(i):
+    return Serialize({"id": ("2B", i), "qname": (serializeme.PREFIX_LEN_NULL_TERM, ("example", "com"))})
+
+
+async def udp_exchange(**kwargs):
+    loop = asyncio.get_running_loop()
+    transport, server = await loop.create_datagram_endpoint(lambda: DatagramDecoderProtocol(QUERY, **kwargs),
+                                                            local_addr=('127.0.0.1', 0))
+    client_transport, client = await loop.create_datagram_endpoint(
+        lambda: DatagramDecoderProtocol({"ID": "2B"}), remote_addr=transport.get_extra_info('sockname'))
+    for i in range(5):
+        client.send(query(i))
+    received = []
+    async for message, addr in server:
+        received.append(message.get_value("ID"))
+        server.send(Serialize({"id": ("2B", message.get_value("ID"))}), addr)
+        if len(received) == 5:
+            break
+    replies = []
+    async for message, addr in client:
+        replies.append(message.get_value("ID"))
+        if len(replies) == 5:
+            break
+    transport.close()
+    client_transport.close()
+    return received, replies, server
+
+
+def test_datagram_queue_and_replies():
+    received, replies, server = asyncio.run(udp_exchange())
+    assert sorted(received) == list(range(5))
+    assert sorted(replies) == list(range(5))
+    assert server.errors == 0
+
+
+def test_datagram_executor():
+    with ThreadPoolExecutor(2) as executor:
+        received, replies, server = asyncio.run(udp_exchange(executor=executor))
+    assert sorted(received) == list(range(5))
+
+
+def test_datagram_callback_and_errors():
+    async def run():
+        loop = asyncio.get_running_loop()
+        got = []
+        done = loop.create_future()
+
+        def callback(message, addr):
+            got.append(message.get_value("QNAME"))
+            if not done.done():
+                done.set_result(None)
+        transport, server = await loop.create_datagram_endpoint(
+            lambda: DatagramDecoderProtocol(QUERY, callback=callback), local_addr=('127.0.0.1', 0))
+        client_transport, client = await loop.create_datagram_endpoint(
+            asyncio.DatagramProtocol, remote_addr=transport.get_extra_info('sockname'))
+        client_transport.sendto(b'\x00')
+        client_transport.sendto(query(1).packetize())
+        await asyncio.wait_for(done, 5)
+        transport.close()
+        client_transport.close()
+        return got, server.errors
+    assert asyncio.run(run()) == (['example.com'], 1)
+
+
+def test_stream_round_trip():
+    async def run():
+        async def handle(reader, writer):
+            async for message in read_messages(reader, QUERY, length_prefix=2):
+                await write_message(writer, Serialize({"id": ("2B", message.get_value("ID"))}), length_prefix=2)
+            writer.close()
+        server = await asyncio.start_server(handle, '127.0.0.1', 0)
+        reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname())
+        for i in range(3):
+            await write_message(writer, query(i), length_prefix=2)
+        writer.write_eof()
+        ids = [message.get_value("ID") async for message in read_messages(reader, {"ID": "2B"}, length_prefix=2)]
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return ids
+    assert asyncio.run(run()) == [0, 1, 2]
+
+
+def test_datagram_backpressure():
+    async def run():
+        loop = asyncio.get_running_loop()
+        transport, server = await loop.create_datagram_endpoint(lambda: DatagramDecoderProtocol(QUERY, maxsize=2),
+                                                                local_addr=('127.0.0.1', 0))
+        client_transport, client = await loop.create_datagram_endpoint(
+            asyncio.DatagramProtocol, remote_addr=transport.get_extra_info('sockname'))
+        for i in range(6):
+            client_transport.sendto(query(i).packetize())
+        await asyncio.sleep(0.1)
+        queued = server.queue.qsize()
+        received = []
+        async for message, addr in server:
+            received.append(message.get_value("ID"))
+            if len(received) == 6:
+                break
+        transport.close()
+        client_transport.close()
+        return queued, received, server.dropped
+    queued, received, dropped = asyncio.run(run())
+    assert queued == 2
+    assert received == list(range(6))
+    assert dropped == 0
+
+
+def test_stream_malformed_message():
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(b'\x02\x01\x00' + b'\x03\x02\xc0\x05')
+        reader.feed_eof()
+        ids = []
+        try:
+            async for message in read_messages(reader, {'id': '1B', 'n': serializeme.DNS_NAME}, length_prefix=1):
+                ids.append(message.get_value('id'))
+        except MalformedPacket:
+            return ids
+    assert asyncio.run(run()) == [1]
@@ -0,0 +1,102 @@
+import pytest
+
+import serializeme
+from serializeme import Deserialize, Template, IPv4
+from serializeme.batch import unpack_array, unpack_columns, pack_columns
+from serializeme.exceptions import IncompletePacket, InvalidField, ValueTooBig
+
+np = pytest.importorskip("numpy")
+
+DNS_HEADER = {
+    "ID": "2B",
+    "FLAGS!!2B": {
+        'QR': '1b',
+        'OPCODE': '4b',
+        'AA': '1b',
+        'TC': '1b',
+        'RD': '1b',
+        'RA': '1b',
+        "Z": "3b",
+        "RCODE": "4b",
+    },
+    "QDCOUNT": "2B",
+    "ANCOUNT": "2B",
+    "NSCOUNT": "2B",
+    "ARCOUNT": "2B",
+}
+
+DNS_QUERY = {
+    "id": (16, 17),
+    "flags": (4, 1),
+    "opcode": 4,
+    "rd": (1, 1),
+    "z": 3,
+    "rcode": 4,
+    "qdcount": ("2B", 1),
+    "qname": (serializeme.PREFIX_LEN_NULL_TERM, ("yahoo", "com")),
+    "qtype": (16, 1),
+}
+
+HEADERS = [b'\x00\x11\x81\x80\x00\x01\x00\x02\x00\x00\x00\x00',
+           b'\xab\xcd\x01\x20\x00\x01\x00\x00\x00\x00\x00\x01',
+           b'\xff\xff\x81\x83\x00\x01\x00\x00\x00\x01\x00\x00']
+
+
+def test_unpack_array_contiguous():
+    result = unpack_array(Deserialize.compile(DNS_HEADER), b''.join(HEADERS))
+    assert result['ID'].tolist() == [0x11, 0xabcd, 0xffff]
+    assert result['FLAGS'].tolist() == [0x8180, 0x0120, 0x8183]
+    assert result['QR'].tolist() == [1, 0, 1]
+    assert result['RD'].tolist() == [1, 1, 1]
+    assert result['Z'].tolist() == [0, 2, 0]
+    assert result['RCODE'].tolist() == [0, 0, 3]
+    assert result['ANCOUNT'].tolist() == [2, 0, 0]
+
+
+def test_unpack_columns_matches_deserialize():
+    columns = unpack_columns(DNS_HEADER, [h + b'trailing data' for h in HEADERS])
+    for i, header in enumerate(HEADERS):
+        pck = Deserialize(header, DNS_HEADER)
+        for name in ('ID', 'OPCODE', 'RCODE', 'ARCOUNT'):
+            assert columns[name][i] == pck.get_value(name)
+
+
+def test_odd_width_group_and_raw_bytes():
+    columns = unpack_columns({"!!3B": {'a': '4b', 'b': '16b', 'c': '4b'}, "addr": ('4B', IPv4)},
+                             b'\x1a\xbc\xd2\x0a\x00\x00\x00')
+    assert (columns['a'][0], columns['b'][0], columns['c'][0]) == (1, 0xabcd, 2)
+    assert columns['addr'][0].tobytes() == b'\x0a\x00\x00\x00'
+
+
+def test_partial_record():
+    with pytest.raises(IncompletePacket):
+        unpack_array(DNS_HEADER, b''.join(HEADERS)[:-1])
+
+
+def test_variable_layout_rejected():
+    with pytest.raises(InvalidField):
+        unpack_array({"VER": "1B", "NAME": ("null_terminate", "")}, b'')
+
+
+def test_pack_columns():
+    template = Template(DNS_QUERY)
+    ids = np.arange(1000)
+    (buffer, offsets) = pack_columns(template, {"id": ids, "rd": ids & 1, "rcode": ids % 16})
+    assert len(buffer) == offsets[-1] == 1000 * template.size()
+    for i in (0, 1, 17, 999):
+        assert bytes(buffer[offsets[i]:offsets[i + 1]]) == template.pack(id=i, rd=i & 1, rcode=i % 16)
+    views = pack_columns(DNS_QUERY, {"id": ids[:3]}, views=True)
+    assert [bytes(view) for view in views] == [template.pack(id=i) for i in range(3)]
+
+
+def test_pack_columns_falls_back():
+    template = Template(DNS_QUERY)
+    (buffer, offsets) = pack_columns(template, {"id": np.arange(3), "qname": [("a", "com"), ("bb", "org"), ("c",)]})
+    assert bytes(buffer[offsets[1]:offsets[2]]) == template.pack(id=1, qname=("bb", "org"))
+
+
+def test_pack_columns_range():
+    with pytest.raises(ValueTooBig):
+        pack_columns(DNS_QUERY, {"opcode": np.array([1, 16])})
+    with pytest.raises(ValueTooBig):
+        pack_columns(DNS_QUERY, {"id": np.array([-1])})
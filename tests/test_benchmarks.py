@@ -0,0 +1,34 @@
+import json
+import os
+import sys
+
+import pytest
+
+from serializeme import Deserialize, Serialize
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import bench  # noqa: E402
+from fixtures import DECODE_CASES, ENCODE_CASES  # noqa: E402
+
+
+@pytest.mark.parametrize("name", DECODE_CASES)
+def test_decode_fixtures_match_struct(name):
+    (data, packet, decoder) = DECODE_CASES[name]
+    assert Deserialize(packet, data, compact=True).values == decoder(packet)
+
+
+@pytest.mark.parametrize("name", ENCODE_CASES)
+def test_encode_fixtures_match_struct(name):
+    (data, encoder) = ENCODE_CASES[name]
+    assert Serialize(data).packetize() == encoder()
+
+
+def test_run_and_save(tmp_path):
+    output = tmp_path / "results.json"
+    results = bench.main(["--quick", "--case", "auth", "--output", str(output)])
+    assert {(r["direction"], r["variant"]) for r in results} >= {("decode", "struct"), ("encode", "codegen")}
+    saved = json.loads(output.read_text())
+    assert saved["results"] == results
+    assert all(r["packets_per_sec"] > 0 for r in results)
+    assert "change" in bench.report(results, saved["results"])
@@ -0,0 +1,42 @@
+from serializeme import Deserialize
+
+DNS_HEADER = {
+    "ID": "2B",
+    "FLAGS!!2B": {
+        'QR': '1b',
+        'OPCODE': '4b',
+        'AA': '1b',
+        'TC': '1b',
+        'RD': '1b',
+        'RA': '1b',
+        "Z": "3b",
+        "RCODE": "4b",
+    },
+}
+
+FLAGS = {'QR': 0, 'OPCODE': 0, 'AA': 0, 'TC': 0, 'RD': 1, 'RA': 0, 'Z': 2, 'RCODE': 0}
+
+
+def test_leading_zero_bits():
+    pck = Deserialize(b'\x01\x20', {"!!2B": DNS_HEADER["FLAGS!!2B"]})
+    assert pck.get_value('RD') == 1
+    assert pck.get_value('Z') == 2
+    assert pck.get_value('RCODE') == 0
+
+
+def test_group_flags_at_once():
+    pck = Deserialize(b'\xccD\x01\x20', DNS_HEADER)
+    assert pck.get_value('FLAGS') == FLAGS
+    assert pck.get_value('RD') == 1
+
+
+def test_group_flags_at_once_compiled():
+    pck = Deserialize.compile(DNS_HEADER).unpack(b'\xccD\x01\x20')
+    assert pck.get_value('FLAGS') == FLAGS
+    assert [f.name for f in pck.fields][:2] == ['ID', 'FLAGS']
+
+
+def test_group_three_bytes():
+    spec = {"!!3B": {'a': '4b', 'b': '16b', 'c': '4b'}}
+    for pck in (Deserialize(b'\x1a\xbc\xd2', spec), Deserialize.compile(spec).unpack(b'\x1a\xbc\xd2')):
+        assert (pck.get_value('a'), pck.get_value('b'), pck.get_value('c')) == (1, 0xabcd, 2)
@@ -0,0 +1,38 @@
+import mmap
+
+import serializeme
+from serializeme import Deserialize
+
+SOCKS_REQUEST = {
+    "VER": "1B",
+    "CMD": "1B",
+    "RSV": "1B",
+    "ATYP": "1B",
+    "DADDR": (serializeme.PREFIX_LENGTH, serializeme.HOST),
+    "DPORT": "2B",
+    "USER": (serializeme.NULL_TERMINATE, ""),
+}
+
+PACKET = b'\x05\x01\x00\x03\x0ewww.google.com\x00Pbob\x00'
+
+
+def check(pck):
+    assert pck.get_value('DADDR') == 'www.google.com'
+    assert pck.get_value('DPORT') == 80
+    assert pck.get_value('USER') == 'bob'
+
+
+def test_bytearray():
+    check(Deserialize(bytearray(PACKET), SOCKS_REQUEST))
+
+
+def test_memoryview_slice():
+    buffer = memoryview(b'junk' + PACKET + b'more')
+    check(Deserialize(buffer[4:4 + len(PACKET)], SOCKS_REQUEST))
+
+
+def test_mmap():
+    with mmap.mmap(-1, len(PACKET)) as mm:
+        mm.write(PACKET)
+        check(Deserialize(mm, SOCKS_REQUEST))
+        check(Deserialize(memoryview(mm), SOCKS_REQUEST))
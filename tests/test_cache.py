@@ -0,0 +1,127 @@
+import pytest
+
+import serializeme
+from serializeme import Deserialize, Serialize, Schema, Template
+from serializeme.cache import PlanCache, canonical, plans, templates
+
+AUTH = {
+    "VER": "1B",
+    "ID": serializeme.PREFIX_LENGTH,
+    "PW": serializeme.PREFIX_LENGTH,
+}
+
+AUTH_LAYOUT = {
+    "VER": ("1B", 1),
+    "ID": (serializeme.PREFIX_LENGTH, "cs158b"),
+    "PW": (serializeme.PREFIX_LENGTH, "Pa55word"),
+}
+
+AUTH_PACKET = b'\x01\x06cs158b\x08Pa55word'
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    plans.clear()
+    templates.clear()
+    yield
+    plans.resize(256)
+    plans.clear()
+    templates.clear()
+
+
+def test_canonical():
+    assert canonical({"a": ("2B", 1), "b": {"c": [1, 2]}}) == canonical({"a": ("2B", 1), "b": {"c": [1, 2]}})
+    # Field order is the packet layout.
+    assert canonical({"a": "1B", "b": "2B"}) != canonical({"b": "2B", "a": "1B"})
+    assert canonical({"a": (1, 1)}) != canonical({"a": (1, True)})
+    assert canonical({"a": (1, 1)}) != canonical({"a": [1, 1]})
+    with pytest.raises(TypeError):
+        canonical({"a": (1, {1})})
+
+
+def test_deserialize_uses_cache():
+    first = Deserialize(AUTH_PACKET, AUTH)
+    second = Deserialize(AUTH_PACKET, dict(AUTH))
+    assert first.get_value("PW") == second.get_value("PW") == "Pa55word"
+    assert second.data == AUTH
+    assert plans.info() == (1, 1, 256, 1)
+    # Explicitly compiled schemas are not cached.
+    Deserialize(AUTH_PACKET, Deserialize.compile(AUTH))
+    assert plans.info().currsize == 1
+
+
+def test_serialize_uses_cache():
+    assert Serialize(AUTH_LAYOUT).packetize() == AUTH_PACKET
+    packet = Serialize(dict(AUTH_LAYOUT))
+    packet.get_field("pw").value = "secret"
+    assert packet.packetize() == b'\x01\x06cs158b\x06secret'
+    assert packet.size() == 15
+    buffer = bytearray(16)
+    assert packet.packetize_into(buffer, 1) == 16
+    assert templates.info() == (1, 1, 256, 1)
+    # Plans of the two directions are cached separately.
+    Deserialize(AUTH_PACKET, AUTH)
+    assert (plans.info().currsize, templates.info().currsize) == (1, 1)
+
+
+def test_serialize_values_are_not_shared():
+    labels = ['www', 'google', 'com']
+    first = Serialize({'q': (serializeme.PREFIX_LENGTH, labels)})
+    labels.append('x')
+    assert Serialize({'q': (serializeme.PREFIX_LENGTH, ['www', 'google', 'com'])}).packetize() == \
+        b'\x03www\x06google\x03com'
+    first.fields[0].value.append('y')
+    assert Serialize({'q': (serializeme.PREFIX_LENGTH, ['a'])}).packetize() == b'\x01a'
+    assert templates.info().currsize == 1
+
+
+def test_serialize_values_do_not_miss():
+    for ident in range(300):
+        packet = Serialize({"id": ("2B", ident), "name": (serializeme.NULL_TERMINATE, str(ident))})
+        assert packet.packetize() == ident.to_bytes(2, "big") + str(ident).encode() + b'\x00'
+    assert templates.info() == (299, 1, 256, 1)
+    # Layouts do not evict schemas.
+    Deserialize(AUTH_PACKET, AUTH)
+    for i in range(300):
+        Serialize({"f" + str(i): ("1B", i)})
+    Deserialize(AUTH_PACKET, AUTH)
+    assert plans.info() == (1, 1, 256, 1)
+
+
+def test_serialize_changed_fields():
+    packet = Serialize({"a": (4, 1), "b": (4, 2)})
+    packet.fields.append(serializeme.field.Field("c", 8, 3))
+    assert packet.packetize() == b'\x12\x03'
+    assert packet.size() == 2
+
+
+def test_lru_eviction():
+    cache = PlanCache(maxsize=2)
+    a = cache.get({"a": "1B"}, Schema)
+    cache.get({"b": "1B"}, Schema)
+    assert cache.get({"a": "1B"}, Schema) is a
+    cache.get({"c": "1B"}, Schema)  # Evicts b, the least recently used.
+    assert cache.get({"a": "1B"}, Schema) is a
+    assert cache.info() == (2, 3, 2, 2)
+    cache.get({"b": "1B"}, Schema)
+    assert cache.info().misses == 4
+    cache.resize(1)
+    assert cache.info().currsize == 1
+    cache.clear()
+    assert cache.info() == (0, 0, 1, 0)
+
+
+def test_unbounded_and_disabled():
+    cache = PlanCache(maxsize=None)
+    for i in range(300):
+        cache.get({"f" + str(i): "1B"}, Template)
+    assert cache.info().currsize == 300
+    cache = PlanCache(maxsize=0)
+    assert cache.get(AUTH, Schema) is not cache.get(AUTH, Schema)
+    assert cache.info() == (0, 2, 0, 0)
+
+
+def test_unhashable_values_are_not_cached():
+    cache = PlanCache()
+    cache.get({"a": ("1B", {1})}, lambda data: data)
+    assert cache.info() == (0, 1, 256, 0)
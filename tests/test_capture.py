@@ -0,0 +1,202 @@
+import mmap
+import struct
+
+import pytest
+
+import serializeme
+from serializeme import Serialize, Schema
+from serializeme.capture import (CaptureReader, CaptureWriter, udp_payload, IPV4, UDP, LINKTYPE_ETHERNET,
+                                 LINKTYPE_USER0)
+from serializeme.exceptions import IncompletePacket, InvalidField
+
+AUTH = {
+    "VER": "1B",
+    "ID": serializeme.PREFIX_LENGTH,
+    "PW": serializeme.PREFIX_LENGTH,
+}
+
+AUTH_LAYOUT = {
+    "VER": ("1B", 1),
+    "ID": (serializeme.PREFIX_LENGTH, "cs158b"),
+    "PW": (serializeme.PREFIX_LENGTH, "Pa55word"),
+}
+
+AUTH_PACKET = b'\x01\x06cs158b\x08Pa55word'
+
+
+def _pcapng(packets, order='<', tsresol=None):
+    """
+    A pcapng file with one Ethernet interface, holding packets as enhanced packet blocks.
+    """
+    def block(block_type, body):
+        body += b'\x00' * (-len(body) % 4)
+        length = len(body) + 12
+        return struct.pack(order + 'LL', block_type, length) + body + struct.pack(order + 'L', length)
+
+    data = block(0x0a0d0d0a, struct.pack(order + 'LHHq', 0x1a2b3c4d, 1, 0, -1))
+    options = b''
+    if tsresol is not None:
+        options = struct.pack(order + 'HH', 9, 1) + bytes([tsresol]) + b'\x00' * 3 + struct.pack(order + 'HH', 0, 0)
+    data += block(1, struct.pack(order + 'HHL', LINKTYPE_ETHERNET, 0, 65535) + options)
+    for (timestamp, packet) in packets:
+        data += block(6, struct.pack(order + 'LLLLL', 0, timestamp >> 32, timestamp & 0xffffffff, len(packet),
+                                     len(packet)) + packet)
+    return data
+
+
+def _frames(tmp_path, *packets):
+    path = tmp_path / "frames.pcap"
+    with CaptureWriter(path) as writer:
+        for packet in packets:
+            writer.write(packet, timestamp=1.5)
+    with CaptureReader(path) as reader:
+        return [bytes(record.data) for record in reader]
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "auth.pcap"
+    with CaptureWriter(path, src=("192.168.1.2", 5000), dst=("192.168.1.3", 1080)) as writer:
+        writer.write(Serialize(AUTH_LAYOUT), timestamp=1000.25)
+        writer.write(b'\x01\x01a\x01b', timestamp=1001.0)
+    with CaptureReader(path) as reader:
+        assert reader.format == "pcap"
+        assert reader.linktype == LINKTYPE_ETHERNET
+        records = list(reader)
+        assert [r.timestamp for r in records] == [1000.25, 1001.0]
+        assert records[0].length == len(records[0].data) == 14 + 20 + 8 + len(AUTH_PACKET)
+        assert [bytes(p) for p in reader.payloads()] == [AUTH_PACKET, b'\x01\x01a\x01b']
+        messages = list(reader.decode(AUTH))
+        assert [m.get_value("ID") for m in messages] == ["cs158b", 97]
+
+        ip = Schema(IPV4).unpack(records[0].data[14:])
+        assert ip.get_value("src") == "192.168.1.2"
+        assert ip.get_value("dst") == "192.168.1.3"
+        assert ip.get_value("total_length") == 20 + 8 + len(AUTH_PACKET)
+        udp = Schema(UDP).unpack(records[0].data[34:])
+        assert (udp.get_value("sport"), udp.get_value("dport")) == (5000, 1080)
+
+
+def test_ipv4_checksum(tmp_path):
+    (frame,) = _frames(tmp_path, AUTH_PACKET)
+    header = frame[14:34]
+    total = sum(struct.unpack('!10H', header))
+    while total >> 16:
+        total = (total & 0xffff) + (total >> 16)
+    assert total == 0xffff
+
+
+def test_views_are_zero_copy(tmp_path):
+    path = tmp_path / "auth.pcap"
+    with CaptureWriter(path) as writer:
+        writer.write(AUTH_PACKET)
+    with CaptureReader(path) as reader:
+        (payload,) = reader.payloads()
+        assert isinstance(payload, memoryview)
+        assert isinstance(payload.obj, mmap.mmap)
+        payload.release()
+
+
+def test_raw_payloads(tmp_path):
+    path = tmp_path / "raw.pcap"
+    with CaptureWriter(path, udp=False) as writer:
+        writer.write(AUTH_PACKET)
+    with CaptureReader(path) as reader:
+        assert reader.linktype == LINKTYPE_USER0
+        assert [bytes(p) for p in reader.payloads(strip=False)] == [AUTH_PACKET]
+        # Nothing to strip: the packets are not Ethernet frames.
+        assert list(reader.payloads()) == []
+
+
+def test_writer_file_object(tmp_path):
+    path = tmp_path / "auth.pcap"
+    with open(path, 'wb') as f:
+        CaptureWriter(f).write(AUTH_PACKET)
+    with CaptureReader(path) as reader:
+        assert [bytes(p) for p in reader.payloads()] == [AUTH_PACKET]
+
+
+def test_big_endian_nanoseconds(tmp_path):
+    path = tmp_path / "nano.pcap"
+    path.write_bytes(struct.pack('>LHHlLLL', 0xa1b23c4d, 2, 4, 0, 0, 65535, LINKTYPE_USER0)
+                     + struct.pack('>LLLL', 10, 500000000, len(AUTH_PACKET), 100) + AUTH_PACKET)
+    with CaptureReader(path) as reader:
+        (record,) = reader
+        assert record.timestamp == 10.5
+        assert record.length == 100
+        assert bytes(record.data) == AUTH_PACKET
+
+
+def test_pcapng(tmp_path):
+    (frame,) = _frames(tmp_path, AUTH_PACKET)
+    for order in '<>':
+        path = tmp_path / "auth.pcapng"
+        path.write_bytes(_pcapng([(2000000, frame), (3500000, frame)], order))
+        with CaptureReader(path) as reader:
+            assert reader.format == "pcapng"
+            assert reader.linktype == LINKTYPE_ETHERNET
+            assert [r.timestamp for r in reader] == [2.0, 3.5]
+            assert [bytes(p) for p in reader.payloads()] == [AUTH_PACKET] * 2
+
+
+def test_pcapng_tsresol(tmp_path):
+    (frame,) = _frames(tmp_path, AUTH_PACKET)
+    path = tmp_path / "auth.pcapng"
+    path.write_bytes(_pcapng([(2500, frame)], tsresol=3))
+    with CaptureReader(path) as reader:
+        assert [r.timestamp for r in reader] == [2.5]
+
+
+def test_vlan(tmp_path):
+    (frame,) = _frames(tmp_path, AUTH_PACKET)
+    tagged = frame[:12] + b'\x81\x00\x00\x05' + frame[12:]
+    assert bytes(udp_payload(tagged)) == AUTH_PACKET
+
+
+def test_skipped_packets(tmp_path):
+    (frame,) = _frames(tmp_path, AUTH_PACKET)
+    # Not IPv4.
+    assert udp_payload(frame[:12] + b'\x86\xdd' + frame[14:]) is None
+    # Not UDP.
+    assert udp_payload(frame[:23] + b'\x06' + frame[24:]) is None
+    # A fragment.
+    assert udp_payload(frame[:20] + b'\x20\x00' + frame[22:]) is None
+    # Truncated by the capture.
+    assert udp_payload(frame[:-1]) is None
+    assert udp_payload(frame[:20]) is None
+
+
+def test_bad_magic(tmp_path):
+    path = tmp_path / "bad.pcap"
+    path.write_bytes(b'GIF89a' + b'\x00' * 30)
+    with pytest.raises(InvalidField):
+        CaptureReader(path)
+
+
+def test_truncated(tmp_path):
+    path = tmp_path / "auth.pcap"
+    with CaptureWriter(path) as writer:
+        writer.write(AUTH_PACKET)
+    path.write_bytes(path.read_bytes()[:-3])
+    with CaptureReader(path) as reader:
+        with pytest.raises(IncompletePacket):
+            list(reader)
+
+
+@pytest.mark.parametrize("header", [
+    b'\xd4\xc3\xb2\xa1\x02\x00\x04\x00',  # pcap global header cut short
+    b'\x0a\x0d\x0d\x0a\x1c\x00\x00\x00\x4d\x3c\x2b\x1a',  # pcapng section header block cut short
+])
+def test_truncated_header_unmaps_file(tmp_path, monkeypatch, header):
+    maps = []
+    real = mmap.mmap
+
+    def mapped(*args, **kwargs):
+        maps.append(real(*args, **kwargs))
+        return maps[-1]
+
+    monkeypatch.setattr(mmap, "mmap", mapped)
+    path = tmp_path / "short.pcap"
+    path.write_bytes(header)
+    with pytest.raises(IncompletePacket):
+        CaptureReader(path)
+    assert len(maps) == 1 and maps[0].closed
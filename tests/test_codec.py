@@ -0,0 +1,108 @@
+import uuid
+
+import pytest
+
+import serializeme
+from serializeme import Deserialize, Serialize, Schema, Template, codec
+from serializeme.cache import plans
+from serializeme.exceptions import InvalidField, InvalidSize, InvalidValue
+
+
+@pytest.fixture
+def registered():
+    added = []
+
+    def register(name, *args, **kwargs):
+        registered = codec.register(name, *args, **kwargs)
+        added.append(name.lower())
+        return registered
+
+    yield register
+    for name in added:
+        codec._CODECS.pop(name, None)
+
+
+def test_ipv6_has_eight_groups():
+    address = bytes.fromhex("20010db8000000000000000000000001")
+    assert Deserialize(address, {"ADDR": ("16B", serializeme.IPv6)}).get_value("ADDR") == "2001:db8::1"
+    assert Deserialize(address, {"ADDR": serializeme.IPv6}).get_value("ADDR") == "2001:db8::1"
+    # Other sizes keep the plain group formatting, over all of the bytes.
+    assert Deserialize(address[:4], {"ADDR": ("4B", serializeme.IPv6)}).get_value("ADDR") == "2001:0db8"
+
+
+def test_ipv4():
+    fmt = {"SRC": ("4B", serializeme.IPv4), "DST": serializeme.IPv4}
+    packet = b'\x0a\x00\x00\x01\xc0\xa8\x01\xfe'
+    message = Deserialize(packet, fmt)
+    assert (message.get_value("SRC"), message.get_value("DST")) == ("10.0.0.1", "192.168.1.254")
+    layout = {"SRC": (serializeme.IPv4, "10.0.0.1"), "DST": (serializeme.IPv4, "192.168.1.254")}
+    assert Serialize(layout).packetize() == Template(layout).pack() == packet
+
+
+def test_mac():
+    packet = b'\x00\x1a\x2b\x3c\x4d\x5e\x08\x00'
+    message = Deserialize(packet, {"MAC": serializeme.MAC, "TYPE": "2B"})
+    assert message.get_value("MAC") == "00:1a:2b:3c:4d:5e"
+    assert message.get_value("TYPE") == 0x800
+    for value in ("00:1a:2b:3c:4d:5e", "00-1A-2B-3C-4D-5E", packet[:6]):
+        assert Template({"MAC": (serializeme.MAC, value), "TYPE": ("2B", 0x800)}).pack() == packet
+    with pytest.raises(InvalidValue):
+        Template({"MAC": (serializeme.MAC, "00:1a:2b")}).pack()
+    with pytest.raises(InvalidValue):
+        Template({"MAC": (serializeme.MAC, "zz:1a:2b:3c:4d:5e")}).pack()
+
+
+def test_host():
+    packet = b'\x03www\x07example\x03com\x00'
+    fmt = {"NAME": (serializeme.PREFIX_LEN_NULL_TERM, serializeme.HOST)}
+    assert Deserialize(packet, fmt).get_value("NAME") == "www.example.com"
+    assert codec.lookup(serializeme.HOST).decode(b'\x01a\x00\xff') == "a.\xff"
+    assert codec.lookup(serializeme.HOST).encode("www.example.com.") == packet[:-1]
+
+
+def test_custom_codec(registered):
+    registered("UUID", lambda bites: uuid.UUID(bytes=bytes(bites)), lambda value: value.bytes, 16)
+    value = uuid.UUID("12345678-1234-5678-1234-567812345678")
+    layout = {"ID": ("1B", 7), "SESSION": ("uuid", value)}
+    packet = Template(layout).pack()
+    assert packet == b'\x07' + value.bytes
+    assert Serialize(layout).packetize() == packet
+    message = Schema({"ID": "1B", "SESSION": "UUID"}).unpack(packet)
+    assert message.get_value("SESSION") == value
+    assert Schema({"ID": "1B", "SESSION": ("16B", "uuid")}, codegen=True).unpack(packet).get_value("SESSION") == value
+
+
+def test_variable_size_codec(registered):
+    registered("csv", lambda bites: bytes(bites).decode().split(","), lambda value: ",".join(value).encode())
+    layout = {"LEN": ("1B", 3), "ITEMS": ("csv", ["a", "b"])}
+    assert Template(layout).pack() == Serialize(layout).packetize() == b'\x03a,b'
+    assert Template(layout).size() == 4
+    # Without a size, the name alone is not a field size.
+    with pytest.raises(InvalidSize):
+        Schema({"ITEMS": "csv"})
+    assert Deserialize(b'a,b', {"ITEMS": ("3B", "csv")}).get_value("ITEMS") == ["a", "b"]
+
+
+def test_decode_only_codec(registered):
+    registered("upper", lambda bites: bytes(bites).decode().upper())
+    assert Deserialize(b'abc', {"S": ("3B", "upper")}).get_value("S") == "ABC"
+    with pytest.raises(InvalidField):
+        Template({"S": ("upper", "abc")})
+
+
+def test_register_errors(registered):
+    with pytest.raises(InvalidField):
+        registered("ipv4", bytes)
+    for name in (serializeme.DNS_NAME, serializeme.NULL_TERMINATE, "2B", "16b"):
+        with pytest.raises(InvalidField):
+            registered(name, bytes)
+    with pytest.raises(InvalidField):
+        Schema({"A": ("2B", "no such codec")})
+
+
+def test_replace_clears_plans(registered):
+    registered("tag", lambda bites: "old", size=1)
+    assert Deserialize(b'\x01', {"T": "tag"}).get_value("T") == "old"
+    registered("tag", lambda bites: "new", size=1, replace=True)
+    assert plans.info().currsize == 0
+    assert Deserialize(b'\x01', {"T": "tag"}).get_value("T") == "new"
@@ -0,0 +1,83 @@
+import inspect
+
+import pytest
+
+import serializeme
+from serializeme import Deserialize, Serialize
+from serializeme.exceptions import IncompletePacket, ValueTooBig
+
+from test_schema import DNS_RESPONSE, DNS_RESPONSE_PACKET
+from test_lookup import NESTED
+from test_template import DNS_QUERY
+from test_bit_groups import DNS_HEADER
+
+MIXED = {
+    "ver": "1B",
+    "!!3B": {'a': '4b', 'b': '16b', 'c': '4b'},
+    "user": (serializeme.PREFIX_LENGTH,),
+    "host": (serializeme.PREFIX_LENGTH, serializeme.HOST),
+    "note": (serializeme.NULL_TERMINATE,),
+    "tag": "3B",
+}
+
+MIXED_PACKET = b'\x05\x1a\xbc\xd2\x02\x00\x07\x03abc\x02hi\x00xyz'
+
+
+def _dump(fields):
+    # Count sections hold a list of records, each a list of Field objects.
+    return [(f.name, f.size, [_dump(record) for record in f.value] if isinstance(f.value, list) else f.value)
+            for f in fields]
+
+
+@pytest.mark.parametrize("spec, packet", [
+    (DNS_RESPONSE, DNS_RESPONSE_PACKET),
+    (NESTED, b'\x02\x0a\x01\x00\x05\x0b\x02\x00\x06\x00\x07'),
+    (DNS_HEADER, b'\xccD\x01\x20'),
+    (MIXED, MIXED_PACKET),
+])
+def test_generated_decode_matches(spec, packet):
+    schema = Deserialize.compile(spec, codegen=True)
+    assert _dump(schema.unpack(packet).fields) == _dump(Deserialize(packet, spec).fields)
+    assert schema.unpack(packet, compact=True).values == Deserialize(packet, spec, compact=True).values
+    assert schema.unpack(packet).size == len(packet)
+
+
+def test_generated_decode_truncated():
+    schema = Deserialize.compile(DNS_RESPONSE, codegen=True)
+    with pytest.raises(IncompletePacket):
+        schema.unpack(DNS_RESPONSE_PACKET[:-3])
+
+
+def test_decode_source():
+    assert Deserialize.compile(DNS_RESPONSE).source is None
+    schema = Deserialize.compile(DNS_RESPONSE, codegen=True)
+    assert schema.source.startswith('def read(packet, index, fields, variables):')
+    assert "variables['ANSWERS']" in schema.source
+    assert inspect.getsource(schema._read).startswith('def read(')
+
+
+def test_generated_encode_matches():
+    template = Serialize.compile(DNS_QUERY, codegen=True)
+    plain = Serialize.compile(DNS_QUERY)
+    for values in ({}, {"id": 0xabcd, "qname": ("yahoo", "com")}, {"opcode": 2, "rcode": 3, "qdcount": b'\x00\x02'}):
+        assert template.pack(**values) == plain.pack(**values)
+        assert template.size(**values) == plain.size(**values)
+        buffer = bytearray(40)
+        assert template.pack_into(buffer, 3, **values) == 3 + plain.size(**values)
+        assert buffer[3:3 + plain.size(**values)] == plain.pack(**values)
+
+
+def test_generated_encode_errors():
+    template = Serialize.compile(DNS_QUERY, codegen=True)
+    with pytest.raises(ValueTooBig):
+        template.pack(opcode=16)
+    with pytest.raises(ValueTooBig):
+        template.pack(id=0x10000)
+    with pytest.raises(ValueTooBig):
+        template.pack_into(bytearray(10))
+
+
+def test_encode_source():
+    template = Serialize.compile({"a": (3, 5), "b": ("1B", 2)}, codegen=True)
+    assert template.pack() == Serialize({"a": (3, 5), "b": ("1B", 2)}).packetize()
+    assert 'def pack_into(values, buffer, offset):' in template.source
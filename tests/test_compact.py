@@ -0,0 +1,79 @@
+import pytest
+
+import serializeme
+from serializeme import Deserialize, Schema
+
+from test_schema import DNS_RESPONSE, DNS_RESPONSE_PACKET
+from test_lookup import NESTED
+
+FLAGS = {
+    "id": "1B",
+    "FLAGS!!2B": {"qr": "1b", "opcode": "4b", "rest": "11b"},
+    "name": (serializeme.PREFIX_LENGTH,),
+}
+
+
+def test_values_tuple():
+    pck = Deserialize(DNS_RESPONSE_PACKET, DNS_RESPONSE, compact=True)
+    assert pck.values[:6] == (0x11, 0x8180, 1, 2, 0, 0)
+    assert pck.values[6] == 'google.com'
+    assert pck.values[9][1] == (0xc00c, 1, 1, 60, 4, '8.8.8.8')
+    assert pck.variables == {'ANSWERS': 2}
+    assert pck.size == len(DNS_RESPONSE_PACKET)
+
+
+def test_same_values_as_fields():
+    eager = Deserialize(DNS_RESPONSE_PACKET, DNS_RESPONSE)
+    compact = Schema(DNS_RESPONSE).unpack(DNS_RESPONSE_PACKET, compact=True)
+    assert [f.name for f in compact.fields] == [f.name for f in eager.fields]
+    for name in ("pid", "acnt", "qname", "qclass"):
+        assert compact.get_value(name) == eager.get_value(name)
+    assert compact.get_value("ANSWERS", 0, "address") == '142.250.64.78'
+    assert compact.get_value("answers", 1, "TTL") == 60
+    assert compact.get_value("ANSWERS", 0, "nothing") is None
+    assert compact.get_value("nothing") is None
+    answers = compact.get_value("ANSWERS")
+    assert [[f.value for f in record] for record in answers] == \
+           [[f.value for f in record] for record in eager.get_value("ANSWERS")]
+
+
+def test_field_views():
+    pck = Deserialize(DNS_RESPONSE_PACKET, DNS_RESPONSE, compact=True)
+    pid = pck.get_field("PID")
+    assert (pid.name, pid.size, pid.value) == ('pid', 2, 0x11)
+    assert pck.get_field(6).size == serializeme.NULL_TERMINATE
+    ttl = pck.get_field("ANSWERS", 0, "ttl")
+    assert (ttl.name, ttl.size, ttl.value) == ('ttl', 4, 300)
+    assert pck.get_field("ANSWERS", 0, "address").size == '4B'
+    assert pck.get_field("ANSWERS").size is None
+
+
+def test_bit_groups_and_prefix():
+    packet = b'\x07\x81\x23\x02hi'
+    eager = Deserialize(packet, FLAGS)
+    compact = Deserialize(packet, FLAGS, compact=True)
+    assert list(compact.values) == [f.value for f in eager.fields]
+    assert [(f.name, f.size) for f in compact.fields][:5] == [(f.name, f.size) for f in eager.fields][:5]
+    assert compact.get_value("flags") == {"qr": 1, "opcode": 0, "rest": 0x123}
+    assert compact.get_field("name").size == serializeme.PREFIX_LENGTH
+
+
+def test_nested_sections():
+    pck = Deserialize(b'\x02\x0a\x01\x00\x05\x0b\x02\x00\x06\x00\x07', NESTED, compact=True)
+    assert pck.values[1] == ((10, 1, ((5,),)), (11, 2, ((6,), (7,))))
+    assert pck.get_value("GROUPS", 1, "ITEMS", 1, "val") == 7
+    assert pck.get_field("GROUPS", 1, "ITEMS", 0, "val").value == 6
+
+
+def test_descriptors():
+    schema = Schema(DNS_RESPONSE)
+    assert schema.descriptors[:7] == (('pid', 2), ('pflags', 2), ('qcnt', 2), ('acnt', 2), ('ncnt', 2),
+                                      ('mcnt', 2), ('qname', serializeme.NULL_TERMINATE))
+    assert schema.descriptors[-1] == ('ANSWERS', None)
+    assert schema.sections['answers'].descriptors[-1] == ('address', '4B')
+    assert len(schema.descriptors) == len(Deserialize(DNS_RESPONSE_PACKET, schema).fields)
+
+
+def test_lazy_and_compact():
+    with pytest.raises(ValueError):
+        Deserialize(DNS_RESPONSE_PACKET, DNS_RESPONSE, lazy=True, compact=True)
@@ -0,0 +1,90 @@
+import pytest
+
+import serializeme
+from serializeme import Deserialize, Serialize
+from serializeme.exceptions import IncompletePacket, InvalidField, ValueTooBig
+
+from test_schema import DNS_RESPONSE_PACKET
+
+DNS_RESPONSE = {
+    'pid': '2B',
+    'pflags': '2B',
+    'qcnt': '2B',
+    'acnt': ('2B', '', 'ANSWERS'),
+    'ncnt': '2B',
+    'mcnt': '2B',
+    'qname': serializeme.DNS_NAME,
+    'qtype': '2B',
+    'qclass': '2B',
+    'ANSWERS': {
+        'name': serializeme.DNS_NAME,
+        'type': '2B',
+        'class': '2B',
+        'ttl': '4B',
+        'data_length': '2B',
+        'address': ('4B', serializeme.IPv4),
+    }
+}
+
+NAMES = {
+    "id": ("2B", 1),
+    "a": (serializeme.DNS_NAME, "www.google.com"),
+    "b": (serializeme.DNS_NAME, "mail.google.com"),
+    "c": (serializeme.DNS_NAME, ("www", "google", "com")),
+    "d": (serializeme.DNS_NAME, "."),
+    "t": (16, 5),
+}
+
+NAMES_PACKET = b'\x00\x01\x03www\x06google\x03com\x00\x04mail\xc0\x06\xc0\x02\x00\x00\x05'
+
+
+def test_encode_compresses_suffixes():
+    assert Serialize(NAMES).packetize() == NAMES_PACKET
+    assert Serialize(NAMES).size() == len(NAMES_PACKET)
+
+
+@pytest.mark.parametrize("codegen", [False, True])
+def test_template_compresses_suffixes(codegen):
+    template = Serialize.compile(NAMES, codegen=codegen)
+    assert template.pack() == NAMES_PACKET
+    assert template.size(b="ftp.example.org") == len(template.pack(b="ftp.example.org"))
+    buffer = bytearray(40)
+    end = template.pack_into(buffer, 5)
+    assert buffer[5:end] == NAMES_PACKET
+
+
+@pytest.mark.parametrize("options", [{}, {"lazy": True}, {"compact": True}])
+def test_decode_follows_pointers(options):
+    spec = {name: "2B" if name in ("id", "t") else serializeme.DNS_NAME for name in NAMES}
+    pck = Deserialize(NAMES_PACKET, spec, **options)
+    assert [pck.get_value(name) for name in "abcd"] == ["www.google.com", "mail.google.com", "www.google.com", ""]
+    assert pck.get_value("t") == 5
+    assert pck.variables == {}
+
+
+def test_decode_response_names():
+    pck = Deserialize.compile(DNS_RESPONSE, codegen=True).unpack(DNS_RESPONSE_PACKET)
+    assert pck.get_value("qname") == "google.com"
+    assert pck.get_value("ANSWERS", 1, "name") == "google.com"
+    assert pck.get_field("ANSWERS", 1, "name").size == '2B'
+    assert pck.get_value("ANSWERS", 1, "address") == '8.8.8.8'
+
+
+def test_pointer_loops_rejected():
+    with pytest.raises(InvalidField):
+        Deserialize(b'\x01a\xc0\x00', {"name": serializeme.DNS_NAME})
+    with pytest.raises(InvalidField):
+        Deserialize(b'\xc0\x02\x00', {"name": serializeme.DNS_NAME})
+    with pytest.raises(InvalidField):
+        Deserialize(b'\x00\x01a\xc0\x04\xc0\x01', {"id": "1B", "a": serializeme.DNS_NAME, "b": serializeme.DNS_NAME})
+
+
+def test_truncated_name():
+    for packet in (b'\x03ww', b'\x03www', b'\x03www\xc0'):
+        with pytest.raises(IncompletePacket):
+            Deserialize(packet, {"name": serializeme.DNS_NAME})
+
+
+def test_label_too_long():
+    with pytest.raises(ValueTooBig):
+        Serialize({"name": (serializeme.DNS_NAME, "a" * 64 + ".com")}).packetize()
@@ -0,0 +1,76 @@
+import pytest
+
+from serializeme import Deserialize, Serialize
+from serializeme.exceptions import IncompletePacket, ValueTooBig
+
+from test_schema import DNS_RESPONSE, DNS_RESPONSE_PACKET
+from test_template import DNS_QUERY
+
+
+@pytest.mark.parametrize("codegen", [False, True])
+def test_decode_counters(codegen):
+    schema = Deserialize.compile(DNS_RESPONSE, codegen=codegen)
+    stats = schema.instrument()
+    assert schema.instrument() is stats
+    for i in range(3):
+        assert schema.unpack(DNS_RESPONSE_PACKET).get_value("ANSWERS", 1, "ttl") == 60
+    schema.unpack(DNS_RESPONSE_PACKET, compact=True)
+    # A section's time includes its records'; compared before the failed packet counts records without the section.
+    fields = stats.snapshot()["fields"]
+    assert fields["ANSWERS"]["time"] >= fields["ANSWERS/name,type,class,ttl,data_length,address"]["time"]
+    with pytest.raises(IncompletePacket):
+        schema.unpack(DNS_RESPONSE_PACKET[:-1])
+    snapshot = stats.snapshot()
+    assert (snapshot["messages"], snapshot["bytes"], snapshot["errors"]) == (4, 4 * len(DNS_RESPONSE_PACKET), 1)
+    assert snapshot["time"] > 0
+    fields = snapshot["fields"]
+    assert fields["qname"]["calls"] == 5
+    assert fields["qname"]["bytes"] == 5 * 12
+    assert fields["pid,pflags,qcnt,acnt,ncnt,mcnt"]["bytes"] == 5 * 12
+    assert fields["ANSWERS"]["calls"] == 4
+    assert fields["ANSWERS/name,type,class,ttl,data_length,address"]["calls"] == 8 + 1
+
+
+def test_lazy_counters():
+    schema = Deserialize.compile(DNS_RESPONSE)
+    stats = schema.instrument()
+    pck = schema.unpack(DNS_RESPONSE_PACKET, lazy=True)
+    assert stats.messages == 1
+    assert stats.fields["qname"].calls == 1
+    pck.get_value("qname")
+    assert stats.fields["qname"].calls == 2
+
+
+def test_reset_and_disable():
+    schema = Deserialize.compile(DNS_RESPONSE, codegen=True)
+    generated = schema._read
+    stats = schema.instrument()
+    schema.unpack(DNS_RESPONSE_PACKET)
+    stats.reset()
+    assert stats.snapshot()["messages"] == 0
+    assert stats.snapshot()["fields"]["qname"] == {"calls": 0, "bytes": 0, "time": 0.0}
+    assert schema.instrument(False) is None
+    assert schema.stats is None
+    assert schema._read is generated
+    assert schema.sections["answers"].steps[0].__class__.__name__ == "_FixedRun"
+    schema.unpack(DNS_RESPONSE_PACKET)
+    assert stats.messages == 0
+
+
+@pytest.mark.parametrize("codegen", [False, True])
+def test_encode_counters(codegen):
+    template = Serialize.compile(DNS_QUERY, codegen=codegen)
+    expected = Serialize.compile(DNS_QUERY).pack(id=3)
+    stats = template.instrument()
+    assert template.pack(id=3) == expected
+    buffer = bytearray(30)
+    assert template.pack_into(buffer, 1, id=3) == 1 + len(expected)
+    with pytest.raises(ValueTooBig):
+        template.pack(opcode=16)
+    snapshot = stats.snapshot()
+    assert (snapshot["messages"], snapshot["bytes"], snapshot["errors"]) == (2, 2 * len(expected), 1)
+    assert snapshot["fields"]["qname"] == {"calls": 2, "bytes": 24, "time": snapshot["fields"]["qname"]["time"]}
+    assert snapshot["fields"]["qtype,qclass"]["bytes"] == 8
+    template.instrument(False)
+    assert template.pack(id=3) == expected
+    assert stats.messages == 2
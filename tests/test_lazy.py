@@ -0,0 +1,34 @@
+import pytest
+
+from serializeme import Deserialize
+from serializeme.exceptions import IncompletePacket
+
+from test_schema import DNS_RESPONSE, DNS_RESPONSE_PACKET
+
+
+def dump(fields):
+    return [(f.name, f.size, [dump(r) for r in f.value] if f.name == 'ANSWERS' else f.value) for f in fields]
+
+
+def test_lazy_values_match_eager():
+    eager = Deserialize(DNS_RESPONSE_PACKET, DNS_RESPONSE)
+    lazy = Deserialize(DNS_RESPONSE_PACKET, DNS_RESPONSE, lazy=True)
+    assert lazy.size == eager.size == len(DNS_RESPONSE_PACKET)
+    assert lazy.variables == {'ANSWERS': 2}
+    assert lazy.get_value('qclass') == 1
+    assert lazy.get_value('QNAME') == 'google.com'
+    assert lazy.get_field('missing') is None
+    assert 'fields' not in vars(lazy)
+    assert dump(lazy.fields) == dump(eager.fields)
+
+
+def test_lazy_decodes_once():
+    lazy = Deserialize.compile(DNS_RESPONSE).unpack(DNS_RESPONSE_PACKET, lazy=True)
+    answers = lazy.get_field('ANSWERS')
+    assert answers is lazy.get_field('answers')
+    assert lazy.fields[-1] is answers
+
+
+def test_lazy_still_checks_length():
+    with pytest.raises(IncompletePacket):
+        Deserialize(DNS_RESPONSE_PACKET[:-1], DNS_RESPONSE, lazy=True)
@@ -0,0 +1,64 @@
+import pytest
+
+import serializeme
+from serializeme import Deserialize, Serialize
+from serializeme.exceptions import InvalidField
+
+from test_schema import DNS_RESPONSE, DNS_RESPONSE_PACKET
+
+NESTED = {
+    "NGROUPS": ("1B", "", "GROUPS"),
+    "GROUPS": {
+        "ID": "1B",
+        "NITEMS": ("1B", "", "ITEMS"),
+        "ITEMS": {
+            "val": "2B",
+        },
+    },
+}
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_lookup_by_name_and_position(lazy):
+    pck = Deserialize(DNS_RESPONSE_PACKET, DNS_RESPONSE, lazy=lazy)
+    assert pck.get_field('QNAME').name == 'qname'
+    assert pck.get_field(6).name == 'qname'
+    assert pck.get_value('nothing') is None
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_path_lookup(lazy):
+    pck = Deserialize(DNS_RESPONSE_PACKET, DNS_RESPONSE, lazy=lazy)
+    assert pck.get_value("ANSWERS", 1, "ttl") == 60
+    assert pck.get_value("answers", 0, "ADDRESS") == '142.250.64.78'
+    assert pck.get_value("ANSWERS", 0, "nothing") is None
+    with pytest.raises(InvalidField):
+        pck.get_value("qname", 0, "ttl")
+    with pytest.raises(InvalidField):
+        pck.get_value("ANSWERS", 0)
+
+
+def test_nested_path_lookup():
+    pck = Deserialize(b'\x02\x0a\x01\x00\x05\x0b\x02\x00\x06\x00\x07', NESTED)
+    assert pck.get_value("GROUPS", 0, "ID") == 10
+    assert pck.get_value("GROUPS", 1, "ITEMS", 1, "val") == 7
+
+
+def test_serialize_lookup():
+    packet = Serialize({"id": (16, 17), "qname": (serializeme.NULL_TERMINATE, "x")})
+    assert packet.get_field("ID").value == 17
+    assert packet.get_field(1).name == "qname"
+    assert packet.get_field("nothing") is None
+
+
+def test_serialize_lookup_after_edits():
+    packet = Serialize({"id": (16, 17), "qname": (serializeme.NULL_TERMINATE, "x")})
+    packet.fields.insert(0, serializeme.Field("ver", 8, 1))
+    assert packet.get_field("id").value == 17
+    assert packet.get_field("ver").value == 1
+    assert packet.packetize() == b'\x01\x00\x11x\x00'
+    del packet.fields[1]
+    assert packet.get_field("id") is None
+    packet.fields[1].name = "name"
+    assert packet.get_field("qname") is None
+    assert packet.get_field("NAME").value == "x"
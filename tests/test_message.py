@@ -0,0 +1,116 @@
+import pytest
+
+import serializeme
+from serializeme import Template
+from serializeme.exceptions import FieldNotFound, ValueTooBig
+
+DNS_QUERY = {
+    "id": (16, 17),
+    "qr": (),
+    "opcode": 4,
+    "aa": (),
+    "tc": (),
+    "rd": (1, 1),
+    "ra": (),
+    "z": 3,
+    "rcode": 4,
+    "qdcount": ("2B", 1),
+    "ancount": "16b",
+    "nscount": 16,
+    "arcount": 16,
+    "qname": (serializeme.PREFIX_LEN_NULL_TERM, ("yahoo", "com")),
+    "qtype": (16, 1),
+    "qclass": (16, 1)
+}
+
+RESPONSE = {
+    "id": "2B",
+    "qname": (serializeme.DNS_NAME, "www.example.com"),
+    "qtype": ("2B", 1),
+    "name": (serializeme.DNS_NAME, "www.example.com"),
+    "ttl": ("4B", 300),
+    "ns": (serializeme.DNS_NAME, "ns.example.com"),
+}
+
+
+def test_initial_encoding():
+    template = Template(DNS_QUERY)
+    message = template.message(id=5)
+    assert bytes(message) == template.pack(id=5)
+    assert len(message) == len(message.buffer) == template.size(id=5)
+    assert message["id"] == 5
+
+
+def test_fixed_fields_are_patched():
+    template = Template(DNS_QUERY)
+    message = template.message()
+    buffer = message.buffer
+    message["id"] = 0xabcd
+    message.update(opcode=5, rcode=3, tc=1)
+    assert message.buffer is buffer
+    assert bytes(message) == template.pack(id=0xabcd, opcode=5, rcode=3, tc=1)
+    message["rd"] = 0
+    assert bytes(message) == template.pack(id=0xabcd, opcode=5, rcode=3, tc=1, rd=0)
+
+
+def test_unaligned_run():
+    template = Template({"a": (3, 5), "b": ("1B", 2), "c": (serializeme.NULL_TERMINATE, "q"), "d": (5, 3)})
+    message = template.message()
+    message.update(a=2, d=31)
+    assert bytes(message) == template.pack(a=2, d=31) == b'\x02\x02q\x00\x1f'
+
+
+def test_variable_field_reencodes_the_rest():
+    template = Template(DNS_QUERY)
+    message = template.message()
+    message["qname"] = ("google", "com")
+    message["qtype"] = 28
+    assert bytes(message) == template.pack(qname=("google", "com"), qtype=28)
+    # Same length: only the field is rewritten.
+    message["qname"] = ("abcdef", "org")
+    assert bytes(message) == template.pack(qname=("abcdef", "org"), qtype=28)
+    message.update(qname=("a", "b"), qclass=3, id=9)
+    assert bytes(message) == template.pack(qname=("a", "b"), qclass=3, id=9, qtype=28)
+
+
+def test_dns_names_are_compressed_again():
+    template = Template(RESPONSE)
+    message = template.message()
+    assert bytes(message) == template.pack()
+    message["qname"] = "mail.example.org"
+    assert bytes(message) == template.pack(qname="mail.example.org")
+    message.update(name="mail.example.org", ttl=60)
+    assert bytes(message) == template.pack(qname="mail.example.org", name="mail.example.org", ttl=60)
+    with pytest.raises(ValueTooBig):
+        message.update(qname="x" * 64 + ".org", ttl=1)
+    assert bytes(message) == template.pack(qname="mail.example.org", name="mail.example.org", ttl=60)
+    assert message["ttl"] == 60
+
+
+def test_offsets():
+    message = Template(DNS_QUERY).message()
+    assert message.offset("id") == 0
+    assert message.offset("opcode") == 17
+    assert message.offset("rcode") == 28
+    assert message.offset("qname") == 12 * 8
+    assert message.offset("qtype") == (12 + 11) * 8
+    message["qname"] = ("google", "com")
+    assert message.offset("qtype") == (12 + 12) * 8
+
+
+def test_errors_leave_message_unchanged():
+    template = Template(DNS_QUERY)
+    message = template.message()
+    before = bytes(message)
+    with pytest.raises(ValueTooBig):
+        message.update(id=1, opcode=16)
+    with pytest.raises(ValueTooBig):
+        message.update(qtype=2, qname=("x" * 64, "com"), qclass=0x10000)
+    with pytest.raises(OverflowError):
+        message.update(qname=("x" * 300,))
+    assert bytes(message) == before
+    assert (message["id"], message["qname"]) == (17, ("yahoo", "com"))
+    with pytest.raises(FieldNotFound):
+        message["nope"] = 1
+    with pytest.raises(FieldNotFound):
+        message.offset("nope")
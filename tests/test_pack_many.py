@@ -0,0 +1,80 @@
+import pytest
+
+import serializeme
+from serializeme import Template
+from serializeme.exceptions import FieldNotFound, ValueTooBig
+
+DNS_QUERY = {
+    "id": (16, 17),
+    "qr": (),
+    "opcode": 4,
+    "aa": (),
+    "tc": (),
+    "rd": (1, 1),
+    "ra": (),
+    "z": 3,
+    "rcode": 4,
+    "qdcount": ("2B", 1),
+    "ancount": "16b",
+    "nscount": 16,
+    "arcount": 16,
+    "qname": (serializeme.PREFIX_LEN_NULL_TERM, ("yahoo", "com")),
+    "qtype": (16, 1),
+    "qclass": (16, 1)
+}
+
+RESPONSE = {
+    "id": "2B",
+    "qname": (serializeme.DNS_NAME, "www.example.com"),
+    "name": (serializeme.DNS_NAME, "www.example.com"),
+    "ttl": ("4B", 300),
+}
+
+
+def _packets(buffer, offsets):
+    return [bytes(buffer[offsets[i]:offsets[i + 1]]) for i in range(len(offsets) - 1)]
+
+
+def test_fixed_width_columns():
+    template = Template(DNS_QUERY)
+    (buffer, offsets) = template.pack_many(columns={"id": range(100), "rd": [i & 1 for i in range(100)]})
+    assert isinstance(buffer, bytearray)
+    assert len(offsets) == 101
+    assert offsets[-1] == len(buffer) == 100 * template.size()
+    assert _packets(buffer, offsets) == [template.pack(id=i, rd=i & 1) for i in range(100)]
+
+
+def test_variable_length_records():
+    template = Template(DNS_QUERY)
+    records = [{"id": 1, "qname": ("google", "com")}, {"qtype": 28}, {"id": 3, "qname": ("a", "b", "org")}]
+    (buffer, offsets) = template.pack_many(records=iter(records))
+    assert _packets(buffer, offsets) == [template.pack(**record) for record in records]
+
+
+def test_compressed_names():
+    template = Template(RESPONSE)
+    names = ["www.example.com", "mail.example.org", "example.org"]
+    views = template.pack_many(columns={"name": names, "id": [1, 2, 3]}, views=True)
+    assert [bytes(view) for view in views] == [template.pack(name=name, id=i + 1) for i, name in enumerate(names)]
+    assert all(view.obj is views[0].obj for view in views)
+
+
+def test_no_changing_fields():
+    template = Template(DNS_QUERY)
+    (buffer, offsets) = template.pack_many(records=[{}, {}])
+    assert _packets(buffer, offsets) == [template.pack()] * 2
+    assert template.pack_many(columns={"id": []}) == (bytearray(), template.pack_many(records=[])[1])
+
+
+def test_errors():
+    template = Template(DNS_QUERY)
+    with pytest.raises(ValueTooBig):
+        template.pack_many(columns={"id": [1, 0x10000]})
+    with pytest.raises(ValueTooBig):
+        template.pack_many(columns={"opcode": [1, 16]})
+    with pytest.raises(FieldNotFound):
+        template.pack_many(records=[{"nope": 1}])
+    with pytest.raises(ValueError):
+        template.pack_many(columns={"id": [1, 2], "rd": [1]})
+    with pytest.raises(ValueError):
+        template.pack_many()
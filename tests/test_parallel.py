@@ -0,0 +1,104 @@
+import pytest
+
+import serializeme
+from serializeme import Deserialize
+from serializeme.capture import CaptureWriter
+from serializeme.parallel import unpack_parallel
+from serializeme.exceptions import IncompletePacket
+
+DNS_QUERY = {
+    "ID": "2B",
+    "FLAGS": "2B",
+    "QDCOUNT": ("2B", "", "QUERIES"),
+    "ANCOUNT": "2B",
+    "NSCOUNT": "2B",
+    "ARCOUNT": "2B",
+    "QUERIES": {
+        "QNAME": (serializeme.PREFIX_LEN_NULL_TERM, serializeme.HOST),
+        "QTYPE": "2B",
+        "QCLASS": "2B"
+    }
+}
+
+HEADER = {
+    "ID": "2B",
+    "RCODE": "2B",
+}
+
+
+def _query(ident, name):
+    labels = b''.join(bytes([len(label)]) + label.encode() for label in name.split('.'))
+    return ident.to_bytes(2, "big") + b'\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00' + labels + b'\x00\x00\x01\x00\x01'
+
+
+QUERIES = [_query(i, "host{}.example.com".format(i)) for i in range(50)]
+
+
+def query_id(message):
+    return message.get_value("ID")
+
+
+def _expected():
+    return [Deserialize(q, DNS_QUERY, compact=True).values for q in QUERIES]
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_iterable(workers):
+    results = list(unpack_parallel(DNS_QUERY, QUERIES, workers=workers, chunk_size=7))
+    assert results == _expected()
+    assert results[3][-1][0][0] == "host3.example.com"
+
+
+def test_unordered():
+    results = unpack_parallel(DNS_QUERY, iter(QUERIES), workers=2, chunk_size=4, ordered=False, func=query_id)
+    assert sorted(results) == list(range(50))
+
+
+def test_buffer_located_by_schema():
+    buffer = bytearray(b''.join(QUERIES))
+    assert list(unpack_parallel(DNS_QUERY, buffer, workers=2, chunk_size=8)) == _expected()
+
+
+def test_buffer_length_prefix():
+    buffer = b''.join(len(q).to_bytes(2, "big") + q for q in QUERIES)
+    results = unpack_parallel(Deserialize.compile(DNS_QUERY), memoryview(buffer), workers=2, chunk_size=8,
+                              func=query_id, length_prefix=2, codegen=True)
+    assert list(results) == list(range(50))
+
+
+def test_fixed_size_file(tmp_path):
+    path = tmp_path / "headers.bin"
+    path.write_bytes(b''.join(i.to_bytes(2, "big") + b'\x00\x03' for i in range(100)))
+    results = list(unpack_parallel(HEADER, str(path), workers=2, chunk_size=30))
+    assert results == [(i, 3) for i in range(100)]
+
+
+def test_capture_file(tmp_path):
+    path = tmp_path / "queries.pcap"
+    with CaptureWriter(path) as writer:
+        for q in QUERIES:
+            writer.write(q)
+    assert list(unpack_parallel(DNS_QUERY, path, workers=2, chunk_size=16)) == _expected()
+    assert len(list(unpack_parallel(HEADER, path, workers=0, strip=False))) == 50
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path / "empty.bin"
+    path.write_bytes(b'')
+    assert list(unpack_parallel(HEADER, path, workers=2)) == []
+
+
+def test_malformed_message():
+    with pytest.raises(IncompletePacket):
+        list(unpack_parallel(DNS_QUERY, QUERIES[:10] + [QUERIES[10][:-1]], workers=2, chunk_size=4))
+
+
+def test_trailing_partial_message():
+    with pytest.raises(IncompletePacket):
+        list(unpack_parallel(HEADER, b'\x00\x01\x00\x00\x00', workers=0))
+
+
+def test_stop_early():
+    results = unpack_parallel(DNS_QUERY, QUERIES, workers=2, chunk_size=5, func=query_id)
+    assert next(results) == 0
+    results.close()
@@ -0,0 +1,104 @@
+import pytest
+
+import serializeme
+from serializeme import Deserialize, Schema, Projection
+from serializeme.exceptions import FieldNotFound, IncompletePacket, InvalidField
+
+DNS_RESPONSE = {
+    'id': '2B',
+    'FLAGS!!2B': {'QR': '1b', 'OPCODE': '4b', 'AA': '1b', 'TC': '1b', 'RD': '1b', 'RA': '1b', 'Z': '3b',
+                  'RCODE': '4b'},
+    'qdcount': '2B',
+    'ancount': ('2B', '', 'ANSWERS'),
+    'nscount': '2B',
+    'arcount': '2B',
+    'qname': serializeme.DNS_NAME,
+    'qtype': '2B',
+    'qclass': '2B',
+    'ANSWERS': {
+        'name': serializeme.DNS_NAME,
+        'type': '2B',
+        'class': '2B',
+        'ttl': '4B',
+        'data_length': ('2B', '', 'rdata'),
+        'rdata': (serializeme.SIZED, serializeme.IPv4),
+    }
+}
+
+PACKET = (b'\x00\x11\x81\x83\x00\x01\x00\x02\x00\x00\x00\x00\x06google\x03com\x00\x00\x01\x00\x01'
+          b'\xc0\x0c\x00\x01\x00\x01\x00\x00\x01\x2c\x00\x04\x8e\xfa\x40\x4e'
+          b'\xc0\x0c\x00\x01\x00\x01\x00\x00\x00\x3c\x00\x04\x08\x08\x08\x08')
+
+
+def test_sized_field():
+    for options in ({}, {"lazy": True}, {"compact": True}):
+        message = Deserialize(PACKET, DNS_RESPONSE, **options)
+        assert message.get_value("ANSWERS", 1, "rdata") == "8.8.8.8"
+        assert message.size == len(PACKET)
+    message = Schema(DNS_RESPONSE, codegen=True).unpack(PACKET)
+    assert message.get_field("ANSWERS", 0, "rdata").size == "4B"
+    assert message.get_value("ANSWERS", 0, "rdata") == "142.250.64.78"
+    # Without a value format, the bytes are read like a PREFIX_LENGTH field.
+    raw = Deserialize(b'\x00\x03abc\x01', {"len": ("2B", "", "data"), "data": serializeme.SIZED, "end": "1B"})
+    assert (raw.get_value("data"), raw.get_value("end")) == ("abc", 1)
+    with pytest.raises(IncompletePacket):
+        Deserialize(PACKET[:-1], DNS_RESPONSE)
+    with pytest.raises(InvalidField):
+        Schema({"data": serializeme.SIZED})
+
+
+def test_fixed_fields():
+    schema = Schema(DNS_RESPONSE)
+    assert schema.select(PACKET, "rcode") == (3,)
+    assert schema.select(PACKET, "ID", "qr", "ancount") == (17, 1, 2)
+    # Values come in the order of the paths.
+    assert schema.select(PACKET, "ancount", "id") == (2, 17)
+    assert schema.select(PACKET, "flags")[0]["RCODE"] == 3
+
+
+def test_variable_and_section_fields():
+    schema = Schema(DNS_RESPONSE)
+    assert schema.select(PACKET, "qtype", "qname") == (1, "google.com")
+    assert schema.select(PACKET, "ANSWERS.rdata") == (("142.250.64.78", "8.8.8.8"),)
+    assert schema.select(PACKET, "answers[*].ttl", "answers.name", "rcode") == \
+        ((300, 60), ("google.com", "google.com"), 3)
+    expected = Deserialize(PACKET, DNS_RESPONSE, compact=True).get_value("ANSWERS")
+    (answers, rdata) = schema.select(PACKET, "ANSWERS", ("answers", "rdata"))
+    assert len(answers) == 2 and answers[1][5] == expected[1][5].value == "8.8.8.8"
+    assert rdata == ("142.250.64.78", "8.8.8.8")
+
+
+def test_nothing_read_after_projection():
+    schema = Schema(DNS_RESPONSE)
+    assert schema.select(PACKET[:12], "rcode") == (3,)
+    with pytest.raises(IncompletePacket):
+        schema.select(PACKET[:-1], "ANSWERS.ttl")
+    with pytest.raises(IncompletePacket):
+        schema.select(PACKET[:3], "id")
+
+
+def test_projection_is_kept():
+    schema = Schema(DNS_RESPONSE)
+    projection = schema.project("rcode", "qname")
+    assert isinstance(projection, Projection)
+    assert schema.project("rcode", "qname") is projection
+    assert projection.paths == ("rcode", "qname")
+    assert projection.unpack(memoryview(PACKET)) == (3, "google.com")
+
+
+def test_instrumented_schema():
+    schema = Schema(DNS_RESPONSE)
+    schema.instrument()
+    assert schema.select(PACKET, "ANSWERS.rdata", "qtype") == (("142.250.64.78", "8.8.8.8"), 1)
+
+
+def test_errors():
+    schema = Schema(DNS_RESPONSE)
+    with pytest.raises(FieldNotFound):
+        schema.project("nope")
+    with pytest.raises(FieldNotFound):
+        schema.project("ANSWERS.nope")
+    with pytest.raises(InvalidField):
+        schema.project("qname.x")
+    with pytest.raises(InvalidField):
+        schema.project("id.x")
@@ -0,0 +1,74 @@
+import pytest
+
+from serializeme import Schema
+from serializeme.capture import CaptureWriter
+from serializeme.scan import Scan
+from serializeme.exceptions import FieldNotFound, IncompletePacket
+
+from test_projection import DNS_RESPONSE, PACKET
+
+
+def _response(ident, rcode, qtype):
+    return ident.to_bytes(2, "big") + bytes([0x81, 0x80 | rcode]) + PACKET[4:24] + qtype.to_bytes(2, "big") + \
+        PACKET[26:]
+
+
+RESPONSES = [_response(i, 3 if i % 10 == 0 else 0, (1, 28, 5)[i % 3]) for i in range(60)]
+FAILED = [i for i in range(60) if i % 10 == 0]
+
+
+def test_iterable():
+    scan = Scan(DNS_RESPONSE, iter(RESPONSES), "RCODE", lambda rcode: rcode != 0)
+    assert list(scan) == [RESPONSES[i] for i in FAILED]
+    assert (scan.scanned, scan.matched) == (60, 6)
+
+
+def test_indexes_and_several_fields():
+    schema = Schema(DNS_RESPONSE)
+    scan = Scan(schema, RESPONSES, ("qtype", "rcode"), lambda qtype, rcode: qtype in {28, 1} and rcode == 0,
+                indexes=True)
+    assert list(scan) == [i for i in range(60) if i % 3 != 2 and i % 10 != 0]
+    assert scan.scanned == 60
+    # Iterating again starts the counts over.
+    assert scan.count() == scan.matched == 36
+
+
+def test_section_fields():
+    scan = Scan(DNS_RESPONSE, RESPONSES, "ANSWERS.rdata", lambda addresses: "8.8.8.8" in addresses, indexes=True)
+    assert scan.count() == 60
+
+
+def test_buffer():
+    buffer = bytearray(b''.join(RESPONSES))
+    scan = Scan(DNS_RESPONSE, buffer, "rcode", lambda rcode: rcode != 0)
+    assert [bytes(message) for message in scan] == [RESPONSES[i] for i in FAILED]
+    prefixed = b''.join(len(r).to_bytes(2, "big") + r for r in RESPONSES)
+    scan = Scan(DNS_RESPONSE, memoryview(prefixed), "id", lambda ident: ident >= 50, indexes=True, length_prefix=2)
+    assert list(scan) == list(range(50, 60))
+
+
+def test_files(tmp_path):
+    capture = tmp_path / "responses.pcap"
+    with CaptureWriter(capture) as writer:
+        for response in RESPONSES:
+            writer.write(response)
+    scan = Scan(DNS_RESPONSE, capture, "rcode", lambda rcode: rcode != 0)
+    assert [bytes(message) for message in scan] == [RESPONSES[i] for i in FAILED]
+    flat = tmp_path / "responses.bin"
+    flat.write_bytes(b''.join(RESPONSES))
+    assert list(Scan(DNS_RESPONSE, str(flat), "rcode", lambda rcode: rcode != 0, indexes=True)) == FAILED
+    empty = tmp_path / "empty.bin"
+    empty.write_bytes(b'')
+    assert list(Scan(DNS_RESPONSE, empty, "rcode", bool)) == []
+
+
+def test_stops_at_malformed_message():
+    scan = Scan(DNS_RESPONSE, RESPONSES[:5] + [RESPONSES[5][:3]], "rcode", lambda rcode: True)
+    with pytest.raises(IncompletePacket):
+        list(scan)
+    assert scan.scanned == 6 and scan.matched == 5
+
+
+def test_unknown_field():
+    with pytest.raises(FieldNotFound):
+        Scan(DNS_RESPONSE, RESPONSES, "nope", bool)
@@ -0,0 +1,83 @@
+import os
+import socket
+
+import pytest
+
+import serializeme
+from serializeme import Serialize, Template
+from serializeme.exceptions import FieldNotFound
+
+TRANSFER = {
+    "magic": ("2B", 0xcafe),
+    "flags": (4, 1),
+    "kind": (4, 2),
+    "name": (serializeme.PREFIX_LENGTH, "file.bin"),
+    "data": (serializeme.NULL_TERMINATE, b''),
+    "crc": ("4B", 0),
+}
+
+PAYLOAD = bytes(range(256)) * 64
+
+
+def test_large_payload_is_not_copied():
+    template = Template(TRANSFER)
+    payload = memoryview(bytearray(PAYLOAD))
+    buffers = template.pack_buffers(data=payload, crc=7)
+    assert b''.join(buffers) == template.pack(data=payload, crc=7)
+    assert len(buffers) == 3
+    assert buffers[1] is payload
+    assert buffers[0] == b'\xca\xfe\x12\x08file.bin'
+    assert buffers[2] == b'\x00\x00\x00\x00\x07'
+
+
+def test_small_values_are_joined():
+    template = Template(TRANSFER)
+    assert template.pack_buffers(data=b'tiny') == [template.pack(data=b'tiny')]
+
+
+def test_prefix_length_chunks():
+    template = Template({"id": ("1B", 1), "chunks": (serializeme.PREFIX_LEN_NULL_TERM, ())})
+    chunks = tuple(bytes([i]) * 255 for i in range(8))
+    buffers = template.pack_buffers(chunks=chunks)
+    assert b''.join(buffers) == template.pack(chunks=chunks)
+    # Parts of 255 bytes are joined, as they are smaller than the threshold.
+    assert len(buffers) == 1
+
+
+def test_iter_buffers_and_names():
+    template = Template({"q": (serializeme.DNS_NAME, "www.example.com"), "data": (serializeme.NULL_TERMINATE, ""),
+                         "a": (serializeme.DNS_NAME, "mail.example.com")})
+    chunks = template.iter_buffers(data=PAYLOAD)
+    assert next(chunks) == b'\x03www\x07example\x03com\x00'
+    assert next(chunks) is PAYLOAD
+    assert b''.join(chunks) == b'\x00\x04mail\xc0\x04'
+    with pytest.raises(FieldNotFound):
+        template.pack_buffers(nope=1)
+
+
+def test_writev_and_sendmsg(tmp_path):
+    template = Template(TRANSFER)
+    buffers = template.pack_buffers(data=PAYLOAD, name="big.bin")
+    path = tmp_path / "out.bin"
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT)
+    try:
+        assert os.writev(fd, buffers) == sum(len(b) for b in buffers)
+    finally:
+        os.close(fd)
+    assert path.read_bytes() == template.pack(data=PAYLOAD, name="big.bin")
+    left, right = socket.socketpair()
+    with left, right:
+        sent = left.sendmsg(template.pack_buffers(data=b'x' * 2000))
+        received = b''
+        while len(received) < sent:
+            received += right.recv(65536)
+    assert received == template.pack(data=b'x' * 2000)
+
+
+def test_serialize():
+    packet = Serialize(dict(TRANSFER, data=(serializeme.NULL_TERMINATE, PAYLOAD)))
+    buffers = packet.packetize_buffers()
+    assert b''.join(buffers) == packet.packetize()
+    assert buffers[1] is PAYLOAD
+    packet.fields.append(serializeme.Field("extra", 8, 1))
+    assert packet.packetize_buffers() == [packet.packetize()]
@@ -0,0 +1,66 @@
+import pytest
+
+import serializeme
+from serializeme import Deserialize, Schema
+from serializeme.exceptions import InvalidField
+
+DNS_RESPONSE = {
+    'pid': ('2B'),
+    'pflags': ('2B'),
+    'qcnt': ('2B'),
+    'acnt': ('2B', '', 'ANSWERS'),
+    'ncnt': ('2B'),
+    'mcnt': ('2B'),
+    'qname': (serializeme.NULL_TERMINATE, serializeme.HOST),
+    'qtype': ('2B'),
+    'qclass': ('2B'),
+    'ANSWERS': {
+        'name': ('2B'),
+        'type': ('2B'),
+        'class': ('2B'),
+        'ttl': ('4B'),
+        'data_length': ('2B'),
+        'address': ('4B', serializeme.IPv4),
+    }
+}
+
+DNS_RESPONSE_PACKET = (b'\x00\x11\x81\x80\x00\x01\x00\x02\x00\x00\x00\x00\x06google\x03com\x00\x00\x01\x00\x01'
+                       b'\xc0\x0c\x00\x01\x00\x01\x00\x00\x01\x2c\x00\x04\x8e\xfa\x40\x4e'
+                       b'\xc0\x0c\x00\x01\x00\x01\x00\x00\x00\x3c\x00\x04\x08\x08\x08\x08')
+
+
+def test_compile_returns_schema():
+    plan = Deserialize.compile(DNS_RESPONSE)
+    assert isinstance(plan, Schema)
+    assert plan.size is None
+    assert plan.offsets['acnt'] == 6
+
+
+def test_unpack_dns_response():
+    pck = Deserialize.compile(DNS_RESPONSE).unpack(DNS_RESPONSE_PACKET)
+    assert pck.get_value('pid') == 17
+    assert pck.get_value('qname') == 'google.com'
+    answers = pck.get_value('ANSWERS')
+    assert [[f.value for f in a if f.name in ('ttl', 'address')] for a in answers] == \
+        [[300, '142.250.64.78'], [60, '8.8.8.8']]
+
+
+def test_schema_is_reusable():
+    plan = Deserialize.compile({"VER": "1B", "ID": serializeme.PREFIX_LENGTH, "PW": serializeme.PREFIX_LENGTH})
+    assert plan.unpack(b'\x01\x06cs158b\x08Pa55word').get_value("PW") == 'Pa55word'
+    assert plan.unpack(b'\x05\x03abc\x03xyz').get_value("ID") == 'abc'
+
+
+def test_fixed_schema_size_and_bits():
+    plan = Schema({"ID": "2B", "!!2B": {'QR': '1b', 'OPCODE': '4b', 'AA': '1b', 'TC': '1b', 'RD': '1b',
+                                        'RA': '1b', 'Z': '3b', 'RCODE': '4b'}})
+    assert plan.size == 4
+    pck = plan.unpack(b'\x00\x11\x01\x20')
+    assert pck.get_value('RD') == 1
+    assert pck.get_value('Z') == 2
+    assert pck.get_value('RCODE') == 0
+
+
+def test_section_without_count_field():
+    with pytest.raises(InvalidField):
+        Schema({"VER": "1B", "AUTHS": {'val': '1B'}})
@@ -0,0 +1,100 @@
+import pytest
+
+import serializeme
+from serializeme.stream import StreamDecoder
+from serializeme.exceptions import IncompletePacket, InvalidField, MalformedPacket
+
+AUTH = {
+    "VER": "1B",
+    "ID": serializeme.PREFIX_LENGTH,
+    "PW": serializeme.PREFIX_LENGTH,
+}
+
+DNS_QUERY = {
+    "ID": "2B",
+    "FLAGS": "2B",
+    "QDCOUNT": ("2B", "", "QUERIES"),
+    "ANCOUNT": "2B",
+    "NSCOUNT": "2B",
+    "ARCOUNT": "2B",
+    "QUERIES": {
+        "QNAME": (serializeme.PREFIX_LEN_NULL_TERM, serializeme.HOST),
+        "QTYPE": "2B",
+        "QCLASS": "2B"
+    }
+}
+
+QUERY = b'\x00\x11\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x06google\x03com\x00\x00\x01\x00\x01'
+
+
+def test_byte_at_a_time():
+    decoder = StreamDecoder(AUTH)
+    stream = b'\x01\x06cs158b\x08Pa55word' * 2
+    messages = []
+    for i in range(len(stream)):
+        messages.extend(decoder.feed(stream[i:i + 1]))
+    assert [m.get_value("PW") for m in messages] == ['Pa55word', 'Pa55word']
+    assert messages[0].packet == stream[:17]
+    assert decoder.pending == 0
+    decoder.close()
+
+
+def test_several_messages_in_one_chunk():
+    decoder = StreamDecoder(AUTH)
+    messages = decoder.feed(b'\x01\x06cs158b\x08Pa55word\x01\x03bob\x06secret\x01\x03al')
+    assert [m.get_value("ID") for m in messages] == ['cs158b', 'bob']
+    assert decoder.pending == 4
+    with pytest.raises(IncompletePacket):
+        decoder.close()
+
+
+def test_length_prefixed_dns_over_tcp():
+    decoder = StreamDecoder(DNS_QUERY, length_prefix=2)
+    frame = len(QUERY).to_bytes(2, "big") + QUERY
+    stream = frame * 3
+    assert decoder.feed(stream[:1]) == []
+    assert decoder.feed(stream[1:20]) == []
+    messages = decoder.feed(stream[20:40]) + decoder.feed(stream[40:])
+    assert len(messages) == 3
+    assert messages[2].get_value("QUERIES")[0][0].value == 'google.com'
+    assert decoder.pending == 0
+
+
+def test_malformed_frame():
+    decoder = StreamDecoder({'a': '2B'}, length_prefix=2)
+    with pytest.raises(MalformedPacket) as e:
+        decoder.feed(b'\x00\x02\x00\x01\x00\x01\x07\x00\x02\x00\x03')
+    assert [m.get_value('a') for m in e.value.messages] == [1]
+    assert decoder.pending == 4
+    assert [m.get_value('a') for m in decoder.feed(b'')] == [3]
+    assert decoder.feed(b'\x00\x02\x00') == []
+    assert [m.get_value('a') for m in decoder.feed(b'\x04')] == [4]
+    decoder.close()
+
+
+NAMED = {'id': '1B', 'n': serializeme.DNS_NAME}
+
+
+def test_invalid_frame_is_dropped():
+    decoder = StreamDecoder(NAMED, length_prefix=1)
+    with pytest.raises(MalformedPacket) as e:
+        decoder.feed(b'\x02\x01\x00' + b'\x03\x02\xc0\x05' + b'\x02\x03\x00')
+    assert [m.get_value('id') for m in e.value.messages] == [1]
+    assert isinstance(e.value.__cause__, InvalidField)
+    assert [m.get_value('id') for m in decoder.feed(b'')] == [3]
+    assert [m.get_value('id') for m in decoder.feed(b'\x02\x04\x00')] == [4]
+    decoder.close()
+
+
+def test_invalid_delimited_message():
+    decoder = StreamDecoder(NAMED)
+    with pytest.raises(InvalidField) as e:
+        decoder.feed(b'\x01\x00\x02\x00\x03\xc0\x05')
+    assert [m.get_value('id') for m in e.value.messages] == [1, 2]
+    assert decoder.pending == 3
+    # The bad message stays buffered until it is discarded.
+    with pytest.raises(InvalidField):
+        decoder.feed(b'')
+    assert decoder.discard() == 3
+    assert [m.get_value('id') for m in decoder.feed(b'\x04\x00')] == [4]
+    decoder.close()
@@ -0,0 +1,118 @@
+import pytest
+
+import serializeme
+from serializeme import Serialize, Template
+from serializeme.exceptions import FieldNotFound, ValueTooBig
+
+DNS_QUERY = {
+    "id": (16, 17),
+    "qr": (),
+    "opcode": 4,
+    "aa": (),
+    "tc": (),
+    "rd": (1, 1),
+    "ra": (),
+    "z": 3,
+    "rcode": 4,
+    "qdcount": ("2B", 1),
+    "ancount": "16b",
+    "nscount": 16,
+    "arcount": 16,
+    "qname": (serializeme.PREFIX_LEN_NULL_TERM, ("google", "com")),
+    "qtype": (16, 1),
+    "qclass": (16, 1)
+}
+
+
+def test_compile_returns_template():
+    assert isinstance(Serialize.compile(DNS_QUERY), Template)
+
+
+def test_pack_defaults_match_packetize():
+    assert Serialize.compile(DNS_QUERY).pack() == Serialize(DNS_QUERY).packetize()
+
+
+def test_pack_overrides():
+    template = Serialize.compile(DNS_QUERY)
+    assert template.pack(id=0xabcd, qname=("yahoo", "com")) == \
+        b'\xab\xcd\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x05yahoo\x03com\x00\x00\x01\x00\x01'
+    assert template.pack(opcode=2, rcode=3)[2:4] == b'\x11\x03'
+
+
+def test_pack_unknown_field():
+    with pytest.raises(FieldNotFound):
+        Serialize.compile(DNS_QUERY).pack(bogus=1)
+
+
+def test_pack_value_too_big():
+    template = Serialize.compile(DNS_QUERY)
+    with pytest.raises(ValueTooBig):
+        template.pack(opcode=16)
+    with pytest.raises(ValueTooBig):
+        template.pack(id=0x10000)
+
+
+def test_pack_bytes_value_and_trailing_bits():
+    # The 35 bit run is padded with zero bits in front, as Serialize does.
+    template = Template({"addr": ("4B", b'\x7f\x00\x00\x01'), "flag": (1, 1), "rest": (2, 1)})
+    assert template.pack() == b'\x03\xf8\x00\x00\x0d'
+
+
+def test_packetize_bytes_value_and_trailing_bits():
+    packet = Serialize({"addr": ("4B", b'\x7f\x00\x00\x01'), "flag": (1, 1), "rest": (2, 1),
+                        "name": (serializeme.NULL_TERMINATE, "ab")})
+    assert packet.packetize() == b'\x03\xf8\x00\x00\x0dab\x00'
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ({"a": (3, 5)}, b'\x05'),
+    ({"a": (12, 0xabc)}, b'\x0a\xbc'),
+    ({"a": (4, 1), "b": ("1B", 2), "c": (serializeme.NULL_TERMINATE, "q"), "d": (5, 3)}, b'\x01\x02q\x00\x03'),
+])
+def test_sub_byte_runs_padded_in_front(spec, expected):
+    assert Serialize(spec).packetize() == expected
+    assert Template(spec).pack() == expected
+    assert Serialize(spec).encode_bit_str("101") == b'\x05'
+
+
+def test_packetize_value_too_big():
+    with pytest.raises(ValueTooBig):
+        Serialize({"flags": (3, 8)}).packetize()
+    with pytest.raises(ValueTooBig):
+        Template({"flags": (3, 8)}).pack()
+    with pytest.raises(ValueTooBig):
+        Template({"flags": 3}, codegen=True).pack(flags=8)
+
+
+def test_size_matches_packetize():
+    packet = Serialize(DNS_QUERY)
+    assert packet.size() == len(packet.packetize()) == 28
+    template = Serialize.compile(DNS_QUERY)
+    assert template.size(qname=("a", "bc")) == len(template.pack(qname=("a", "bc"))) == 22
+
+
+def test_packetize_into_buffer():
+    packet = Serialize(DNS_QUERY)
+    buffer = bytearray(64)
+    end = packet.packetize_into(buffer, 4)
+    assert end == 4 + packet.size()
+    assert buffer[4:end] == packet.packetize()
+    view = memoryview(buffer)
+    template = Serialize.compile(DNS_QUERY)
+    assert template.pack_into(view, end, id=7) == end + 28
+    assert buffer[end:end + 28] == template.pack(id=7)
+
+
+def test_packetize_into_too_small():
+    buffer = bytearray(20)
+    with pytest.raises(ValueTooBig):
+        Serialize(DNS_QUERY).packetize_into(buffer)
+    with pytest.raises(ValueTooBig):
+        Serialize.compile(DNS_QUERY).pack_into(buffer, 0)
+    assert len(buffer) == 20
+
+
+def test_prefix_length_counts_encoded_bytes():
+    packet = Serialize({"name": (serializeme.PREFIX_LENGTH, ["é", b'\x00\x01'])})
+    assert packet.packetize() == b'\x02\xc3\xa9\x02\x00\x01'
+    assert packet.size() == 6